@@ -1,11 +1,12 @@
 # api/auth.py
 import os
-import httpx
 import logging
 from fastapi import APIRouter, HTTPException, Request
 from fastapi.responses import JSONResponse
 from dotenv import load_dotenv
 from pathlib import Path
+from .http_client import get_http_client
+from .github import GITHUB_API_BASE, github_get
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
@@ -44,7 +45,7 @@ logger.info(f"REDIRECT_URI: {REDIRECT_URI}")
 
 GITHUB_OAUTH_URL = "https://github.com/login/oauth/authorize"
 GITHUB_TOKEN_URL = "https://github.com/login/oauth/access_token"
-GITHUB_USER_URL = "https://api.github.com/user"
+GITHUB_USER_URL = f"{GITHUB_API_BASE}/user"
 
 @router.get("/auth/github", response_model=dict)
 async def github_login(request: Request):
@@ -79,17 +80,17 @@ async def github_callback(code: str):
 
         # Exchange code for access token
         logger.info(f"Exchanging code for access token")
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                GITHUB_TOKEN_URL,
-                data={
-                    "client_id": GITHUB_CLIENT_ID,
-                    "client_secret": CLIENT_SECRET,
-                    "code": code,
-                    "redirect_uri": REDIRECT_URI
-                },
-                headers={"Accept": "application/json"},
-            )
+        client = get_http_client()
+        response = await client.post(
+            GITHUB_TOKEN_URL,
+            data={
+                "client_id": GITHUB_CLIENT_ID,
+                "client_secret": CLIENT_SECRET,
+                "code": code,
+                "redirect_uri": REDIRECT_URI
+            },
+            headers={"Accept": "application/json"},
+        )
             
         logger.info(f"Token response status: {response.status_code}")
         token_data = response.json()
@@ -106,11 +107,10 @@ async def github_callback(code: str):
 
         # Fetch user details
         logger.info("Fetching user details from GitHub API")
-        async with httpx.AsyncClient() as client:
-            user_response = await client.get(
-                GITHUB_USER_URL, 
-                headers={"Authorization": f"Bearer {access_token}"}
-            )
+        user_response = await client.get(
+            GITHUB_USER_URL, 
+            headers={"Authorization": f"Bearer {access_token}"}
+        )
 
         user_data = user_response.json()
         logger.info(f"Successfully retrieved user data for: {user_data.get('login', 'unknown')}")
@@ -145,7 +145,7 @@ async def get_user_repos(access_token: str):
             )
             
         # GitHub API endpoint for user repositories
-        repos_url = "https://api.github.com/user/repos"
+        repos_url = f"{GITHUB_API_BASE}/user/repos"
         
         # Parameters to customize the response
         params = {
@@ -155,15 +155,14 @@ async def get_user_repos(access_token: str):
         }
         
         logger.info("Fetching repositories from GitHub API")
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                repos_url,
-                params=params,
-                headers={
-                    "Authorization": f"Bearer {access_token}",
-                    "Accept": "application/vnd.github.v3+json"
-                }
-            )
+        response = await github_get(
+            repos_url,
+            params=params,
+            headers={
+                "Authorization": f"Bearer {access_token}",
+                "Accept": "application/vnd.github.v3+json"
+            }
+        )
         
         # Check if request was successful
         if response.status_code != 200:
@@ -0,0 +1,48 @@
+# api/batching.py
+import re
+from typing import Dict, List
+
+FILE_START = "<<<FILE {path}>>>"
+FILE_END = "<<<END>>>"
+
+_FILE_BLOCK = re.compile(r"<<<FILE (.+?)>>>[ \t]*\n(.*?)<<<END>>>", re.DOTALL)
+
+
+def pack_batches(sizes: List[int], budget: int, max_items: int) -> List[List[int]]:
+    """Group item indices into bins of at most ``budget`` total size and ``max_items`` items.
+
+    First-fit decreasing: largest items are placed first, each into the first bin with
+    room. Items larger than the budget get a bin of their own.
+    """
+    bins: List[List[int]] = []
+    loads: List[int] = []
+    for index in sorted(range(len(sizes)), key=lambda i: sizes[i], reverse=True):
+        for b, load in enumerate(loads):
+            if load + sizes[index] <= budget and len(bins[b]) < max_items:
+                bins[b].append(index)
+                loads[b] += sizes[index]
+                break
+        else:
+            bins.append([index])
+            loads.append(sizes[index])
+    return bins
+
+
+def render_batch(files: List[Dict[str, str]]) -> str:
+    """Code of several files for one prompt, each introduced by its path."""
+    return "\n\n".join(f"File: {file['path']}\nCode:\n```{file['content']}```" for file in files)
+
+
+def split_batch_response(text: str, paths: List[str]) -> Dict[str, str]:
+    """Per-file documentation from a batched reply, keyed by path.
+
+    Only paths that were asked for are returned; files whose delimiters are missing or
+    empty are left out so the caller can document them individually.
+    """
+    wanted = set(paths)
+    sections = {}
+    for path, body in _FILE_BLOCK.findall(text):
+        path = path.strip()
+        if path in wanted and body.strip() and path not in sections:
+            sections[path] = body.strip() + "\n"
+    return sections
@@ -0,0 +1,161 @@
+# api/cache.py
+import os
+import asyncio
+import hashlib
+import logging
+import tempfile
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional, Dict
+
+logger = logging.getLogger(__name__)
+
+DOC_CACHE_DIR = os.getenv("DOC_CACHE_DIR", os.path.join(tempfile.gettempdir(), "codemyth", "doc-cache"))
+DOC_CACHE_MAX_BYTES = int(os.getenv("DOC_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+
+
+class DiskLRUStore:
+    """Content-addressed on-disk key/value store with size-bounded LRU eviction.
+
+    Entries live in ``<directory>/<key[:2]>/<key>``. Recency is tracked in memory and
+    persisted through file mtimes, so the LRU order survives restarts. ``get`` and
+    ``set`` do blocking file I/O; from async code use ``aget`` and ``aset``, which run
+    them in a worker thread. Hit and miss counts are process-wide.
+    """
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._index: Optional["OrderedDict[str, int]"] = None
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+
+    def _path(self, key: str) -> Path:
+        return self.directory / key[:2] / key
+
+    def _ensure_index(self) -> "OrderedDict[str, int]":
+        if self._index is not None:
+            return self._index
+        entries = []
+        if self.directory.exists():
+            for path in self.directory.glob("*/*"):
+                if path.name.endswith(".tmp"):
+                    continue
+                try:
+                    stat = path.stat()
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, path.name, stat.st_size))
+        entries.sort()
+        self._index = OrderedDict((key, size) for _, key, size in entries)
+        self._total_bytes = sum(size for _, _, size in entries)
+        return self._index
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            index = self._ensure_index()
+            path = self._path(key)
+            try:
+                data = path.read_bytes()
+            except OSError:
+                if key in index:
+                    self._total_bytes -= index.pop(key)
+                self.misses += 1
+                return None
+            if key not in index:
+                # Written by another worker sharing the directory
+                index[key] = len(data)
+                self._total_bytes += len(data)
+            index.move_to_end(key)
+            try:
+                os.utime(path)
+            except OSError:
+                pass
+            self.hits += 1
+            return data
+
+    def set(self, key: str, value: bytes) -> None:
+        if len(value) > self.max_bytes:
+            return
+        with self._lock:
+            index = self._ensure_index()
+            path = self._path(key)
+            try:
+                path.parent.mkdir(parents=True, exist_ok=True)
+                tmp_path = path.with_name(f"{key}.{os.getpid()}.tmp")
+                tmp_path.write_bytes(value)
+                os.replace(tmp_path, path)
+            except OSError as e:
+                logger.warning(f"Failed to write cache entry {key}: {str(e)}")
+                return
+            if key in index:
+                self._total_bytes -= index.pop(key)
+            index[key] = len(value)
+            self._total_bytes += len(value)
+            self._evict()
+
+    async def aget(self, key: str) -> Optional[bytes]:
+        return await asyncio.to_thread(self.get, key)
+
+    async def aset(self, key: str, value: bytes) -> None:
+        await asyncio.to_thread(self.set, key, value)
+
+    def _evict(self) -> None:
+        while self._total_bytes > self.max_bytes and self._index:
+            key, size = self._index.popitem(last=False)
+            self._total_bytes -= size
+            try:
+                self._path(key).unlink()
+            except OSError:
+                pass
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            index = self._ensure_index()
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(index),
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+
+def doc_cache_key(content: str, filename: str, template: str, model_name: str) -> str:
+    """Hash everything that influences the LLM output for a chunk."""
+    digest = hashlib.sha256()
+    for part in (model_name, template, filename, content):
+        encoded = part.encode("utf-8")
+        digest.update(len(encoded).to_bytes(8, "big"))
+        digest.update(encoded)
+    return digest.hexdigest()
+
+
+class DocCache:
+    """Persistent cache of generated documentation keyed by chunk content."""
+
+    def __init__(self, store: DiskLRUStore):
+        self.store = store
+
+    def get(self, key: str) -> Optional[str]:
+        data = self.store.get(key)
+        return data.decode("utf-8") if data is not None else None
+
+    def set(self, key: str, text: str) -> None:
+        self.store.set(key, text.encode("utf-8"))
+
+    async def aget(self, key: str) -> Optional[str]:
+        data = await self.store.aget(key)
+        return data.decode("utf-8") if data is not None else None
+
+    async def aset(self, key: str, text: str) -> None:
+        await self.store.aset(key, text.encode("utf-8"))
+
+    def stats(self) -> Dict[str, int]:
+        return self.store.stats()
+
+
+DOC_CACHE = DocCache(DiskLRUStore(DOC_CACHE_DIR, DOC_CACHE_MAX_BYTES))
@@ -0,0 +1,216 @@
+# api/chunking.py
+import ast
+import bisect
+import itertools
+import logging
+import os
+import re
+from typing import List, Optional, Tuple
+
+import tiktoken
+
+from .metrics import CHUNKING_SECONDS, timed
+
+logger = logging.getLogger(__name__)
+
+tokenizer = tiktoken.get_encoding("cl100k_base")
+CHUNK_OVERLAP = 200
+
+
+def encode(content: str) -> List[int]:
+    """Tokenize source text. Special-token strings in code are treated as plain text."""
+    with timed(CHUNKING_SECONDS, "tokenize", stage="tokenize"):
+        return tokenizer.encode(content, disallowed_special=())
+
+
+def split_by_tokens(content: str, max_tokens: int, overlap: int = CHUNK_OVERLAP, tokens: Optional[List[int]] = None) -> List[str]:
+    """Split ``content`` into chunks of at most ``max_tokens`` tokens in a single linear pass.
+
+    The text is encoded once and cut on token offsets. Each cut moves back to the first
+    token of its line unless that would empty the chunk (e.g. minified code on one huge
+    line, or a cut that would only repeat the previous chunk's tail). Consecutive chunks
+    share about ``overlap`` tokens, never more than the shorter chunk holds.
+    """
+    if tokens is None:
+        tokens = encode(content)
+    if len(tokens) <= max_tokens:
+        return [content] if content else []
+    overlap = min(overlap, max_tokens // 2)
+    data = content.encode("utf-8")
+    total = len(tokens)
+
+    def span(start: int, end: int) -> int:
+        """Byte length of tokens[start:end], measured without a per-token Python loop."""
+        return len(tokenizer.decode_bytes(tokens[start:end]))
+
+    def back_to_line(index: int, position: int, floor_index: int, floor_position: int) -> Tuple[int, int]:
+        """Move a (token index, byte position) boundary back to its line start, staying above the floor."""
+        line_start = data.rfind(b"\n", floor_position, position) + 1
+        if line_start <= floor_position:
+            return index, position
+        while index - 1 > floor_index:
+            size = len(tokenizer.decode_single_token_bytes(tokens[index - 1]))
+            if position - size < line_start:
+                break
+            index -= 1
+            position -= size
+        return index, position
+
+    def char_boundary(position: int) -> int:
+        # Tokens can split a multi-byte character; never cut inside one
+        while 0 < position < len(data) and 0x80 <= data[position] < 0xC0:
+            position -= 1
+        return position
+
+    chunks = []
+    start, start_position = 0, 0
+    # End of the previous chunk; every chunk must reach past it
+    covered, covered_position = 0, 0
+    while True:
+        end = min(start + max_tokens, total)
+        if end == total:
+            chunks.append(data[char_boundary(start_position):].decode("utf-8"))
+            return chunks
+        end_position = start_position + span(start, end)
+        end, end_position = back_to_line(end, end_position, covered, covered_position)
+        chunks.append(data[char_boundary(start_position):char_boundary(end_position)].decode("utf-8"))
+        covered, covered_position = end, end_position
+        next_start = end if end - start <= overlap else end - overlap
+        next_position = end_position - span(next_start, end)
+        # A line start at most another ``overlap`` tokens back; further would repeat most of a chunk
+        floor = max(start, next_start - overlap)
+        floor_position = next_position - span(floor, next_start)
+        start, start_position = back_to_line(next_start, next_position, floor, floor_position)
+
+
+BRACE_EXTENSIONS = {'.js', '.jsx', '.ts', '.tsx', '.java', '.cpp', '.c', '.cs', '.php', '.go', '.rs', '.swift', '.kt'}
+INDENT_EXTENSIONS = {'.rb'}
+
+# Strings, char literals and line comments, removed before counting braces
+_BRACE_NOISE = re.compile(r'"(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\'|`(?:\\.|[^`\\])*`|//.*')
+_BLOCK_COMMENT = re.compile(r"/\*.*?\*/")
+_INDENT_CONTINUATIONS = {"end", "else", "elsif", "when", "rescue", "ensure", "in"}
+
+
+def _python_segment_starts(content: str) -> Optional[List[int]]:
+    try:
+        module = ast.parse(content)
+    except (SyntaxError, ValueError, RecursionError, MemoryError):
+        # Deeply nested or huge sources can exhaust the parser; they are split by tokens instead
+        return None
+    starts = []
+    for node in module.body:
+        decorators = getattr(node, "decorator_list", [])
+        starts.append(min([node.lineno] + [d.lineno for d in decorators]) - 1)
+    return starts
+
+
+def _brace_segment_starts(lines: List[str]) -> Optional[List[int]]:
+    """Start a segment after each line that closes a top-level block or ends a top-level statement."""
+    starts = [0]
+    depth = 0
+    in_block_comment = False
+    for number, line in enumerate(lines):
+        code = line
+        if in_block_comment:
+            end = code.find("*/")
+            if end == -1:
+                continue
+            code = code[end + 2:]
+            in_block_comment = False
+        code = _BLOCK_COMMENT.sub("", _BRACE_NOISE.sub("", code))
+        if "/*" in code:
+            code = code[:code.index("/*")]
+            in_block_comment = True
+        if not code.strip():
+            continue
+        opened = depth > 0 or "{" in code
+        depth += code.count("{") - code.count("}")
+        if depth < 0:
+            return None
+        if depth == 0 and (opened or code.rstrip().endswith(";")):
+            starts.append(number + 1)
+    if depth != 0:
+        return None
+    return starts
+
+
+def _indent_segment_starts(lines: List[str]) -> List[int]:
+    """Start a segment at each unindented line, keeping leading comment lines with what follows."""
+    starts = [0]
+    comment_run_start = None
+    for number, line in enumerate(lines):
+        stripped = line.strip()
+        if not stripped or line[0] in " \t" or stripped[0] in "})]" or stripped.split(None, 1)[0] in _INDENT_CONTINUATIONS:
+            if stripped:
+                comment_run_start = None
+            continue
+        if stripped.startswith("#"):
+            if comment_run_start is None:
+                comment_run_start = number
+            continue
+        starts.append(comment_run_start if comment_run_start is not None else number)
+        comment_run_start = None
+    return starts
+
+
+def top_level_segments(content: str, filename: str) -> Optional[List[str]]:
+    """Split a file into consecutive top-level definitions, or None when it cannot be parsed."""
+    extension = os.path.splitext(filename.lower())[1]
+    lines = content.splitlines(keepends=True)
+    if extension == ".py":
+        starts = _python_segment_starts(content)
+    elif extension in BRACE_EXTENSIONS:
+        starts = _brace_segment_starts(lines)
+    elif extension in INDENT_EXTENSIONS:
+        starts = _indent_segment_starts(lines)
+    else:
+        starts = None
+    if not starts:
+        return None
+    # Leading comments, imports and blank lines belong to the first segment
+    boundaries = sorted({0, *starts} - {len(lines)}) + [len(lines)]
+    return ["".join(lines[a:b]) for a, b in zip(boundaries, boundaries[1:]) if a < b]
+
+
+def split_by_structure(content: str, filename: str, max_tokens: int, overlap: int = CHUNK_OVERLAP, tokens: Optional[List[int]] = None) -> List[str]:
+    """Pack whole top-level definitions into chunks of at most ``max_tokens`` tokens.
+
+    Definitions that are too large on their own are split with ``split_by_tokens``, as is
+    the whole file when its structure cannot be recovered. Packed chunks do not overlap.
+    The file is tokenized once; segment sizes are read off the token byte offsets.
+    """
+    if tokens is None:
+        tokens = encode(content)
+    if len(tokens) <= max_tokens:
+        return [content] if content else []
+    segments = top_level_segments(content, filename)
+    if not segments or len(segments) == 1:
+        return split_by_tokens(content, max_tokens, overlap, tokens)
+
+    # Byte offset at which each token starts, plus the end of the file
+    offsets = list(itertools.accumulate((len(piece) for piece in tokenizer.decode_tokens_bytes(tokens)), initial=0))
+    chunks = []
+    current: List[str] = []
+    current_tokens = 0
+    segment_start = 0
+    for segment in segments:
+        segment_end = segment_start + len(segment.encode("utf-8"))
+        first = bisect.bisect_left(offsets, segment_start, 0, len(tokens))
+        last = bisect.bisect_left(offsets, segment_end, 0, len(tokens))
+        aligned = offsets[first] == segment_start and offsets[last] == segment_end
+        segment_start = segment_end
+        # Tokens starting in the segment; one more for a token that straddles the join
+        segment_tokens = last - first + 1
+        if current and current_tokens + segment_tokens > max_tokens:
+            chunks.append("".join(current))
+            current, current_tokens = [], 0
+        if segment_tokens > max_tokens:
+            # Reuse the file's tokens when they cover the segment exactly
+            chunks.extend(split_by_tokens(segment, max_tokens, overlap, tokens[first:last] if aligned else None))
+            continue
+        current.append(segment)
+        current_tokens += segment_tokens
+    if current:
+        chunks.append("".join(current))
+    return chunks
@@ -0,0 +1,187 @@
+# api/compaction.py
+import os
+import re
+import ast
+import logging
+from typing import Dict, List, Optional, Tuple
+
+from .chunking import encode
+
+logger = logging.getLogger(__name__)
+
+COMPACT_MAX_STRING_CHARS = int(os.getenv("COMPACT_MAX_STRING_CHARS", "200"))  # Longer single-line string literals are cut
+COMPACT_KEEP_STRING_CHARS = int(os.getenv("COMPACT_KEEP_STRING_CHARS", "60"))
+COMPACT_MAX_DATA_LINES = int(os.getenv("COMPACT_MAX_DATA_LINES", "12"))  # Longer runs of literal-only lines are cut
+COMPACT_KEEP_DATA_LINES = int(os.getenv("COMPACT_KEEP_DATA_LINES", "4"))
+COMPACT_MAX_LINE_CHARS = int(os.getenv("COMPACT_MAX_LINE_CHARS", "400"))
+COMPACT_MAX_BODY_LINES = int(os.getenv("COMPACT_MAX_BODY_LINES", "40"))  # Python bodies longer than this are dropped when asked to
+
+HASH_COMMENT_EXTENSIONS = (".py", ".rb")
+
+_LICENSE = re.compile(r"copyright|licen[cs]e|spdx-license-identifier|all rights reserved", re.IGNORECASE)
+_BANNER = re.compile(r"^\s*(?:#+|//+|/?\*+)\s*([-=*#/~_+.])\1{7,}\s*(?:\*/)?\s*$")
+_STRING = re.compile(r'"(?:[^"\\\n]|\\.)*"|\'(?:[^\'\\\n]|\\.)*\'')
+_LITERAL = r"""(?:-?(?:0[xX][0-9a-fA-F]+|\d+(?:\.\d*)?(?:[eE][-+]?\d+)?)|"(?:[^"\\]|\\.)*"|'(?:[^'\\]|\\.)*'|true|false|True|False|None|null|nil)"""
+_DATA_TOKEN = re.compile(rf"\s*(?:({_LITERAL})|[\[\](){{}}:,])")
+
+
+def placeholder(filename: str, text: str) -> str:
+    """A comment in the file's own syntax standing in for elided code."""
+    if filename.lower().endswith(HASH_COMMENT_EXTENSIONS):
+        return f"# ... {text}"
+    return f"/* ... {text} */"
+
+
+def drop_python_bodies(content: str, max_lines: int) -> str:
+    """Replace bodies of Python functions longer than ``max_lines`` with ``...``, keeping signatures and docstrings."""
+    try:
+        tree = ast.parse(content)
+    except (SyntaxError, ValueError):
+        return content
+    ranges = []
+    for node in ast.walk(tree):
+        if not isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            continue
+        body = node.body
+        has_docstring = isinstance(body[0], ast.Expr) and isinstance(body[0].value, ast.Constant) and isinstance(body[0].value.value, str)
+        if has_docstring:
+            body = body[1:]
+        if not body or body[0].lineno <= node.lineno:
+            continue
+        start, end = body[0].lineno, node.end_lineno
+        if end - start + 1 > max_lines:
+            ranges.append((start, end))
+
+    lines = content.split("\n")
+    kept_until = 0
+    outermost = []
+    for start, end in sorted(ranges):
+        if start > kept_until:  # Nested functions go with their enclosing body
+            outermost.append((start, end))
+            kept_until = end
+    for start, end in reversed(outermost):
+        indent = lines[start - 1][:len(lines[start - 1]) - len(lines[start - 1].lstrip())]
+        lines[start - 1:end] = [f"{indent}...  # {end - start + 1} lines elided"]
+    return "\n".join(lines)
+
+
+def strip_license_header(lines: List[str]) -> List[str]:
+    """Drop the leading comment block when it is a license or copyright notice."""
+    start = 0
+    while start < len(lines) and (lines[start].startswith("#!") or "coding" in lines[start] and lines[start].startswith("#") or not lines[start].strip()):
+        start += 1
+    end = start
+    if end < len(lines) and lines[end].lstrip().startswith("/*"):
+        while end < len(lines) and "*/" not in lines[end]:
+            end += 1
+        end += 1
+    else:
+        prefix = "#" if end < len(lines) and lines[end].lstrip().startswith("#") else "//"
+        while end < len(lines) and lines[end].lstrip().startswith(prefix):
+            end += 1
+    if end > start and _LICENSE.search("\n".join(lines[start:end])):
+        return lines[:start] + lines[end:]
+    return lines
+
+
+def shorten_strings(line: str, filename: str) -> str:
+    def shorten(match: re.Match) -> str:
+        literal = match.group(0)
+        if len(literal) <= COMPACT_MAX_STRING_CHARS:
+            return literal
+        quote = literal[0]
+        return f"{literal[:COMPACT_KEEP_STRING_CHARS]}...{quote} {placeholder(filename, f'{len(literal) - COMPACT_KEEP_STRING_CHARS} chars elided')}"
+    if len(line) <= COMPACT_MAX_STRING_CHARS:
+        return line
+    return _STRING.sub(shorten, line)
+
+
+def is_data_line(line: str) -> bool:
+    """Whether a line holds only literals, brackets and separators, such as a row of a lookup table.
+
+    Scanned token by token rather than with one pattern, so lines that almost match
+    cost linear time.
+    """
+    if len(line) > COMPACT_MAX_LINE_CHARS:
+        return False
+    end = len(line.rstrip())
+    position, literals, after_literal = 0, 0, False
+    while position < end:
+        match = _DATA_TOKEN.match(line, position, end)
+        if match is None:
+            return False
+        is_literal = match.group(1) is not None
+        if is_literal and after_literal:
+            return False
+        after_literal = is_literal
+        literals += is_literal
+        position = match.end()
+    return literals > 0
+
+
+def collapse_data_runs(lines: List[str], filename: str) -> List[str]:
+    """Keep the first few lines of each long run of literal-only lines, such as lookup tables."""
+    result: List[str] = []
+    run: List[str] = []
+
+    def flush() -> None:
+        if len(run) > COMPACT_MAX_DATA_LINES:
+            indent = run[0][:len(run[0]) - len(run[0].lstrip())]
+            result.extend(run[:COMPACT_KEEP_DATA_LINES])
+            result.append(indent + placeholder(filename, f"{len(run) - COMPACT_KEEP_DATA_LINES} more lines of data elided"))
+        else:
+            result.extend(run)
+        run.clear()
+
+    for line in lines:
+        if is_data_line(line):
+            run.append(line)
+            continue
+        flush()
+        result.append(line)
+    flush()
+    return result
+
+
+def compact(content: str, filename: str, drop_bodies: bool = False) -> str:
+    """Shrink source for a prompt without changing what it documents.
+
+    Removes a leading license header, comment banners, trailing whitespace and runs of
+    blank lines, and cuts long string literals, long lines and long literal data
+    tables down to a placeholder. With ``drop_bodies``, long Python function bodies
+    are also replaced by ``...`` while signatures and docstrings stay.
+    """
+    if drop_bodies and filename.lower().endswith(".py"):
+        content = drop_python_bodies(content, COMPACT_MAX_BODY_LINES)
+    lines = strip_license_header(content.split("\n"))
+    lines = [shorten_strings(line.rstrip(), filename) for line in lines if not _BANNER.match(line)]
+    lines = collapse_data_runs(lines, filename)
+    compacted: List[str] = []
+    for line in lines:
+        if len(line) > COMPACT_MAX_LINE_CHARS:
+            line = line[:COMPACT_MAX_LINE_CHARS] + " " + placeholder(filename, f"{len(line) - COMPACT_MAX_LINE_CHARS} chars elided")
+        if line or (compacted and compacted[-1]):
+            compacted.append(line)
+    return "\n".join(compacted).strip("\n") + "\n"
+
+
+def compaction_for(enabled: bool, drop_bodies: bool) -> Optional["Compaction"]:
+    """The compaction a request asked for; dropping bodies implies compacting."""
+    return Compaction(drop_bodies) if enabled or drop_bodies else None
+
+
+class Compaction:
+    """Compacts the files of one run and keeps the tokens saved per file."""
+
+    def __init__(self, drop_bodies: bool = False):
+        self.drop_bodies = drop_bodies
+        self.tokens_saved: Dict[str, int] = {}
+
+    def apply(self, path: str, content: str) -> Tuple[str, List[int]]:
+        """The compacted content and its tokens."""
+        compacted = compact(content, path, self.drop_bodies)
+        tokens = encode(compacted)
+        saved = len(encode(content)) - len(tokens)
+        self.tokens_saved[path] = saved
+        logger.info(f"Compaction saved {saved} tokens on {path}")
+        return compacted, tokens
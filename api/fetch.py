@@ -1,57 +1,372 @@
+import io
+import os
 import httpx
 import logging
+import tarfile
+import tempfile
+import threading
+import concurrent.futures
+from typing import Optional, Dict, List, AsyncIterator, Callable, Tuple
 from fastapi import APIRouter, HTTPException
 from fastapi.responses import JSONResponse
 import asyncio
+from .cache import DiskLRUStore
+from .http_client import get_http_client
+from .github import GITHUB_API_BASE, GITHUB_CONCURRENCY, github_get
+from .scheduler import iter_bounded
+from .streaming import ndjson_response
+from .triage import GITATTRIBUTES, Triage, content_digest
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
-GITHUB_API_BASE = "https://api.github.com"
+# Git blob SHAs are content addresses, so cached blobs never need invalidation
+BLOB_STORE_DIR = os.getenv("BLOB_STORE_DIR", os.path.join(tempfile.gettempdir(), "codemyth", "blobs"))
+BLOB_STORE_MAX_BYTES = int(os.getenv("BLOB_STORE_MAX_BYTES", str(512 * 1024 * 1024)))
+BLOB_STORE = DiskLRUStore(BLOB_STORE_DIR, BLOB_STORE_MAX_BYTES)
+
+ARCHIVE_MAX_FILE_BYTES = int(os.getenv("ARCHIVE_MAX_FILE_BYTES", str(1024 * 1024)))  # Larger archive entries are skipped
+ARCHIVE_STREAM_BUFFER = int(os.getenv("ARCHIVE_STREAM_BUFFER", "16"))  # Extracted files waiting for a slow NDJSON client
 
 CODE_EXTENSIONS = {".py", ".js", ".jsx", ".ts", ".tsx", ".java", ".go", ".rb", ".php", ".cpp", ".c", ".cs"}
 
 def is_code_file(filename: str) -> bool:
     return any(filename.endswith(ext) for ext in CODE_EXTENSIONS)
 
-async def fetch_file_content(client: httpx.AsyncClient, owner: str, repo: str, path: str, access_token: str):
-    """Fetch raw content of a single file from GitHub."""
-    url = f"{GITHUB_API_BASE}/repos/{owner}/{repo}/contents/{path}"
+async def fetch_file_content(owner: str, repo: str, path: str, access_token: str, sha: Optional[str] = None):
+    """Fetch raw content of a single file from GitHub, served from the blob store when its SHA is known."""
+    if sha:
+        cached = await BLOB_STORE.aget(sha)
+        if cached is not None:
+            return {"path": path, "content": cached.decode("utf-8", errors="replace"), "sha": sha}
+        url = f"{GITHUB_API_BASE}/repos/{owner}/{repo}/git/blobs/{sha}"
+    else:
+        url = f"{GITHUB_API_BASE}/repos/{owner}/{repo}/contents/{path}"
     headers = {"Authorization": f"Bearer {access_token}", "Accept": "application/vnd.github.v3.raw"}
 
-    response = await client.get(url, headers=headers)
+    # Blobs are immutable and already kept in the blob store, so only path lookups are revalidated
+    try:
+        response = await github_get(url, headers, revalidate=sha is None)
+    except httpx.TransportError as e:
+        logger.error(f"Failed to fetch file {path}: {str(e)}")
+        return None
     if response.status_code != 200:
         logger.error(f"Failed to fetch file {path}: {response.text}")
         return None
 
+    if sha:
+        await BLOB_STORE.aset(sha, response.content)
+        return {"path": path, "content": response.text, "sha": sha}
     return {"path": path, "content": response.text}
 
+async def fetch_tree(owner: str, repo: str, tree_ish: str, access_token: str) -> dict:
+    """Fetch the recursive git tree for a branch, commit or tree SHA."""
+    tree_url = f"{GITHUB_API_BASE}/repos/{owner}/{repo}/git/trees/{tree_ish}?recursive=1"
+    headers = {"Authorization": f"Bearer {access_token}", "Accept": "application/vnd.github.v3+json"}
+
+    tree_response = await github_get(tree_url, headers)
+    if tree_response.status_code != 200:
+        logger.error(f"Failed to fetch repo tree {tree_ish}: {tree_response.text}")
+        raise HTTPException(status_code=tree_response.status_code, detail="Failed to fetch repository tree.")
+
+    tree_data = tree_response.json()
+    if tree_data.get("truncated"):
+        logger.warning(f"Tree for {owner}/{repo}@{tree_ish} was truncated by GitHub")
+    return tree_data
+
+def code_blobs(tree_data: dict) -> Dict[str, str]:
+    """Map path -> blob SHA for every code file in a tree."""
+    return {
+        item["path"]: item["sha"]
+        for item in tree_data.get("tree", [])
+        if item["type"] == "blob" and is_code_file(item["path"])
+    }
+
+def diff_trees(old_blobs: Dict[str, str], new_blobs: Dict[str, str]) -> Dict[str, List[str]]:
+    """Classify paths as added, changed or deleted between two trees."""
+    return {
+        "added": sorted(path for path in new_blobs if path not in old_blobs),
+        "changed": sorted(path for path, sha in new_blobs.items() if path in old_blobs and old_blobs[path] != sha),
+        "deleted": sorted(path for path in old_blobs if path not in new_blobs),
+    }
+
+class AsyncByteStreamReader(io.RawIOBase):
+    """Blocking file object over an async byte iterator, for use from a worker thread.
+
+    Each read pulls the next chunk through the event loop, so the archive is never
+    buffered beyond one network chunk and the download is paced by the reader.
+    """
+
+    def __init__(self, chunks: AsyncIterator[bytes], loop: asyncio.AbstractEventLoop):
+        self._chunks = chunks
+        self._loop = loop
+        self._buffer = memoryview(b"")
+        self._eof = False
+
+    def readable(self) -> bool:
+        return True
+
+    async def _next_chunk(self) -> bytes:
+        return await self._chunks.__anext__()
+
+    def readinto(self, b) -> int:
+        while not self._buffer:
+            if self._eof:
+                return 0
+            try:
+                chunk = asyncio.run_coroutine_threadsafe(self._next_chunk(), self._loop).result()
+            except StopAsyncIteration:
+                self._eof = True
+                return 0
+            self._buffer = memoryview(chunk)
+        size = min(len(b), len(self._buffer))
+        b[:size] = self._buffer[:size]
+        self._buffer = self._buffer[size:]
+        return size
+
+def read_code_entries(
+    fileobj,
+    max_file_bytes: int,
+    emit: Optional[Callable[[Dict[str, str]], None]] = None,
+    triage: Optional[Triage] = None,
+) -> Tuple[List[Dict[str, str]], List[str]]:
+    """Stream a gzipped tarball and keep code files, dropping the archive's top-level directory.
+
+    With ``emit``, each file is handed to it as soon as it is extracted instead of being
+    collected. With ``triage``, files it rejects are left out; a .gitattributes entry
+    updates its rules for the entries that follow it.
+    """
+    files = []
+    skipped = []
+    with tarfile.open(fileobj=fileobj, mode="r|gz") as archive:
+        for member in archive:
+            if not member.isfile():
+                continue
+            path = member.name.split("/", 1)[1] if "/" in member.name else member.name
+            if triage is not None and path == GITATTRIBUTES:
+                triage.add_gitattributes(archive.extractfile(member).read().decode("utf-8", errors="replace"))
+                continue
+            if not is_code_file(path) or (triage is not None and not triage.check_path(path)):
+                continue
+            if member.size > max_file_bytes:
+                skipped.append(path)
+                continue
+            data = archive.extractfile(member).read()
+            file = {"path": path, "content": data.decode("utf-8", errors="replace")}
+            if triage is not None and not (triage.check_content(path, file["content"]) and triage.check_duplicate(path, content_digest(file["content"]))):
+                continue
+            if emit is None:
+                files.append(file)
+            else:
+                emit(file)
+    return files, skipped
+
+async def open_repository_archive(client: httpx.AsyncClient, owner: str, repo: str, ref: str, access_token: str) -> httpx.Response:
+    """Start downloading the tarball for ``ref``; the caller reads and closes the streamed response."""
+    url = f"{GITHUB_API_BASE}/repos/{owner}/{repo}/tarball/{ref}"
+    headers = {"Authorization": f"Bearer {access_token}", "Accept": "application/vnd.github+json"}
+
+    response = await client.send(client.build_request("GET", url, headers=headers), stream=True, follow_redirects=True)
+    if response.status_code != 200:
+        await response.aread()
+        await response.aclose()
+        logger.error(f"Failed to fetch repo archive: {response.text}")
+        raise HTTPException(status_code=response.status_code, detail="Failed to fetch repository archive.")
+    return response
+
+async def fetch_repository_archive(
+    client: httpx.AsyncClient, owner: str, repo: str, ref: str, access_token: str, triage: Optional[Triage] = None
+) -> Tuple[List[Dict[str, str]], List[str]]:
+    """Download the tarball for ``ref`` once and extract code files without writing it to disk."""
+    response = await open_repository_archive(client, owner, repo, ref, access_token)
+    try:
+        reader = io.BufferedReader(AsyncByteStreamReader(response.aiter_bytes(), asyncio.get_running_loop()))
+        return await asyncio.to_thread(read_code_entries, reader, ARCHIVE_MAX_FILE_BYTES, None, triage)
+    finally:
+        await response.aclose()
+
+async def iter_archive_files(response: httpx.Response, skipped: List[str], triage: Optional[Triage] = None) -> AsyncIterator[Dict[str, str]]:
+    """Yield code files from an opened archive download as they are extracted.
+
+    Extraction runs in a worker thread that waits while ``ARCHIVE_STREAM_BUFFER`` files
+    are unsent, so a slow client slows the download instead of filling memory. Paths
+    too large to include are added to ``skipped``.
+    """
+    loop = asyncio.get_running_loop()
+    ready: asyncio.Queue = asyncio.Queue(ARCHIVE_STREAM_BUFFER)
+    stop = threading.Event()
+    done = object()
+
+    def emit(item) -> None:
+        future = asyncio.run_coroutine_threadsafe(ready.put(item), loop)
+        while True:
+            try:
+                return future.result(timeout=0.5)
+            except concurrent.futures.TimeoutError:
+                if stop.is_set():
+                    future.cancel()
+                    raise RuntimeError("Archive stream closed by the client")
+
+    def extract() -> None:
+        try:
+            reader = io.BufferedReader(AsyncByteStreamReader(response.aiter_bytes(), loop))
+            skipped.extend(read_code_entries(reader, ARCHIVE_MAX_FILE_BYTES, emit, triage)[1])
+        finally:
+            if not stop.is_set():
+                emit(done)
+
+    worker = asyncio.create_task(asyncio.to_thread(extract))
+    try:
+        while (item := await ready.get()) is not done:
+            yield item
+        await worker  # Re-raise extraction errors
+    finally:
+        stop.set()
+        await response.aclose()
+        await asyncio.gather(worker, return_exceptions=True)
+
+def code_entries(tree_data: dict, paths: List[str]) -> List[Dict]:
+    """Path, blob SHA and size of the given code files, in tree order."""
+    wanted = set(paths)
+    return [
+        {"path": item["path"], "sha": item["sha"], "size": item.get("size")}
+        for item in tree_data.get("tree", [])
+        if item["type"] == "blob" and item["path"] in wanted
+    ]
+
+async def iter_file_contents(
+    owner: str, repo: str, access_token: str, blobs: Dict[str, str], paths: List[str], failed: List[str], triage: Triage
+) -> AsyncIterator[Dict[str, str]]:
+    """Yield files as their fetches complete; paths that still fail after retries go to ``failed``.
+
+    Files whose content the triage rejects are dropped. At most ``GITHUB_CONCURRENCY``
+    fetched files wait for a slow client, so memory stays bounded by the files in flight.
+    """
+    jobs = [lambda path=path: fetch_file_content(owner, repo, path, access_token, blobs[path]) for path in paths]
+    async for index, file in iter_bounded(jobs, GITHUB_CONCURRENCY, max_pending=GITHUB_CONCURRENCY):
+        if file is None:
+            failed.append(paths[index])
+        elif triage.check_content(file["path"], file["content"]):
+            yield file
+
+async def repository_triage(owner: str, repo: str, access_token: str, tree_data: dict) -> Triage:
+    """A triage for the files of a tree that honours the repository's .gitattributes."""
+    item = next((item for item in tree_data.get("tree", []) if item["path"] == GITATTRIBUTES and item["type"] == "blob"), None)
+    file = await fetch_file_content(owner, repo, GITATTRIBUTES, access_token, item["sha"]) if item else None
+    return Triage(is_code_file, file["content"] if file else "")
+
 @router.get("/github/repo/{owner}/{repo}/files")
-async def get_repository_code_files(owner: str, repo: str, branch: str = "main", access_token: str = ""):
+async def get_repository_code_files(
+    owner: str,
+    repo: str,
+    branch: str = "main",
+    access_token: str = "",
+    since_tree: Optional[str] = None,
+    archive: bool = False,
+    format: str = "json",
+    gzip: bool = False,
+    metadata_only: bool = False,
+):
     """
     Retrieve code-related files from the repository without cloning.
+
+    Blobs are cached by SHA, so unchanged files are never downloaded twice. When
+    ``since_tree`` is given, only files added or changed since that tree are
+    returned, together with the deleted paths. With ``archive``, the branch
+    tarball is downloaded in a single request instead.
+
+    With ``format=ndjson`` each file is sent as a line of its own as soon as it is
+    fetched (gzip-compressed with ``gzip``), followed by a last line holding
+    ``"done": true`` and the fields the JSON response has besides ``files``.
+    ``metadata_only`` returns path, SHA and size of each file without contents.
+    Vendored, generated and duplicate files are left out and listed under ``excluded``
+    with the reason (see ``api/triage.py``).
     """
     if not access_token:
         raise HTTPException(status_code=401, detail="Access token required.")
+    if format not in ("json", "ndjson"):
+        raise HTTPException(status_code=400, detail="format must be 'json' or 'ndjson'.")
+    if gzip and format != "ndjson":
+        raise HTTPException(status_code=400, detail="gzip is only supported with format=ndjson.")
+    ndjson = format == "ndjson"
 
-    tree_url = f"{GITHUB_API_BASE}/repos/{owner}/{repo}/git/trees/{branch}?recursive=1"
-    headers = {"Authorization": f"Bearer {access_token}", "Accept": "application/vnd.github.v3+json"}
+    if archive:
+        if since_tree or metadata_only:
+            raise HTTPException(status_code=400, detail="since_tree and metadata_only are not supported in archive mode.")
+        client = get_http_client()
+        triage = Triage(is_code_file)
+        if ndjson:
+            response = await open_repository_archive(client, owner, repo, branch, access_token)
+            skipped: List[str] = []
+
+            async def archive_lines():
+                try:
+                    async for file in iter_archive_files(response, skipped, triage):
+                        yield file
+                except Exception as e:
+                    logger.error(f"Streaming {repo} archive failed: {str(e)}")
+                    yield {"done": False, "error": str(e)}
+                    return
+                yield {"done": True, "skipped": skipped, "excluded": triage.skipped}
+
+            return ndjson_response(archive_lines(), gzip)
+        valid_files, skipped = await fetch_repository_archive(client, owner, repo, branch, access_token, triage)
+        logger.info(f"Fetched {len(valid_files)} code files from {repo} archive, skipped {len(skipped)} oversized, excluded {len(triage.skipped)}.")
+        return {"files": valid_files, "skipped": skipped, "excluded": triage.skipped}
+
+    tree_data = await fetch_tree(owner, repo, branch, access_token)
+    blobs = code_blobs(tree_data)
+
+    changes = None
+    if since_tree:
+        old_blobs = code_blobs(await fetch_tree(owner, repo, since_tree, access_token))
+        changes = diff_trees(old_blobs, blobs)
+        wanted = changes["added"] + changes["changed"]
+    else:
+        wanted = list(blobs)
+    # Identical content has the same blob SHA, so duplicates are dropped before any download
+    triage = await repository_triage(owner, repo, access_token, tree_data)
+    wanted = [path for path in wanted if triage.check_path(path) and triage.check_duplicate(path, blobs[path])]
+
+    summary = {"tree_sha": tree_data.get("sha")}
+    if changes is not None:
+        summary["since_tree"] = since_tree
+        summary["deleted"] = changes["deleted"]
 
-    async with httpx.AsyncClient() as client:
-        tree_response = await client.get(tree_url, headers=headers)
-        if tree_response.status_code != 200:
-            logger.error(f"Failed to fetch repo tree: {tree_response.text}")
-            raise HTTPException(status_code=tree_response.status_code, detail="Failed to fetch repository tree.")
+    if metadata_only:
+        entries = code_entries(tree_data, wanted)
+        if ndjson:
+            async def metadata_lines():
+                for entry in entries:
+                    yield entry
+                yield {"done": True, **summary, "excluded": triage.skipped}
+            return ndjson_response(metadata_lines(), gzip)
+        return {"files": entries, **summary, "excluded": triage.skipped}
 
-        tree_data = tree_response.json()
-        code_files = [item["path"] for item in tree_data.get("tree", []) if item["type"] == "blob" and is_code_file(item["path"])]
+    failed: List[str] = []
+    if ndjson:
+        async def file_lines():
+            try:
+                async for file in iter_file_contents(owner, repo, access_token, blobs, wanted, failed, triage):
+                    yield file
+            except Exception as e:
+                logger.error(f"Streaming files from {repo} failed: {str(e)}")
+                yield {"done": False, "error": str(e)}
+                return
+            if failed:
+                logger.warning(f"Could not fetch {len(failed)} files from {repo} after retries")
+            yield {"done": True, **summary, "failed": failed, "excluded": triage.skipped}
+        return ndjson_response(file_lines(), gzip)
 
-        # Fetch file contents asynchronously
-        tasks = [fetch_file_content(client, owner, repo, file_path, access_token) for file_path in code_files]
-        file_contents = await asyncio.gather(*tasks)
+    # Fetch file contents asynchronously; github_get caps how many are in flight
+    tasks = [fetch_file_content(owner, repo, file_path, access_token, blobs[file_path]) for file_path in wanted]
+    file_contents = await asyncio.gather(*tasks)
 
-        # Filter out None results
-        valid_files = [file for file in file_contents if file is not None]
+    # Report files that still failed after retries instead of silently dropping them
+    valid_files = [file for file in file_contents if file is not None and triage.check_content(file["path"], file["content"])]
+    failed = [file_path for file_path, file in zip(wanted, file_contents) if file is None]
+    if failed:
+        logger.warning(f"Could not fetch {len(failed)} files from {repo} after retries")
 
-    logger.info(f"Fetched {len(valid_files)} code files from {repo}.")
-    return {"files": valid_files}
+    logger.info(f"Fetched {len(valid_files)} code files from {repo}, excluded {len(triage.skipped)}. Blob store (process-wide): {BLOB_STORE.stats()}")
+    return {"files": valid_files, **summary, "failed": failed, "excluded": triage.skipped}
@@ -1,20 +1,36 @@
 import logging
-from fastapi import APIRouter, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi import Body
 from langchain_ollama import OllamaLLM
+from langchain_core.callbacks import AsyncCallbackHandler
 from langchain.prompts import PromptTemplate
-from langchain.text_splitter import RecursiveCharacterTextSplitter
 from .schemas import FeedbackInput, FeedbackResponse, DocumentationResponse,FileInput,AcceptChangesInput
+from .cache import DOC_CACHE, doc_cache_key
+from .scheduler import run_bounded
+from .http_client import get_http_client
+from .github import GITHUB_API_BASE
+from .storage import DOC_STORE
+from .chunking import encode
+from .streaming import sse_event, token_event, interleave, iter_ndjson, UploadStreamingResponse
+from .jobs import JOB_QUEUE, Job
+from .batching import FILE_START, FILE_END, pack_batches, render_batch, split_batch_response
+from .summaries import build_rollups, overview_of
+from .metrics import LLM_CALL_SECONDS, model_label, record_tokens, timed, token_usage
+from .timing import span
+from .triage import GITATTRIBUTES, Triage, gitattributes_of
+from .compaction import Compaction, compaction_for
+from .planning import PlannedFile, is_code_file, iter_documented_files, plan_documentation, planned_chunks
+from .models import model_spec
+from .sections import SECTION_START, SECTION_END, index_sections, match_sections, parse_sections, render_sections, section_outline, splice_sections
 import asyncio
 import uuid
 import tiktoken
-import requests, base64
-from typing import List, Dict
+import base64
+from typing import List, Dict, Tuple, AsyncGenerator, AsyncIterator, Optional, Callable
 import json
 import os
 from dotenv import load_dotenv
-import datetime
 
 load_dotenv()
 
@@ -22,14 +38,11 @@ logger = logging.getLogger(__name__)
 router = APIRouter()
 
 
-MODEL_NAME = "granite3.1-dense:2b"
+MODEL_NAME = os.getenv("MODEL_NAME", "granite3.1-dense:2b")
+MODEL = model_spec(MODEL_NAME, "ollama")
 OLLAMA_BASE_URL = os.getenv('OLLAMA_BASE_URL')
-llm = OllamaLLM(model=MODEL_NAME, base_url=OLLAMA_BASE_URL)
-
-CODE_EXTENSIONS = {
-    '.py', '.js', '.jsx', '.java', '.cpp', '.c', '.cs', '.ts',
-    '.rb', '.php', '.go', '.rs', '.swift', '.kt', '.tsx'
-}
+# Generation is capped at the output budget the chunk sizes leave room for, so replies never push the prompt out of the window
+llm = OllamaLLM(model=MODEL_NAME, base_url=OLLAMA_BASE_URL, num_ctx=MODEL.context_tokens, num_predict=MODEL.max_output_tokens)
 
 DOC_TEMPLATE = """
 ### {filename}
@@ -49,10 +62,13 @@ This document provides a comprehensive overview and detailed documentation for t
 ## Table of Contents
 {table_of_contents}
 
-## File Documentation
+{summaries}## File Documentation
 {file_documentation}
 """
 
+# Sent ahead of the file sections when streaming; the table of contents follows at the end
+STREAM_HEADER = "# Developer Documentation\n\n## Introduction\nThis document provides a comprehensive overview and detailed documentation for the code files in this project.\n\n## File Documentation\n"
+
 DOC_PROMPT = PromptTemplate(
     input_variables=["code", "filename"],
     template="""
@@ -66,174 +82,680 @@ DOC_PROMPT = PromptTemplate(
     """
 )
 
-tokenizer = tiktoken.get_encoding("cl100k_base")
-MAX_TOKENS = 4000
-
-def is_code_file(filename: str) -> bool:
-    return any(filename.lower().endswith(ext) for ext in CODE_EXTENSIONS)
-
-def chunk_code(content: str, filename: str, max_tokens: int = MAX_TOKENS) -> List[Dict[str, str]]:
-    if not is_code_file(filename):
-        return []
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=max_tokens,
-        chunk_overlap=200,
-        length_function=lambda x: len(tokenizer.encode(x)),
-    )
-    chunks = text_splitter.split_text(content)
-    return [{"path": filename, "content": chunk, "chunk_id": i} for i, chunk in enumerate(chunks)]
+BATCH_PROMPT = PromptTemplate(
+    input_variables=["files"],
+    template="""
+    You are a senior developer tasked with generating concise and accurate documentation for each of the following code files.
+    For every file, provide an overview of what the code does and detailed explanations of its key components (e.g., functions, classes).
+    Use markdown formatting and include "#### Details" as a header to separate the overview from the detailed explanation.
+    Start the documentation of each file with a line {file_start} using the file's path exactly as given, and end it with a line {file_end}.
 
-async def generate_doc_chunk(chunk: Dict[str, str]) -> str:
+    {files}
+    """
+)
+
+SUMMARY_PROMPT = PromptTemplate(
+    input_variables=["kind", "name", "parts"],
+    template="""
+    You are a senior developer summarizing documentation. Below are summaries of the parts of the {kind} {name}.
+    Write a concise summary (one or two paragraphs) of what the {kind} as a whole does and how its parts fit together.
+    Do not describe the parts one by one and do not use headings.
+
+    {parts}
+    """
+)
+
+TokenCallback = Callable[[Dict[str, str], str], None]
+
+tokenizer = tiktoken.get_encoding("cl100k_base")
+MAX_TOKENS = MODEL.chunk_tokens  # Code tokens per chunk that fit the model's context next to its reply
+BATCH_DOC_TOKENS = 256  # Expected reply tokens per file in a batched prompt
+OLLAMA_CONCURRENCY = int(os.getenv("OLLAMA_CONCURRENCY", "4"))  # Max LLM calls in flight per request
+BATCH_FILE_MAX_TOKENS = int(os.getenv("BATCH_FILE_MAX_TOKENS", "1000"))  # Files up to this size can share a prompt
+BATCH_TOKEN_BUDGET = int(os.getenv("BATCH_TOKEN_BUDGET", str(MAX_TOKENS)))  # Code tokens per batched prompt
+BATCH_MAX_FILES = int(os.getenv("BATCH_MAX_FILES", str(max(1, MODEL.max_output_tokens // BATCH_DOC_TOKENS))))  # Files per batched prompt, bounded by what the model can answer in one reply
+SUMMARY_INPUT_TOKENS = int(os.getenv("SUMMARY_INPUT_TOKENS", str(MAX_TOKENS)))  # Child summaries per reduce call; more are reduced in stages
+REFINE_MAX_SECTIONS = int(os.getenv("REFINE_MAX_SECTIONS", "8"))  # Sections sent to the LLM per refinement
+REFINE_CONTEXT_TOKENS = int(os.getenv(
+    "REFINE_CONTEXT_TOKENS", str(min(MODEL.input_tokens // 2, int(MODEL.max_output_tokens / MODEL.tokenizer_ratio)))
+))  # Budget for section text in a refinement prompt; the revised sections have to fit the output budget
+INGEST_FILES_IN_FLIGHT = int(os.getenv("INGEST_FILES_IN_FLIGHT", str(OLLAMA_CONCURRENCY * 4)))  # Uploaded files held while being documented; reading pauses at this limit
+INGEST_MAX_LINE_BYTES = int(os.getenv("INGEST_MAX_LINE_BYTES", str(32 * 1024 * 1024)))  # Largest single NDJSON line (one file) accepted
+
+class TokenForwarder(AsyncCallbackHandler):
+    """Passes each generated fragment on while the LLM streams."""
+
+    def __init__(self, forward: Callable[[str], None]):
+        self.forward = forward
+
+    async def on_llm_new_token(self, token: str, **kwargs) -> None:
+        self.forward(token)
+
+async def call_llm(prompt: str, kind: str, on_text: Optional[Callable[[str], None]] = None) -> str:
+    """One Ollama call, timed and with its token counts recorded.
+
+    With ``on_text``, output is streamed and each fragment is passed to it; the counts
+    still come from the final message of the stream.
+    """
+    callbacks = [TokenForwarder(on_text)] if on_text is not None else None
+    with timed(LLM_CALL_SECONDS, "llm", backend="ollama", model=model_label(MODEL_NAME), kind=kind):
+        response = await llm.agenerate([prompt], callbacks=callbacks)
+    generation = response.generations[0][0]
+    info = generation.generation_info or {}
+    record_tokens("ollama", MODEL_NAME, info.get("prompt_eval_count"), info.get("eval_count"))
+    return generation.text
+
+async def generate_doc_chunk(chunk: Dict[str, str], use_cache: bool = True, on_token: Optional[TokenCallback] = None) -> str:
+    """Document one chunk. With ``on_token``, output is streamed and each fragment is passed on as it arrives."""
+    cache_key = doc_cache_key(chunk["content"], chunk["path"], DOC_PROMPT.template, MODEL_NAME)
+    if use_cache:
+        cached = await DOC_CACHE.aget(cache_key)
+        if cached is not None:
+            if on_token is not None:
+                on_token(chunk, cached)
+            return cached
     prompt = DOC_PROMPT.format(code=chunk["content"], filename=chunk["path"])
-    response = await llm.agenerate([prompt])
-    return response.generations[0][0].text
+    text = await call_llm(prompt, "chunk", (lambda token: on_token(chunk, token)) if on_token is not None else None)
+    await DOC_CACHE.aset(cache_key, text)
+    return text
+
+async def generate_doc_batch(chunks: List[Dict[str, str]], use_cache: bool = True, on_token: Optional[TokenCallback] = None) -> List[str]:
+    """Document several small files with one LLM call.
 
-async def generate_full_documentation(files: List[Dict[str, str]]) -> List[Dict[str, str]]:
+    Each file's section is cached under the same key as a single-file call. Files the
+    reply has no delimited section for are documented individually.
+    """
+    prompt = BATCH_PROMPT.format(files=render_batch(chunks), file_start=FILE_START.format(path="<path>"), file_end=FILE_END)
+    sections = split_batch_response(await call_llm(prompt, "batch"), [chunk["path"] for chunk in chunks])
     docs = []
-    for file in files:
-        filename = file["path"]
-        content = file["content"]
-        
-        if not is_code_file(filename):
-            logger.info(f"Skipping non-code file: {filename}")
+    for chunk in chunks:
+        doc = sections.get(chunk["path"])
+        if doc is None:
+            logger.warning(f"Batched reply has no section for {chunk['path']}; documenting it on its own")
+            # Batched files were cache misses when planned, so there is no need to look again
+            docs.append(await generate_doc_chunk(chunk, False, on_token))
             continue
+        await DOC_CACHE.aset(doc_cache_key(chunk["content"], chunk["path"], DOC_PROMPT.template, MODEL_NAME), doc)
+        if on_token is not None:
+            on_token(chunk, doc)
+        docs.append(doc)
+    logger.info(f"Batched {len(chunks)} files into one prompt ({len(chunks) - len(sections)} retried individually)")
+    return docs
 
-        token_count = len(tokenizer.encode(content))
-        if token_count <= MAX_TOKENS:
-            doc_content = await generate_doc_chunk(file)
-            if "#### Details" in doc_content:
-                parts = doc_content.split("#### Details")
-                overview = parts[0].strip()
-                details = "#### Details" + (parts[1] if len(parts) > 1 else "")
-            else:
-                logger.warning(f"No '#### Details' found in documentation for {filename}")
-                overview = doc_content.strip()
-                details = ""
-            docs.append({"filename": filename, "documentation": DOC_TEMPLATE.format(filename=filename, overview=overview, details=details)})
-        else:
-            chunks = chunk_code(content, filename)
-            if chunks:
-                chunk_docs = await asyncio.gather(*(generate_doc_chunk(chunk) for chunk in chunks))
-                overview = "This file is large and has been split into chunks. Below is a summary of each part.\n"
-                details = "\n".join([f"#### Chunk {i}\n{doc}" for i, doc in enumerate(chunk_docs)])
-                docs.append({"filename": filename, "documentation": DOC_TEMPLATE.format(filename=filename, overview=overview, details=details)})
+async def summarize_node(
+    kind: str, name: str, parts: List[str], use_cache: bool = True, slots: Optional[asyncio.Semaphore] = None
+) -> str:
+    """Reduce child summaries into one summary of a file, directory or the project.
+
+    The result is cached under the hash of the children, so a node is only recomputed
+    when something beneath it changed. Inputs over ``SUMMARY_INPUT_TOKENS`` are reduced
+    in groups first. With ``slots``, each LLM call waits for one of them, so summaries
+    share the concurrency limit of the calls they run alongside.
+    """
+    label = f"`{name}`" if name else ""
+    # Each part gets at most half the budget, so every group reduces at least two of them
+    limit = max(1, SUMMARY_INPUT_TOKENS // 2)
+    part_tokens = [encode(part) for part in parts]
+    parts = [part if len(tokens) <= limit else tokenizer.decode(tokens[:limit]) for part, tokens in zip(parts, part_tokens)]
+    sizes = [min(len(tokens), limit) for tokens in part_tokens]
+    if sum(sizes) > SUMMARY_INPUT_TOKENS:
+        groups = pack_batches(sizes, SUMMARY_INPUT_TOKENS, len(parts))
+        parts = await run_bounded(
+            [lambda group=group: summarize_node(kind, name, [parts[i] for i in sorted(group)], use_cache, slots) for group in groups],
+            OLLAMA_CONCURRENCY,
+        )
+        return await summarize_node(kind, name, parts, use_cache, slots)
+
+    joined = "\n\n".join(parts)
+    cache_key = doc_cache_key(joined, f"{kind}:{name}", SUMMARY_PROMPT.template, MODEL_NAME)
+    if use_cache:
+        cached = await DOC_CACHE.aget(cache_key)
+        if cached is not None:
+            return cached
+    prompt = SUMMARY_PROMPT.format(kind=kind, name=label, parts=joined)
+    if slots is None:
+        summary = (await call_llm(prompt, "summary")).strip()
+    else:
+        async with slots:
+            summary = (await call_llm(prompt, "summary")).strip()
+    await DOC_CACHE.aset(cache_key, summary)
+    return summary
+
+async def summarize_documentation(individual_docs: List[Dict[str, str]], use_cache: bool = True) -> str:
+    """Project overview and directory summaries, rolled up from the file documentation."""
+    file_summaries = {doc["filename"]: doc.get("summary") or overview_of(doc["documentation"]) for doc in individual_docs}
+    overview, directories = await build_rollups(
+        file_summaries,
+        lambda kind, name, parts: summarize_node(kind, name, parts, use_cache),
+        OLLAMA_CONCURRENCY,
+    )
+    sections = "".join(f"### {directory}/\n{directories[directory]}\n\n" for directory in sorted(directories))
+    return f"## Project Overview\n{overview}\n\n" + (f"## Directory Summaries\n{sections}" if sections else "")
 
+async def plan_batches(chunk_jobs: List[Dict[str, str]], use_cache: bool) -> Tuple[List[List[int]], Dict[int, str]]:
+    """Group chunk indices into LLM calls, packing small uncached whole files together.
+
+    Small files are looked up in the cache to decide; the docs found are returned by
+    chunk index so they are not looked up again.
+    """
+    groups, small, cached = [], [], {}
+    for index, chunk in enumerate(chunk_jobs):
+        tokens = chunk.get("tokens")
+        if tokens is None or tokens > BATCH_FILE_MAX_TOKENS:
+            groups.append([index])
+            continue
+        doc = await DOC_CACHE.aget(doc_cache_key(chunk["content"], chunk["path"], DOC_PROMPT.template, MODEL_NAME)) if use_cache else None
+        if doc is not None:
+            cached[index] = doc
+            groups.append([index])
+        else:
+            small.append(index)
+    for batch in pack_batches([chunk_jobs[i]["tokens"] for i in small], BATCH_TOKEN_BUDGET, BATCH_MAX_FILES):
+        groups.append([small[i] for i in batch])
+    return groups, cached
+
+def format_file_documentation(filename: str, chunk_docs: List[str], is_chunked: bool, summary: Optional[str] = None) -> str:
+    if not is_chunked:
+        doc_content = chunk_docs[0]
+        if "#### Details" in doc_content:
+            parts = doc_content.split("#### Details")
+            overview = parts[0].strip()
+            details = "#### Details" + (parts[1] if len(parts) > 1 else "")
+        else:
+            logger.warning(f"No '#### Details' found in documentation for {filename}")
+            overview = doc_content.strip()
+            details = ""
+    else:
+        overview = summary or "This file is large and has been split into chunks. Below is a summary of each part.\n"
+        details = "\n".join([f"#### Chunk {i}\n{doc}" for i, doc in enumerate(chunk_docs)])
+    return DOC_TEMPLATE.format(filename=filename, overview=overview, details=details)
+
+async def document_file(
+    filename: str, chunk_docs: List[str], is_chunked: bool, summarize: bool, use_cache: bool, slots: asyncio.Semaphore
+) -> Dict[str, str]:
+    """The doc of a file whose chunks are done, with a file summary of large files when asked for."""
+    summary = await summarize_node("file", filename, chunk_docs, use_cache, slots) if summarize and is_chunked else None
+    doc = {"filename": filename, "documentation": format_file_documentation(filename, chunk_docs, is_chunked, summary)}
+    if summary is not None:
+        doc["summary"] = summary
+    return doc
+
+async def iter_file_documentation(
+    planned: List[PlannedFile],
+    use_cache: bool = True,
+    on_token: Optional[TokenCallback] = None,
+    batch: bool = False,
+    summarize: bool = False,
+) -> AsyncGenerator[Tuple[int, Dict[str, str]], None]:
+    """Yield (position, doc) for each planned file as soon as all of its chunks are done.
+
+    With ``batch``, small files are packed several to a prompt instead of one call each.
+    With ``summarize``, the chunk docs of a large file are reduced into a file summary
+    that replaces the generic chunked-file overview; summaries share the LLM
+    concurrency limit with the chunk calls.
+    """
+    chunk_jobs = planned_chunks(planned)
+    groups, cached = await plan_batches(chunk_jobs, use_cache) if batch else (None, {})
+    llm_slots = asyncio.Semaphore(OLLAMA_CONCURRENCY)
+
+    async def run_group(group: List[int]) -> List[str]:
+        if group[0] in cached:
+            if on_token is not None:
+                on_token(chunk_jobs[group[0]], cached[group[0]])
+            return [cached[group[0]]]
+        async with llm_slots:
+            if len(group) == 1:
+                return [await generate_doc_chunk(chunk_jobs[group[0]], use_cache, on_token)]
+            return await generate_doc_batch([chunk_jobs[index] for index in group], use_cache, on_token)
+
+    async def finish(filename: str, chunk_docs: List[str], is_chunked: bool) -> Dict[str, str]:
+        return await document_file(filename, chunk_docs, is_chunked, summarize, use_cache, llm_slots)
+
+    async for position, doc in iter_documented_files(planned, run_group, finish, OLLAMA_CONCURRENCY, groups):
+        yield position, doc
+
+async def iter_streamed_file_documentation(
+    files: AsyncIterator[Dict[str, str]],
+    use_cache: bool = True,
+    on_token: Optional[TokenCallback] = None,
+    summarize: bool = False,
+    triage: Optional[Triage] = None,
+    compaction: Optional[Compaction] = None,
+) -> AsyncGenerator[Tuple[int, Dict[str, str]], None]:
+    """Like ``iter_file_documentation``, for files that are still arriving.
+
+    Each file is planned and started as soon as it is read, with positions in arrival
+    order. Reading pauses while ``INGEST_FILES_IN_FLIGHT`` files are being documented,
+    so only those files' sources are held in memory. Small files are not batched,
+    since that needs the whole input up front. A .gitattributes file in the input
+    updates the triage rules for the files after it.
+    """
+    triage = triage or Triage(is_code_file)
+    file_slots = asyncio.Semaphore(INGEST_FILES_IN_FLIGHT)
+    llm_slots = asyncio.Semaphore(OLLAMA_CONCURRENCY)
+    finished: asyncio.Queue = asyncio.Queue()
+    tasks = set()
+    end_of_input = object()
+
+    async def document_chunk(chunk: Dict[str, str]) -> str:
+        async with llm_slots:
+            return await generate_doc_chunk(chunk, use_cache, on_token)
+
+    async def document(position: int, filename: str, chunks: List[Dict[str, str]], is_chunked: bool) -> None:
+        try:
+            chunk_docs = await asyncio.gather(*(document_chunk(chunk) for chunk in chunks))
+            await finished.put((position, await document_file(filename, chunk_docs, is_chunked, summarize, use_cache, llm_slots)))
+        except Exception as e:
+            await finished.put((position, e))
+        finally:
+            file_slots.release()
+
+    async def feed() -> None:
+        position = 0
+        try:
+            async for file in files:
+                if file["path"] == GITATTRIBUTES:
+                    triage.add_gitattributes(file["content"])
+                    continue
+                await file_slots.acquire()
+                planned = plan_documentation([file], MAX_TOKENS, "ollama", triage, compaction)
+                if not planned:
+                    file_slots.release()
+                    continue
+                filename, chunks, is_chunked = planned[0]
+                task = asyncio.create_task(document(position, filename, chunks, is_chunked))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+                position += 1
+            await finished.put((end_of_input, position))
+        except Exception as e:
+            await finished.put((end_of_input, e))
+
+    feeder = asyncio.create_task(feed())
+    total, yielded = None, 0
+    try:
+        while total is None or yielded < total:
+            position, result = await finished.get()
+            if isinstance(result, Exception):
+                raise result
+            if position is end_of_input:
+                total = result
+                continue
+            yielded += 1
+            yield position, result
+    finally:
+        for task in [feeder, *tasks]:
+            task.cancel()
+        await asyncio.gather(feeder, *tasks, return_exceptions=True)
+
+async def generate_full_documentation(
+    files: List[Dict[str, str]],
+    use_cache: bool = True,
+    batch: bool = False,
+    summarize: bool = False,
+    triage: Optional[Triage] = None,
+    compaction: Optional[Compaction] = None,
+) -> List[Dict[str, str]]:
+    planned = plan_documentation(files, MAX_TOKENS, "ollama", triage, compaction)
+    docs = [None] * len(planned)
+    async for position, doc in iter_file_documentation(planned, use_cache, batch=batch, summarize=summarize):
+        docs[position] = doc
     return docs
 
-async def generate_unified_documentation(files: List[Dict[str, str]], project_name) -> str:
-    individual_docs = await generate_full_documentation(files)
-    table_of_contents = "\n".join([f"- [{doc['filename']}](#{doc['filename'].replace('.', '-')})" for doc in individual_docs])
-    file_documentation = "\n\n".join(doc["documentation"] for doc in individual_docs)
-    return UNIFIED_DOC_TEMPLATE.format(
-        project_name=project_name,
-        table_of_contents=table_of_contents,
-        file_documentation=file_documentation
-    )
+def build_table_of_contents(individual_docs: List[Dict[str, str]]) -> str:
+    return "\n".join([f"- [{doc['filename']}](#{doc['filename'].replace('.', '-')})" for doc in individual_docs])
+
+def assemble_documentation(individual_docs: List[Dict[str, str]], project_name, summaries: str = "") -> str:
+    with span("assemble"):
+        file_documentation = "\n\n".join(doc["documentation"] for doc in individual_docs)
+        return UNIFIED_DOC_TEMPLATE.format(
+            project_name=project_name,
+            table_of_contents=build_table_of_contents(individual_docs),
+            summaries=summaries,
+            file_documentation=file_documentation
+        )
 
-# In-memory storage
-DOC_STORAGE = {}
+async def generate_unified_documentation(
+    files: List[Dict[str, str]],
+    project_name,
+    use_cache: bool = True,
+    batch: bool = False,
+    summarize: bool = False,
+    triage: Optional[Triage] = None,
+    compaction: Optional[Compaction] = None,
+) -> str:
+    individual_docs = await generate_full_documentation(files, use_cache, batch, summarize, triage, compaction)
+    summaries = await summarize_documentation(individual_docs, use_cache) if summarize and individual_docs else ""
+    logger.info(f"Documentation cache stats (process-wide): {DOC_CACHE.stats()}")
+    return assemble_documentation(individual_docs, project_name, summaries)
 
 @router.post("/generate-docs", response_model=DocumentationResponse)
 async def generate_documentation(data: FileInput = Body(...)):
     files = data.files
     if not files:
         raise HTTPException(status_code=400, detail="No files provided.")
-    unified_docs = await generate_unified_documentation(files, project_name="MyProject")
+    triage = Triage(is_code_file, gitattributes_of(files))
+    compaction = compaction_for(data.compact_prompts, data.drop_function_bodies)
+    unified_docs = await generate_unified_documentation(
+        files, project_name="MyProject", use_cache=not data.force_regenerate, batch=data.batch_small_files,
+        summarize=data.hierarchical_summaries, triage=triage, compaction=compaction,
+    )
     doc_id = str(uuid.uuid4())
-    initial_version = {
-        "version_number": 1,
-        "content": unified_docs,
-        "timestamp": datetime.datetime.now().isoformat(),
-        "feedback": None
-    }
-    DOC_STORAGE[doc_id] = {
-        "versions": [initial_version],
-        "current_version": 1,
-        "chat_history": []
-    }
-    return DocumentationResponse(documentation_id=doc_id, documentation=unified_docs)
+    await DOC_STORE.create(doc_id, unified_docs)
+    return DocumentationResponse(
+        documentation_id=doc_id, documentation=unified_docs, skipped=triage.skipped,
+        tokens_saved=compaction.tokens_saved if compaction else {},
+    )
+
+def documentation_job(files: List[Dict[str, str]], use_cache: bool, batch: bool = False, summarize: bool = False, compaction: Optional[Compaction] = None):
+    """Runner that generates documentation in the background and stores it under the job ID."""
+    async def run(job: Job) -> None:
+        with token_usage() as usage:
+            await generate(job, usage)
+
+    async def generate(job: Job, usage: Dict[str, int]) -> None:
+        triage = Triage(is_code_file, gitattributes_of(files))
+        planned = plan_documentation(files, MAX_TOKENS, "ollama", triage, compaction)
+        docs = [None] * len(planned)
+        # Characters of source drive the ETA, since large files take proportionally longer
+        sizes = [sum(len(chunk["content"]) for chunk in chunks) for _, chunks, _ in planned]
+        job.render_partial = lambda: assemble_documentation([doc for doc in docs if doc is not None], "MyProject")
+        job.update(files_done=0, files_total=len(planned), skipped=triage.skipped, tokens_used=0, work_done=0, work_total=sum(sizes))
+        if compaction is not None:
+            job.update(tokens_saved=compaction.tokens_saved)
+        async for position, doc in iter_file_documentation(planned, use_cache, batch=batch, summarize=summarize):
+            docs[position] = doc
+            job.update(
+                files_done=job.progress["files_done"] + 1,
+                tokens_used=usage["prompt"] + usage["completion"],
+                work_done=job.progress["work_done"] + sizes[position],
+                current_file=doc["filename"],
+            )
+        summaries = ""
+        if summarize and docs:
+            job.update(current_file=None, stage="summaries")
+            summaries = await summarize_documentation(docs, use_cache)
+            job.update(tokens_used=usage["prompt"] + usage["completion"])
+        job.result = assemble_documentation(docs, "MyProject", summaries)
+        await DOC_STORE.create(job.id, job.result)
+        job.update(documentation_id=job.id)
+    return run
+
+@router.post("/jobs/generate-docs", response_model=dict, status_code=202)
+async def submit_documentation_job(data: FileInput = Body(...)):
+    """Queue documentation generation and return a job ID to poll instead of holding the request open."""
+    if not data.files:
+        raise HTTPException(status_code=400, detail="No files provided.")
+    job = JOB_QUEUE.submit(documentation_job(
+        data.files, use_cache=not data.force_regenerate, batch=data.batch_small_files, summarize=data.hierarchical_summaries,
+        compaction=compaction_for(data.compact_prompts, data.drop_function_bodies),
+    ))
+    return {"job_id": job.id, "status": job.status, "queue_depth": JOB_QUEUE.depth()}
+
+async def stream_documentation_events(
+    iter_docs: Callable[[Optional[TokenCallback]], AsyncIterator[Tuple[int, Dict[str, str]]]],
+    doc_id: str,
+    use_cache: bool,
+    stream_tokens: bool,
+    summarize: bool,
+    files_total: Optional[int] = None,
+    skipped: Optional[List[Dict[str, str]]] = None,
+    compaction: Optional[Compaction] = None,
+) -> AsyncGenerator[str, None]:
+    """SSE frames for a generation run: each file as it completes, then the table of contents.
+
+    ``iter_docs`` is called with the token callback (or None) and yields (position, doc).
+    The stored documentation keeps files in position order. ``skipped`` lists the files
+    triage left out and ``compaction`` the tokens it saved, both reported with the
+    ``completed`` event.
+    """
+    docs: Dict[int, Dict[str, str]] = {}
+    yield sse_event({"status": "starting", "message": "Starting documentation generation", "files_total": files_total})
+    yield f"data: {STREAM_HEADER}\n\n"
+
+    # Token frames are pushed from inside concurrent LLM calls and merged with file events
+    token_queue: asyncio.Queue = asyncio.Queue()
+    on_token = (lambda chunk, text: token_queue.put_nowait(token_event(chunk, text))) if stream_tokens else None
+
+    async def file_events():
+        async for position, doc in iter_docs(on_token):
+            yield {"status": "file", "position": position, "doc": doc}
+
+    try:
+        async for event in interleave(file_events(), token_queue):
+            if event["status"] == "token":
+                yield sse_event(event)
+                continue
+            docs[event["position"]] = event["doc"]
+            yield f"data: {event['doc']['documentation']}\n\n"
+            yield sse_event({"status": "file_progress", "filename": event["doc"]["filename"], "files_done": len(docs), "files_total": files_total})
+    except Exception as e:
+        logger.error(f"Streaming error: {str(e)}")
+        completed_docs = [docs[position] for position in sorted(docs)]
+        if completed_docs:
+            await DOC_STORE.create(doc_id, assemble_documentation(completed_docs, "MyProject"), feedback="Partial due to error")
+        yield sse_event({"status": "error", "message": f"Streaming failed: {str(e)}", "documentation_id": doc_id})
+        return
+
+    ordered = [docs[position] for position in sorted(docs)]
+    summaries = await summarize_documentation(ordered, use_cache) if summarize and ordered else ""
+    # Summaries go with the table of contents, ahead of the file sections
+    yield sse_event({"status": "toc", "content": "## Table of Contents\n" + build_table_of_contents(ordered) + "\n\n" + summaries})
+    await DOC_STORE.create(doc_id, assemble_documentation(ordered, "MyProject", summaries))
+    completed = {"status": "completed", "documentation_id": doc_id, "skipped": skipped or []}
+    if compaction is not None:
+        completed["tokens_saved"] = compaction.tokens_saved
+    yield sse_event(completed)
+
+@router.post("/generate-docs/stream")
+async def generate_documentation_stream(data: FileInput = Body(...)):
+    """Stream each file's documentation over SSE as soon as it is generated.
+
+    Files arrive in completion order with progress events; the table of contents
+    is sent last, and the stored documentation keeps the original file order.
+    """
+    files = data.files
+    if not files:
+        raise HTTPException(status_code=400, detail="No files provided.")
+    use_cache = not data.force_regenerate
+    triage = Triage(is_code_file, gitattributes_of(files))
+    compaction = compaction_for(data.compact_prompts, data.drop_function_bodies)
+    planned = plan_documentation(files, MAX_TOKENS, "ollama", triage, compaction)
+    return StreamingResponse(
+        stream_documentation_events(
+            lambda on_token: iter_file_documentation(planned, use_cache, on_token, data.batch_small_files, data.hierarchical_summaries),
+            str(uuid.uuid4()), use_cache, data.stream_tokens, data.hierarchical_summaries, files_total=len(planned), skipped=triage.skipped, compaction=compaction,
+        ),
+        media_type="text/event-stream",
+    )
+
+async def iter_ingested_files(request: Request, body_read: asyncio.Event) -> AsyncIterator[Dict[str, str]]:
+    """Files from an NDJSON request body, one ``{"path", "content"}`` object per line; sets ``body_read`` when done."""
+    try:
+        async for item in iter_ndjson(request.stream(), INGEST_MAX_LINE_BYTES):
+            if not isinstance(item, dict) or not isinstance(item.get("path"), str) or not isinstance(item.get("content"), str):
+                raise ValueError("Each line must be an object with string 'path' and 'content'")
+            yield {"path": item["path"], "content": item["content"]}
+    finally:
+        body_read.set()
+
+@router.post("/generate-docs/ingest")
+async def ingest_documentation_stream(
+    request: Request,
+    force_regenerate: bool = False,
+    stream_tokens: bool = False,
+    hierarchical_summaries: bool = False,
+    compact_prompts: bool = False,
+    drop_function_bodies: bool = False,
+):
+    """Generate documentation from files uploaded as newline-delimited JSON, starting while they upload.
+
+    The body is read incrementally instead of being validated as one ``FileInput``, so
+    memory is bounded by the files in flight rather than the size of the repository.
+    Options are query parameters; events are the same as ``/generate-docs/stream``,
+    except that ``files_total`` is unknown until the upload ends.
+    """
+    use_cache = not force_regenerate
+    body_read = asyncio.Event()
+    triage = Triage(is_code_file)
+    compaction = compaction_for(compact_prompts, drop_function_bodies)
+    return UploadStreamingResponse(
+        stream_documentation_events(
+            lambda on_token: iter_streamed_file_documentation(iter_ingested_files(request, body_read), use_cache, on_token, hierarchical_summaries, triage, compaction),
+            str(uuid.uuid4()), use_cache, stream_tokens, hierarchical_summaries, skipped=triage.skipped, compaction=compaction,
+        ),
+        body_read,
+        media_type="text/event-stream",
+    )
+
+@router.get("/docs/cache/stats", response_model=dict)
+async def get_cache_stats():
+    """Report hit/miss counts (since the worker started) and size of the documentation cache."""
+    return await asyncio.to_thread(DOC_CACHE.stats)
+
+def parse_routing_reply(reply: str, sections: List[Dict]) -> List[str]:
+    """Section keys from the LLM's routing reply.
+
+    Small models tend to wrap the array in a code fence or add a sentence, so the first
+    JSON array in the reply is used; if there is none, every heading the reply names.
+    """
+    known = {section["key"] for section in sections}
+    start = reply.find("[")
+    try:
+        if start < 0:
+            raise ValueError("no JSON array in reply")
+        chosen, _ = json.JSONDecoder().raw_decode(reply, start)
+        return [key for key in chosen if isinstance(key, str) and key in known]
+    except (ValueError, TypeError) as e:
+        logger.warning(f"Could not parse section routing reply, using the headings it names: {str(e)}")
+        return match_sections(reply, sections)
+
+async def route_feedback(feedback: str, sections: List[Dict], history_str: str) -> List[str]:
+    """Pick the sections a piece of feedback is about.
+
+    Sections named in the feedback are used directly; otherwise the LLM chooses from the
+    list of headings. Feedback about the project as a whole lands on the introduction.
+    """
+    keys = match_sections(feedback, sections)
+    if not keys:
+        outline = section_outline(sections)
+        outline_tokens = encode(outline)
+        if len(outline_tokens) > REFINE_CONTEXT_TOKENS:
+            outline = tokenizer.decode(outline_tokens[:REFINE_CONTEXT_TOKENS]).rsplit("\n", 1)[0]
+        prompt = f"""
+        These are the section headings of a developer documentation, one per line:
+        {outline}
+
+        Past conversation:
+        {history_str}
+        User feedback: "{feedback}"
+
+        Return only a JSON array with the exact headings of the sections that must change to address the feedback, at most {REFINE_MAX_SECTIONS}.
+        Return [] if the feedback is about the project as a whole or names no particular section.
+        """
+        reply = await call_llm(prompt, "route")
+        keys = parse_routing_reply(reply, sections)
+    if not keys:
+        keys = [section["key"] for section in sections if section["title"].lower() == "introduction"][:1]
+    return keys[:REFINE_MAX_SECTIONS]
+
+
+def fit_sections(current_docs: str, sections: List[Dict], keys: List[str]) -> List[str]:
+    """Drop trailing sections once their combined size would exceed the refinement budget."""
+    by_key = {section["key"]: section for section in sections}
+    fitted, used = [], 0
+    for key in keys:
+        section = by_key[key]
+        size = len(encode(current_docs[section["start"]:section["end"]]))
+        if fitted and used + size > REFINE_CONTEXT_TOKENS:
+            logger.info(f"Refinement budget reached; leaving out section '{key}'")
+            continue
+        fitted.append(key)
+        used += size
+    return fitted
+
 
 @router.post("/docs/refine", response_model=FeedbackResponse)
 async def refine_documentation(data: FeedbackInput = Body(...)):
-    """Refine documentation based on user feedback and return the full updated documentation."""
+    """Refine documentation based on user feedback and return the full updated documentation.
+
+    Only the sections the feedback targets are sent to the LLM, and only the sections it
+    revises come back; they are spliced into the stored document.
+    """
     try:
         doc_id = data.documentation_id
         feedback = data.feedback
-        if doc_id not in DOC_STORAGE:
+        current_version_entry = await DOC_STORE.get_current(doc_id)
+        if current_version_entry is None:
             raise HTTPException(status_code=404, detail="Documentation not found")
-
-        current_version = DOC_STORAGE[doc_id]["current_version"]
-        versions = DOC_STORAGE[doc_id]["versions"]
-        current_version_entry = next(v for v in versions if v["version_number"] == current_version)
         current_docs = current_version_entry["content"]
 
-        chat_history = DOC_STORAGE[doc_id]["chat_history"]
+        chat_history = await DOC_STORE.get_chat_history(doc_id)
         history_str = "\n".join([f"User: {entry['user']}\nAssistant: {entry['assistant']}" for entry in chat_history[-5:]])
 
+        sections = index_sections(current_docs)
+        keys = fit_sections(current_docs, sections, await route_feedback(feedback, sections, history_str))
+        logger.info(f"Refining {len(keys)} of {len(sections)} sections for doc_id {doc_id}: {keys}")
+
         prompt = f"""
-        You are a documentation expert tasked with refining technical documentation. Here’s the current full documentation:
-        ```
-        {current_docs}
-        ```
+        You are a documentation expert tasked with refining technical documentation. These are the sections of the documentation that the feedback concerns; the rest of the document is not shown and stays as it is:
+        {render_sections(current_docs, sections, keys)}
+
         Past conversation:
         {history_str}
         User feedback: "{feedback}"
-        Important: Always return the full documentation in 'updated_docs', including all existing sections, with refinements applied as requested.
-        
-        Refine the documentation based on the feedback:
-        - If the feedback requests a project-wide overview, enhance the '## Introduction' section or add an '## Overview' section, preserving all existing '## File Documentation' sections.
-        - If the feedback requests clarification, improve readability or add explanations to the relevant sections without removing content.
-        - If the feedback asks for more details, expand the relevant section with examples or specifics, keeping all other content intact.
-        - If the feedback identifies errors, correct them while maintaining the rest of the documentation.
-        - For unclear feedback, ask the user for clarification in the response and return the documentation unchanged.
-
-        Return a JSON object with:
-        - "response": A concise reply to the user explaining what you changed (or why no changes were made)
-        - "updated_docs": The full revised documentation in valid markdown format (unchanged if no update is needed)
 
+        Refine the sections based on the feedback:
+        - If the feedback requests a project-wide overview, enhance the '## Introduction' section or add an '## Overview' section after it.
+        - If the feedback requests clarification, improve readability or add explanations without removing content.
+        - If the feedback asks for more details, expand the section with examples or specifics, keeping its other content intact.
+        - If the feedback identifies errors, correct them while maintaining the rest of the section.
+        - For unclear feedback, ask the user for clarification and change nothing.
+
+        Reply with a concise message to the user explaining what you changed (or why no changes were made). After it, repeat each section you changed in full, with its heading, between the same {SECTION_START.format(key="...")} and {SECTION_END} markers. Leave out sections you did not change. To add a new section, put it at the end of the section it should follow.
         """
 
-        response = await llm.agenerate([prompt])
-        raw_response = response.generations[0][0].text
+        raw_response = await call_llm(prompt, "refine")
         logger.debug(f"LLM raw response: {raw_response}")
 
-        try:
-            result = json.loads(raw_response)
-            if "response" not in result or "updated_docs" not in result:
-                raise ValueError("Missing required fields 'response' or 'updated_docs'")
-        except (json.JSONDecodeError, ValueError) as e:
-            logger.error(f"Invalid JSON from LLM: {str(e)}")
-            result = {
-                "response": "I couldn’t process your feedback due to an internal error. Please try again or provide more specific guidance.",
-                "updated_docs": current_docs
-            }
-
-        chat_history.append({"user": feedback, "assistant": result["response"]})
-        DOC_STORAGE[doc_id]["chat_history"] = chat_history[-5:]
-
-        if result["updated_docs"] != current_docs:
-            new_version_number = len(versions) + 1
-            new_version = {
-                "version_number": new_version_number,
-                "content": result["updated_docs"],
-                "timestamp": datetime.datetime.now().isoformat(),
-                "feedback": feedback
-            }
-            versions.append(new_version)
-            DOC_STORAGE[doc_id]["current_version"] = new_version_number
+        reply, revised = parse_sections(raw_response)
+        unknown = set(revised) - set(keys)
+        if unknown:
+            logger.warning(f"Ignoring revised sections that were not requested: {sorted(unknown)}")
+        revised = {key: content for key, content in revised.items() if key in keys}
+        updated_docs = splice_sections(current_docs, sections, revised)
+        if not reply:
+            reply = "Updated the requested sections." if revised else "I couldn’t apply your feedback. Please try again or provide more specific guidance."
+
+        await DOC_STORE.append_chat(doc_id, feedback, reply)
+
+        diff = None
+        if updated_docs != current_docs:
+            new_version_number, diff = await DOC_STORE.add_version(doc_id, updated_docs, feedback)
             logger.info(f"Created new version {new_version_number} for doc_id {doc_id}")
 
         return FeedbackResponse(
-            response=result["response"],
-            updated_docs=result["updated_docs"]
+            response=reply,
+            updated_docs=updated_docs,
+            diff=diff
         )
 
+    except HTTPException as e:
+        raise e
     except Exception as e:
         logger.error(f"Error refining documentation: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to refine documentation: {str(e)}")
 
-GITHUB_API_URL = "https://api.github.com"
-@router.post("docs/accept-changes", response_model=dict)
+@router.get("/docs/{documentation_id}/versions/{version_number}", response_model=dict)
+async def get_documentation_version(documentation_id: str, version_number: int):
+    """Return any stored version of a documentation, rebuilt from its snapshot and deltas."""
+    version = await DOC_STORE.get_version(documentation_id, version_number)
+    if version is None:
+        raise HTTPException(status_code=404, detail="Documentation version not found")
+    return version
+
+GITHUB_API_URL = GITHUB_API_BASE
+@router.post("/docs/accept-changes", response_model=dict)
 async def accept_changes(data: AcceptChangesInput = Body(...)):
     """Accept the refined changes and push them to a GitHub repository via API."""
     try:
@@ -244,25 +766,34 @@ async def accept_changes(data: AcceptChangesInput = Body(...)):
         branch = data.branch
         file_path = data.file_path
 
-        if doc_id not in DOC_STORAGE:
-            raise HTTPException(status_code=404, detail="Documentation not found")
-
         # Retrieve the current version of the documentation
-        current_version = DOC_STORAGE[doc_id]["current_version"]
-        versions = DOC_STORAGE[doc_id]["versions"]
-        current_version_entry = next(v for v in versions if v["version_number"] == current_version)
+        current_version_entry = await DOC_STORE.get_current(doc_id)
+        if current_version_entry is None:
+            raise HTTPException(status_code=404, detail="Documentation not found")
         final_docs = current_version_entry["content"]
 
         # Set up headers with the provided GitHub token
+        client = get_http_client()
         headers = {
             "Authorization": f"Bearer {github_token}",
             "Accept": "application/vnd.github+json",
             "Content-Type": "application/json",
         }
 
-        # Step 1: Validate token by fetching user info
+        # Steps 1-4 are independent lookups, so issue them together and check them in order
         user_url = f"{GITHUB_API_URL}/user"
-        user_response = requests.get(user_url, headers=headers)
+        repo_url = f"{GITHUB_API_URL}/repos/{repo_owner}/{repo_name}"
+        branch_url = f"{GITHUB_API_URL}/repos/{repo_owner}/{repo_name}/branches/{branch}"
+        contents_url = f"{GITHUB_API_URL}/repos/{repo_owner}/{repo_name}/contents/{file_path}"
+        params = {"ref": branch}
+        user_response, repo_response, branch_response, contents_response = await asyncio.gather(
+            client.get(user_url, headers=headers),
+            client.get(repo_url, headers=headers),
+            client.get(branch_url, headers=headers),
+            client.get(contents_url, headers=headers, params=params),
+        )
+
+        # Step 1: Validate token by fetching user info
         if user_response.status_code != 200:
             raise HTTPException(status_code=401, detail=f"Invalid or expired GitHub token: {user_response.text}")
 
@@ -270,25 +801,18 @@ async def accept_changes(data: AcceptChangesInput = Body(...)):
         logger.info(f"Token validated for GitHub user: {username}")
 
         # Step 2: Validate repository existence and access
-        repo_url = f"{GITHUB_API_URL}/repos/{repo_owner}/{repo_name}"
-        repo_response = requests.get(repo_url, headers=headers)
         if repo_response.status_code == 404:
             raise HTTPException(status_code=400, detail=f"Repository '{repo_owner}/{repo_name}' not found or inaccessible with the token. Check repo name or token permissions.")
         elif repo_response.status_code != 200:
             raise HTTPException(status_code=500, detail=f"Failed to verify repository: {repo_response.text}")
 
         # Step 3: Validate branch existence
-        branch_url = f"{GITHUB_API_URL}/repos/{repo_owner}/{repo_name}/branches/{branch}"
-        branch_response = requests.get(branch_url, headers=headers)
         if branch_response.status_code == 404:
             raise HTTPException(status_code=400, detail=f"Branch '{branch}' not found in '{repo_owner}/{repo_name}'. Available branches can be checked at {repo_url}/branches.")
         elif branch_response.status_code != 200:
             raise HTTPException(status_code=500, detail=f"Failed to verify branch: {branch_response.text}")
 
         # Step 4: Get the current file (if it exists) to retrieve its SHA
-        contents_url = f"{GITHUB_API_URL}/repos/{repo_owner}/{repo_name}/contents/{file_path}"
-        params = {"ref": branch}
-        contents_response = requests.get(contents_url, headers=headers, params=params)
         sha = None
         if contents_response.status_code == 200:
             sha = contents_response.json().get("sha")
@@ -308,7 +832,7 @@ async def accept_changes(data: AcceptChangesInput = Body(...)):
         if sha:
             payload["sha"] = sha  # Include SHA if updating an existing file
 
-        push_response = requests.put(contents_url, headers=headers, data=json.dumps(payload))
+        push_response = await client.put(contents_url, headers=headers, content=json.dumps(payload))
         if push_response.status_code == 404:
             raise HTTPException(status_code=400, detail=f"Failed to push: Repository, branch, or path not found. Double-check '{repo_owner}/{repo_name}/{branch}' and token permissions.")
         elif push_response.status_code not in (200, 201):
@@ -318,17 +842,8 @@ async def accept_changes(data: AcceptChangesInput = Body(...)):
 
         logger.info(f"Successfully pushed {file_path} to {repo_owner}/{repo_name}/{branch}")
 
-        # Reset DOC_STORAGE to a single accepted version
-        DOC_STORAGE[doc_id] = {
-            "versions": [{
-                "version_number": 1,
-                "content": final_docs,
-                "timestamp": datetime.datetime.now().isoformat(),
-                "feedback": None
-            }],
-            "current_version": 1,
-            "chat_history": []
-        }
+        # Reset the stored documentation to a single accepted version
+        await DOC_STORE.create(doc_id, final_docs)
 
         return {"message": f"Changes for documentation {doc_id} have been accepted and pushed to {repo_owner}/{repo_name}/{branch}."}
 
@@ -4,14 +4,23 @@ from fastapi import APIRouter, HTTPException, Body
 from fastapi.responses import StreamingResponse
 from langchain_groq import ChatGroq
 from langchain.prompts import PromptTemplate
-from langchain.text_splitter import RecursiveCharacterTextSplitter
 from .schemas import GroqInput, DocumentationResponse
+from .cache import DOC_CACHE, doc_cache_key
+from .storage import DOC_STORE
+from .chunking import encode
+from .streaming import sse_event, token_event, interleave
+from .rate_limit import TokenBucketLimiter, get_limiter
+from .metrics import LLM_CALL_SECONDS, RATE_LIMIT_EVENTS, model_label, record_tokens, timed
+from .timing import span
+from .triage import Triage, gitattributes_of
+from .compaction import Compaction, compaction_for
+from .planning import PlannedFile, is_code_file, iter_documented_files, plan_documentation, planned_chunks
+from .models import model_spec
 import asyncio
 import uuid
-import tiktoken
-from typing import List, Dict, AsyncGenerator
+from typing import List, Dict, AsyncGenerator, Optional, Tuple, Callable
 from groq import RateLimitError
-import datetime
+import os
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
@@ -48,120 +57,232 @@ DOC_PROMPT = PromptTemplate(
     """
 )
 
+TokenCallback = Callable[[Dict[str, str], str], None]
+
 # Token handling
-tokenizer = tiktoken.get_encoding("cl100k_base")
-MAX_TOKENS = 4000  # Max tokens per chunk, adjustable based on model limits
-CODE_EXTENSIONS = {'.py', '.js', '.jsx', '.java', '.cpp', '.c', '.cs', '.ts', '.rb', '.php', '.go', '.rs', '.swift', '.kt', '.tsx'}
-
-def is_code_file(filename: str) -> bool:
-    return any(filename.lower().endswith(ext) for ext in CODE_EXTENSIONS)
-
-def chunk_code(content: str, filename: str, max_tokens: int = MAX_TOKENS) -> List[Dict[str, str]]:
-    if not is_code_file(filename):
-        return []
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=max_tokens,
-        chunk_overlap=200,
-        length_function=lambda x: len(tokenizer.encode(x)),
-    )
-    chunks = text_splitter.split_text(content)
-    return [{"path": filename, "content": chunk, "chunk_id": i} for i, chunk in enumerate(chunks)]
-
-async def generate_doc_chunk(chunk: Dict[str, str], llm: ChatGroq) -> str:
+DEFAULT_MODEL = "mixtral-8x7b-32768"
+MAX_TOKENS = model_spec(DEFAULT_MODEL, "groq").chunk_tokens  # Chunk size for the default model; requests use their model's
+GROQ_CONCURRENCY = int(os.getenv("GROQ_CONCURRENCY", "4"))  # Max LLM calls in flight per request
+COMPLETION_TOKEN_RESERVE = int(os.getenv("GROQ_COMPLETION_TOKEN_RESERVE", "512"))  # Expected output tokens per call, counted against TPM
+MAX_STALLED_RETRIES = 5  # Rate-limit retries in a row that completed no new chunk
+
+async def generate_doc_chunk(
+    chunk: Dict[str, str],
+    llm: ChatGroq,
+    use_cache: bool = True,
+    limiter: Optional[TokenBucketLimiter] = None,
+    on_token: Optional[TokenCallback] = None,
+) -> str:
+    """Document one chunk. With ``on_token``, output is streamed and each fragment is passed on as it arrives."""
+    cache_key = doc_cache_key(chunk["content"], chunk["path"], DOC_PROMPT.template, llm.model_name)
+    if use_cache:
+        cached = await DOC_CACHE.aget(cache_key)
+        if cached is not None:
+            if on_token is not None:
+                on_token(chunk, cached)
+            return cached
     prompt = DOC_PROMPT.format(code=chunk["content"], filename=chunk["path"])
+    if limiter is not None:
+        spec = model_spec(llm.model_name, "groq")
+        waited = await limiter.acquire(spec.model_tokens(len(encode(prompt))) + COMPLETION_TOKEN_RESERVE)
+        if waited:
+            RATE_LIMIT_EVENTS.labels(source="groq_paced").inc()
+            logger.info(f"Paced {chunk['path']} by {waited:.1f}s to stay under Groq limits")
     try:
-        response = await llm.ainvoke([("human", prompt)])
-        return response.content
+        usage = None
+        with timed(LLM_CALL_SECONDS, "llm", backend="groq", model=model_label(llm.model_name), kind="chunk"):
+            if on_token is None:
+                response = await llm.ainvoke([("human", prompt)])
+                text = response.content
+                usage = response.usage_metadata
+            else:
+                parts = []
+                async for message_chunk in llm.astream([("human", prompt)]):
+                    usage = message_chunk.usage_metadata or usage
+                    if message_chunk.content:
+                        parts.append(message_chunk.content)
+                        on_token(chunk, message_chunk.content)
+                text = "".join(parts)
+        if usage:
+            record_tokens("groq", llm.model_name, usage.get("input_tokens"), usage.get("output_tokens"))
+        await DOC_CACHE.aset(cache_key, text)
+        return text
     except RateLimitError as e:
         raise e  # Propagate rate limit error to handle at higher level
     except Exception as e:
         logger.error(f"Error generating chunk for {chunk['path']}: {str(e)}")
-        return f"Error: Failed to generate documentation for chunk {chunk['chunk_id']} of {chunk['path']}"
+        return f"Error: Failed to generate documentation for chunk {chunk.get('chunk_id', 0)} of {chunk['path']}"
 
-async def generate_full_documentation(files: List[Dict[str, str]], llm: ChatGroq) -> List[Dict[str, str]]:
-    docs = []
-    for file in files:
-        filename = file["path"]
-        content = file["content"]
-        
-        if not is_code_file(filename):
-            logger.info(f"Skipping non-code file: {filename}")
-            continue
-
-        token_count = len(tokenizer.encode(content))
-        if token_count <= MAX_TOKENS:
-            doc_content = await generate_doc_chunk(file, llm)
-            docs.append({"filename": filename, "documentation": DOC_TEMPLATE.format(filename=filename, body=doc_content)})
-        else:
-            chunks = chunk_code(content, filename)
-            if chunks:
-                chunk_docs = []
-                for chunk in chunks:
-                    try:
-                        doc = await generate_doc_chunk(chunk, llm)
-                        chunk_docs.append(doc)
-                    except RateLimitError as e:
-                        raise e  # Stop processing if rate limit hit
-                    except Exception as e:
-                        chunk_docs.append(f"Error: {str(e)}")
-                body = "This file is large and has been split into chunks. Below is the documentation for each part.\n\n" + \
-                       "\n".join([f"#### Chunk {i}\n{doc}" for i, doc in enumerate(chunk_docs)])
-                docs.append({"filename": filename, "documentation": DOC_TEMPLATE.format(filename=filename, body=body)})
+def format_file_documentation(filename: str, chunk_docs: List[str], is_chunked: bool) -> str:
+    if not is_chunked:
+        body = chunk_docs[0]
+    else:
+        body = "This file is large and has been split into chunks. Below is the documentation for each part.\n\n" + \
+               "\n".join([f"#### Chunk {i}\n{doc}" for i, doc in enumerate(chunk_docs)])
+    return DOC_TEMPLATE.format(filename=filename, body=body)
+
+async def iter_file_documentation(
+    planned: List[PlannedFile],
+    llm: ChatGroq,
+    use_cache: bool = True,
+    limiter: Optional[TokenBucketLimiter] = None,
+    checkpoint: Optional[Dict[Tuple[str, Optional[int]], str]] = None,
+    on_token: Optional[TokenCallback] = None,
+) -> AsyncGenerator[Tuple[int, Dict[str, str]], None]:
+    """Yield (position, doc) for each planned file as soon as all of its chunks are done.
+
+    Chunks already in ``checkpoint`` are reused, and each newly completed chunk is
+    recorded there so a rate-limited run can resume. Every chunk is a call of its own:
+    small-file batching is only implemented in the Ollama generator.
+    """
+    if checkpoint is None:
+        checkpoint = {}
+    chunk_jobs = planned_chunks(planned)
+
+    async def run_chunk(group: List[int]) -> List[str]:
+        chunk = chunk_jobs[group[0]]
+        key = (chunk["path"], chunk.get("chunk_id"))
+        if key in checkpoint:
+            return [checkpoint[key]]
+        try:
+            doc = await generate_doc_chunk(chunk, llm, use_cache, limiter, on_token)
+        except RateLimitError as e:
+            raise e  # Stop processing if rate limit hit
+        except Exception as e:
+            return [f"Error: {str(e)}"]
+        if not doc.startswith("Error: "):
+            checkpoint[key] = doc
+        return [doc]
+
+    async def finish(filename: str, chunk_docs: List[str], is_chunked: bool) -> Dict[str, str]:
+        return {"filename": filename, "documentation": format_file_documentation(filename, chunk_docs, is_chunked)}
 
+    async for position, doc in iter_documented_files(planned, run_chunk, finish, GROQ_CONCURRENCY):
+        yield position, doc
+
+async def generate_full_documentation(
+    files: List[Dict[str, str]],
+    llm: ChatGroq,
+    use_cache: bool = True,
+    limiter: Optional[TokenBucketLimiter] = None,
+    checkpoint: Optional[Dict[Tuple[str, Optional[int]], str]] = None,
+    triage: Optional[Triage] = None,
+    compaction: Optional[Compaction] = None,
+) -> List[Dict[str, str]]:
+    planned = plan_documentation(files, model_spec(llm.model_name, "groq").chunk_tokens, "groq", triage, compaction)
+    docs = [None] * len(planned)
+    async for position, doc in iter_file_documentation(planned, llm, use_cache, limiter, checkpoint):
+        docs[position] = doc
     return docs
 
-async def stream_unified_documentation(files: List[Dict[str, str]], project_name: str, llm: ChatGroq) -> AsyncGenerator[dict, None]:
-    """Stream documentation with status updates and handle partial generation."""
+def build_table_of_contents(individual_docs: List[Dict[str, str]]) -> str:
+    return "\n".join([f"- [{doc['filename']}](#{doc['filename'].replace('.', '-')})" for doc in individual_docs])
+
+def assemble_documentation(individual_docs: List[Dict[str, str]]) -> str:
+    with span("assemble"):
+        return UNIFIED_DOC_TEMPLATE.format(
+            table_of_contents=build_table_of_contents(individual_docs),
+            file_documentation="\n\n".join(doc["documentation"] for doc in individual_docs)
+        )
+
+def parse_retry_after(value: Optional[str], default: float = 60) -> float:
+    try:
+        return max(float(value), 1.0)
+    except (TypeError, ValueError):
+        return default
+
+async def stream_unified_documentation(
+    files: List[Dict[str, str]],
+    project_name: str,
+    llm: ChatGroq,
+    use_cache: bool = True,
+    limiter: Optional[TokenBucketLimiter] = None,
+    on_token: Optional[TokenCallback] = None,
+    compaction: Optional[Compaction] = None,
+) -> AsyncGenerator[dict, None]:
+    """Stream each file's documentation as soon as it completes, with progress and rate-limit updates.
+
+    The table of contents is only known once every file is done, so it is sent last as
+    a ``toc`` event; the ``completed`` event carries the full document in file order.
+    """
     yield {"status": "starting", "message": "Starting documentation generation"}
 
     try:
-        individual_docs = await generate_full_documentation(files, llm)
-        table_of_contents = "\n".join([f"- [{doc['filename']}](#{doc['filename'].replace('.', '-')})" for doc in individual_docs])
+        triage = Triage(is_code_file, gitattributes_of(files))
+        planned = plan_documentation(files, model_spec(llm.model_name, "groq").chunk_tokens, "groq", triage, compaction)
+        docs: List[Optional[Dict[str, str]]] = [None] * len(planned)
+        files_done = 0
 
-        # Stream static parts
         yield {"status": "progress", "content": "# Developer Documentation\n\n"}
         yield {"status": "progress", "content": "## Introduction\nThis document provides a comprehensive overview and detailed documentation for the code files in this project.\n\n"}
-        yield {"status": "progress", "content": "## Table of Contents\n" + table_of_contents + "\n\n"}
         yield {"status": "progress", "content": "## File Documentation\n"}
 
-        # Stream file documentation
-        for doc in individual_docs:
-            yield {"status": "progress", "content": doc["documentation"] + "\n\n"}
-            await asyncio.sleep(0.01)  # Small delay for streaming effect
+        # Completed chunks survive rate-limit retries, so a retry resumes instead of starting over
+        checkpoint: Dict[Tuple[str, Optional[int]], str] = {}
+        stalled_retries = 0
+        while True:
+            completed_before = len(checkpoint)
+            try:
+                async for position, doc in iter_file_documentation(planned, llm, use_cache, limiter, checkpoint, on_token):
+                    if docs[position] is not None:
+                        continue  # Already streamed before a rate-limit retry
+                    docs[position] = doc
+                    files_done += 1
+                    yield {
+                        "status": "file",
+                        "filename": doc["filename"],
+                        "content": doc["documentation"] + "\n\n",
+                        "files_done": files_done,
+                        "files_total": len(planned)
+                    }
+                break
+            except RateLimitError as e:
+                RATE_LIMIT_EVENTS.labels(source="groq").inc()
+                error_data = e.response.json()["error"] if hasattr(e.response, "json") else {"message": str(e)}
+                retry_after = parse_retry_after(e.response.headers.get("retry-after"))
+                message = error_data.get("message", "")
+
+                if "per day" in message:
+                    yield {
+                        "status": "error",
+                        "message": f"Daily limit (RPD/TPD) exceeded: {error_data['message']}. Cannot retry until reset."
+                    }
+                    return
+                if "per minute" not in message:
+                    yield {
+                        "status": "error",
+                        "message": f"Rate limit error: {error_data['message']}"
+                    }
+                    return
 
-        yield {"status": "completed", "message": "Documentation generation completed"}
+                stalled_retries = stalled_retries + 1 if len(checkpoint) == completed_before else 0
+                if stalled_retries > MAX_STALLED_RETRIES:
+                    yield {"status": "error", "message": f"Rate limit retries exhausted without progress: {message}"}
+                    return
 
-    except RateLimitError as e:
-        error_data = e.response.json()["error"] if hasattr(e.response, "json") else {"message": str(e)}
-        retry_after = e.response.headers.get("retry-after", "unknown")
-        limit_type = error_data.get("type", "unknown")
-        
-        if limit_type == "tokens" and "per minute" in error_data.get("message", ""):
-            yield {
-                "status": "rate_limit",
-                "message": f"TPM limit hit. Retrying after {retry_after} seconds.",
-                "retry_after": int(retry_after) if retry_after.isdigit() else 60
-            }
-            await asyncio.sleep(int(retry_after) if retry_after.isdigit() else 60)
-            async for chunk in stream_unified_documentation(files, project_name, llm):  # Retry
-                yield chunk
-        elif "per day" in error_data.get("message", ""):
-            yield {
-                "status": "error",
-                "message": f"Daily limit (RPD/TPD) exceeded: {error_data['message']}. Cannot retry until reset."
-            }
-        else:
-            yield {
-                "status": "error",
-                "message": f"Rate limit error: {error_data['message']}"
-            }
+                limit_name = "TPM" if error_data.get("type") == "tokens" else "RPM"
+                yield {
+                    "status": "rate_limit",
+                    "message": f"{limit_name} limit hit after {len(checkpoint)} completed chunks. Resuming after {retry_after:g} seconds.",
+                    "retry_after": int(retry_after)
+                }
+                if limiter is not None:
+                    limiter.pause(retry_after)
+                await asyncio.sleep(retry_after)
+
+        logger.info(f"Documentation cache stats (process-wide): {DOC_CACHE.stats()}")
+        yield {"status": "toc", "content": "## Table of Contents\n" + build_table_of_contents(docs) + "\n\n"}
+        yield {
+            "status": "completed",
+            "message": "Documentation generation completed",
+            "documentation": assemble_documentation(docs),
+            "skipped": triage.skipped,
+            "tokens_saved": compaction.tokens_saved if compaction else None
+        }
 
     except Exception as e:
         yield {"status": "error", "message": f"Unexpected error: {str(e)}"}
 
-# In-memory storage
-DOC_STORAGE = {}
-
 @router.post("/generate-with-groq")
 async def generate_with_groq(data: GroqInput = Body(...)):
     files = data.files
@@ -170,65 +291,58 @@ async def generate_with_groq(data: GroqInput = Body(...)):
     
     groq_api_key = data.groq_api_key
     model_name = data.model_name
+    spec = model_spec(model_name, "groq")
     
-    llm = ChatGroq(api_key=groq_api_key, model=model_name, streaming=True)
+    llm = ChatGroq(api_key=groq_api_key, model=model_name, streaming=True, max_tokens=spec.max_output_tokens)
+    limiter = get_limiter(groq_api_key, model_name, spec.tokens_per_minute, spec.requests_per_minute)
     doc_id = str(uuid.uuid4())
     
     async def stream_response() -> AsyncGenerator[str, None]:
         full_doc = ""
+        # Token frames are pushed from inside concurrent LLM calls and merged with pipeline events
+        token_queue: asyncio.Queue = asyncio.Queue()
+        on_token = (lambda chunk, text: token_queue.put_nowait(token_event(chunk, text))) if data.stream_tokens else None
+        compaction = compaction_for(data.compact_prompts, data.drop_function_bodies)
+        events = stream_unified_documentation(files, "MyProject", llm, use_cache=not data.force_regenerate, limiter=limiter, on_token=on_token, compaction=compaction)
         try:
-            async for event in stream_unified_documentation(files, "MyProject", llm):
-                if event["status"] == "progress":
+            async for event in interleave(events, token_queue):
+                if event["status"] == "token":
+                    yield sse_event(event)
+                elif event["status"] == "progress":
+                    full_doc += event["content"]
+                    yield f"data: {event['content']}\n\n"
+                elif event["status"] == "file":
                     full_doc += event["content"]
                     yield f"data: {event['content']}\n\n"
+                    yield sse_event({
+                        "status": "file_progress",
+                        "filename": event["filename"],
+                        "files_done": event["files_done"],
+                        "files_total": event["files_total"]
+                    })
+                elif event["status"] == "toc":
+                    yield sse_event({"status": "toc", "content": event["content"]})
                 elif event["status"] == "completed":
-                    # Store complete documentation
-                    initial_version = {
-                        "version_number": 1,
-                        "content": full_doc,
-                        "timestamp": datetime.datetime.now().isoformat(),
-                        "feedback": None
-                    }
-                    DOC_STORAGE[doc_id] = {
-                        "versions": [initial_version],
-                        "current_version": 1,
-                        "chat_history": []
-                    }
-                    yield f"data: {{ \"status\": \"completed\", \"documentation_id\": \"{doc_id}\" }}\n\n"
+                    # Store complete documentation in file order, with the table of contents in place
+                    await DOC_STORE.create(doc_id, event["documentation"])
+                    completed = {"status": "completed", "documentation_id": doc_id, "skipped": event["skipped"]}
+                    if event["tokens_saved"] is not None:
+                        completed["tokens_saved"] = event["tokens_saved"]
+                    yield sse_event(completed)
                 elif event["status"] == "rate_limit" and "retry_after" in event:
-                    yield f"data: {{ \"status\": \"rate_limit\", \"message\": \"{event['message']}\", \"retry_after\": {event['retry_after']} }}\n\n"
+                    yield sse_event({"status": "rate_limit", "message": event["message"], "retry_after": event["retry_after"]})
                 elif event["status"] == "error":
                     # Store partial documentation if any
                     if full_doc:
-                        partial_version = {
-                            "version_number": 1,
-                            "content": full_doc,
-                            "timestamp": datetime.datetime.now().isoformat(),
-                            "feedback": "Partial due to error"
-                        }
-                        DOC_STORAGE[doc_id] = {
-                            "versions": [partial_version],
-                            "current_version": 1,
-                            "chat_history": []
-                        }
-                    yield f"data: {{ \"status\": \"error\", \"message\": \"{event['message']}\", \"documentation_id\": \"{doc_id}\" }}\n\n"
+                        await DOC_STORE.create(doc_id, full_doc, feedback="Partial due to error")
+                    yield sse_event({"status": "error", "message": event["message"], "documentation_id": doc_id})
                 else:
-                    yield f"data: {{ \"status\": \"{event['status']}\", \"message\": \"{event['message']}\" }}\n\n"
+                    yield sse_event({"status": event["status"], "message": event["message"]})
         
         except Exception as e:
             logger.error(f"Streaming error: {str(e)}")
             if full_doc:  # Save partial doc on unexpected failure
-                partial_version = {
-                    "version_number": 1,
-                    "content": full_doc,
-                    "timestamp": datetime.datetime.now().isoformat(),
-                    "feedback": "Partial due to unexpected error"
-                }
-                DOC_STORAGE[doc_id] = {
-                    "versions": [partial_version],
-                    "current_version": 1,
-                    "chat_history": []
-                }
-            yield f"data: {{ \"status\": \"error\", \"message\": \"Streaming failed: {str(e)}\", \"documentation_id\": \"{doc_id}\" }}\n\n"
+                await DOC_STORE.create(doc_id, full_doc, feedback="Partial due to unexpected error")
+            yield sse_event({"status": "error", "message": f"Streaming failed: {str(e)}", "documentation_id": doc_id})
 
-    return StreamingResponse(stream_response(), media_type="text/event-stream")
\ No newline at end of file
+    return StreamingResponse(stream_response(), media_type="text/event-stream")
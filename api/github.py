@@ -0,0 +1,147 @@
+# api/github.py
+import os
+import json
+import time
+import random
+import asyncio
+import hashlib
+import logging
+import tempfile
+from typing import Optional, Dict, Any
+
+import httpx
+
+from .cache import DiskLRUStore
+from .http_client import get_http_client
+from .metrics import GITHUB_REQUEST_SECONDS, RATE_LIMIT_EVENTS
+from .timing import span
+
+logger = logging.getLogger(__name__)
+
+GITHUB_API_BASE = os.getenv("GITHUB_API_BASE", "https://api.github.com").rstrip("/")  # Overridable for GitHub Enterprise or a local stand-in
+GITHUB_CONCURRENCY = int(os.getenv("GITHUB_CONCURRENCY", "16"))  # Max GitHub requests in flight per worker
+GITHUB_MAX_RETRIES = int(os.getenv("GITHUB_MAX_RETRIES", "5"))
+GITHUB_BACKOFF_BASE = float(os.getenv("GITHUB_BACKOFF_BASE", "1"))
+GITHUB_BACKOFF_MAX = float(os.getenv("GITHUB_BACKOFF_MAX", "60"))
+GITHUB_MAX_RETRY_WAIT = float(os.getenv("GITHUB_MAX_RETRY_WAIT", "120"))  # Give up rather than wait longer than this
+
+GITHUB_ETAG_CACHE_DIR = os.getenv("GITHUB_ETAG_CACHE_DIR", os.path.join(tempfile.gettempdir(), "codemyth", "etags"))
+GITHUB_ETAG_CACHE_MAX_BYTES = int(os.getenv("GITHUB_ETAG_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+ETAG_CACHE = DiskLRUStore(GITHUB_ETAG_CACHE_DIR, GITHUB_ETAG_CACHE_MAX_BYTES)
+
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+CACHED_HEADERS = ("content-type", "etag", "last-modified")
+
+_semaphore = asyncio.Semaphore(GITHUB_CONCURRENCY)
+
+
+def _cache_key(url: str, headers: Dict[str, str], params: Optional[Dict[str, Any]]) -> str:
+    # Responses depend on who is asking and in which media type
+    parts = [url, json.dumps(params or {}, sort_keys=True, default=str), headers.get("Authorization", ""), headers.get("Accept", "")]
+    return hashlib.sha256("\n".join(parts).encode("utf-8")).hexdigest()
+
+
+async def _load_cached(key: str) -> Optional[Dict[str, Any]]:
+    data = await ETAG_CACHE.aget(key)
+    if data is None:
+        return None
+    meta, _, body = data.partition(b"\n")
+    entry = json.loads(meta)
+    entry["body"] = body
+    return entry
+
+
+async def _store_cached(key: str, response: httpx.Response) -> None:
+    headers = {name: response.headers[name] for name in CACHED_HEADERS if name in response.headers}
+    if "etag" not in headers and "last-modified" not in headers:
+        return
+    meta = json.dumps({"headers": headers}).encode("utf-8")
+    await ETAG_CACHE.aset(key, meta + b"\n" + response.content)
+
+
+def is_rate_limited(response: httpx.Response) -> bool:
+    if response.status_code == 429:
+        return True
+    if response.status_code != 403:
+        return False
+    return (
+        response.headers.get("x-ratelimit-remaining") == "0"
+        or "retry-after" in response.headers
+        or "rate limit" in response.text.lower()
+    )
+
+
+def retry_delay(response: Optional[httpx.Response], attempt: int) -> float:
+    """Seconds to wait before retrying: server hints first, then jittered exponential backoff."""
+    if response is not None:
+        retry_after = response.headers.get("retry-after")
+        if retry_after:
+            try:
+                return max(float(retry_after), 0.0)
+            except ValueError:
+                pass
+        reset = response.headers.get("x-ratelimit-reset")
+        if reset and response.headers.get("x-ratelimit-remaining") == "0":
+            try:
+                return max(float(reset) - time.time(), 0.0) + 1
+            except ValueError:
+                pass
+    # Full jitter keeps concurrent retries from arriving in lockstep
+    return random.uniform(0, min(GITHUB_BACKOFF_MAX, GITHUB_BACKOFF_BASE * 2 ** attempt))
+
+
+async def github_get(url: str, headers: Dict[str, str], params: Optional[Dict[str, Any]] = None, revalidate: bool = True) -> httpx.Response:
+    """GET a GitHub API URL with a concurrency cap, retries and ETag/Last-Modified revalidation.
+
+    A cached representation is revalidated with a conditional request; on 304 it is
+    returned as a regular 200 response. Conditional hits do not count against the
+    GitHub rate limit.
+    """
+    client = get_http_client()
+    key = _cache_key(url, headers, params)
+    cached = await _load_cached(key) if revalidate else None
+    request_headers = dict(headers)
+    if cached:
+        if "etag" in cached["headers"]:
+            request_headers["If-None-Match"] = cached["headers"]["etag"]
+        if "last-modified" in cached["headers"]:
+            request_headers["If-Modified-Since"] = cached["headers"]["last-modified"]
+
+    attempt = 0
+    while True:
+        response = None
+        try:
+            async with _semaphore:
+                start = time.perf_counter()
+                try:
+                    with span("github"):
+                        response = await client.get(url, headers=request_headers, params=params)
+                finally:
+                    status_label = str(response.status_code) if response is not None else "error"
+                    GITHUB_REQUEST_SECONDS.labels(status=status_label).observe(time.perf_counter() - start)
+        except httpx.TransportError as e:
+            if attempt >= GITHUB_MAX_RETRIES:
+                raise
+            logger.warning(f"GitHub request to {url} failed ({str(e)}), retrying")
+        else:
+            if response.status_code == 304 and cached:
+                return httpx.Response(200, headers=cached["headers"], content=cached["body"], request=response.request)
+            rate_limited = is_rate_limited(response)
+            if rate_limited:
+                RATE_LIMIT_EVENTS.labels(source="github").inc()
+            retryable = response.status_code in RETRYABLE_STATUS or rate_limited
+            if not retryable or attempt >= GITHUB_MAX_RETRIES:
+                if response.status_code == 200 and revalidate:
+                    await _store_cached(key, response)
+                return response
+
+        delay = retry_delay(response, attempt)
+        if delay > GITHUB_MAX_RETRY_WAIT:
+            logger.error(f"GitHub asked to wait {delay:.0f}s for {url}; giving up")
+            if response is None:
+                raise httpx.TransportError(f"GitHub request to {url} failed")
+            return response
+        status = response.status_code if response is not None else "network error"
+        logger.warning(f"GitHub returned {status} for {url}; retry {attempt + 1}/{GITHUB_MAX_RETRIES} in {delay:.1f}s")
+        await asyncio.sleep(delay)
+        attempt += 1
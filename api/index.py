@@ -1,12 +1,26 @@
 # api/index.py
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from .http_client import start_http_client, close_http_client
+from .jobs import router as jobs_router, start_job_queue, close_job_queue
+from .metrics import router as metrics_router
+from .timing import TimingMiddleware
 from .auth import router as auth_router
 from .fetch import router as fetch_router
 from .generate import router as generate_router
 from .generate_groq import router as groq_router  # New Groq router
 
-app = FastAPI(docs_url="/api/py/docs", openapi_url="/api/py/openapi.json")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # One pooled client for every GitHub call, so connections and TLS sessions are reused
+    await start_http_client()
+    await start_job_queue()
+    yield
+    await close_job_queue()
+    await close_http_client()
+
+app = FastAPI(docs_url="/api/py/docs", openapi_url="/api/py/openapi.json", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -14,12 +28,17 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing"],
 )
+# Outermost, so the breakdown covers everything else the request goes through
+app.add_middleware(TimingMiddleware)
 
 app.include_router(auth_router, prefix="/api/py")
 app.include_router(fetch_router, prefix="/api/py")
 app.include_router(generate_router, prefix="/api/py")
 app.include_router(groq_router, prefix="/api/py")  # Add Groq router
+app.include_router(jobs_router, prefix="/api/py")
+app.include_router(metrics_router, prefix="/api/py")
 
 @app.get("/api/py")
 def read_root():
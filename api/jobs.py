@@ -0,0 +1,218 @@
+# api/jobs.py
+import os
+import time
+import uuid
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from fastapi import APIRouter, HTTPException
+
+logger = logging.getLogger(__name__)
+router = APIRouter()
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))  # Jobs running at once per process
+JOB_QUEUE_DEPTH = int(os.getenv("JOB_QUEUE_DEPTH", "16"))  # Waiting jobs before submissions are refused
+JOB_RETENTION_SECONDS = float(os.getenv("JOB_RETENTION_SECONDS", "3600"))  # How long finished jobs stay queryable
+
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+
+class Job:
+    """A unit of background work and its progress.
+
+    The runner reports progress with ``update``; ``work_done``/``work_total`` drive the ETA
+    and ``render_partial`` produces whatever result exists so far.
+    """
+
+    def __init__(self, runner: Callable[["Job"], Awaitable[None]]):
+        self.id = str(uuid.uuid4())
+        self.status = QUEUED
+        self.runner = runner
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.progress: Dict[str, Any] = {}
+        self.result: Optional[str] = None
+        self.render_partial: Optional[Callable[[], str]] = None
+        self.error: Optional[str] = None
+        self.task: Optional[asyncio.Task] = None
+
+    def update(self, **progress: Any) -> None:
+        self.progress.update(progress)
+
+    def eta_seconds(self) -> Optional[float]:
+        done, total = self.progress.get("work_done", 0), self.progress.get("work_total", 0)
+        if self.status != RUNNING or not done or not total:
+            return None
+        elapsed = time.time() - self.started_at
+        return round(elapsed * (total - done) / done, 1)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "progress": {key: value for key, value in self.progress.items() if key not in ("work_done", "work_total")},
+            "eta_seconds": self.eta_seconds(),
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "error": self.error,
+        }
+
+    def partial_result(self) -> Optional[str]:
+        if self.result is not None:
+            return self.result
+        return self.render_partial() if self.render_partial else None
+
+
+class JobQueue:
+    """In-process worker pool fed by a queue; once ``max_depth`` jobs wait, new submissions are refused.
+
+    Cancelled jobs stay in the queue until a worker skips them, so the depth counts
+    the jobs still waiting rather than the queue's length.
+    """
+
+    def __init__(self, workers: int = JOB_WORKERS, max_depth: int = JOB_QUEUE_DEPTH):
+        self.workers = workers
+        self.max_depth = max_depth
+        self.jobs: Dict[str, Job] = {}
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._durations: List[float] = []
+        self._waiting = 0
+        self._closing = False
+
+    def start(self) -> None:
+        if self._tasks:
+            return
+        self._closing = False
+        self._queue = asyncio.Queue()
+        self._waiting = 0
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(max(1, self.workers))]
+        logger.info(f"Started {len(self._tasks)} job workers (queue depth {self.max_depth})")
+
+    async def close(self) -> None:
+        # Workers stop after their current job, which is cancelled here
+        self._closing = True
+        for job in self.jobs.values():
+            if job.status in (QUEUED, RUNNING):
+                self.cancel(job.id)
+        running = [job.task for job in self.jobs.values() if job.task is not None]
+        await asyncio.gather(*running, return_exceptions=True)
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._queue = None
+
+    def retry_after(self) -> int:
+        """Rough seconds until a queue slot frees up, from recent job durations."""
+        average = sum(self._durations) / len(self._durations) if self._durations else 30.0
+        return max(1, int(average * self.max_depth / max(1, self.workers)))
+
+    def submit(self, runner: Callable[[Job], Awaitable[None]]) -> Job:
+        self.start()
+        self._prune()
+        if self._waiting >= self.max_depth:
+            raise HTTPException(
+                status_code=503,
+                detail="Too many documentation jobs are waiting; try again later.",
+                headers={"Retry-After": str(self.retry_after())},
+            )
+        job = Job(runner)
+        self._queue.put_nowait(job)
+        self._waiting += 1
+        self.jobs[job.id] = job
+        return job
+
+    def get(self, job_id: str) -> Job:
+        self._prune()
+        job = self.jobs.get(job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail="Job not found")
+        return job
+
+    def cancel(self, job_id: str) -> Job:
+        job = self.get(job_id)
+        if job.status == QUEUED:
+            # Left in the queue for the worker to skip, but no longer counted as waiting
+            self._waiting -= 1
+            self._finish(job, CANCELLED)
+        elif job.status == RUNNING and job.task is not None:
+            job.task.cancel()
+        return job
+
+    def depth(self) -> int:
+        return self._waiting
+
+    def _finish(self, job: Job, status: str, error: Optional[str] = None) -> None:
+        job.status = status
+        job.error = error
+        job.finished_at = time.time()
+        if job.started_at is not None and status == COMPLETED:
+            self._durations = (self._durations + [job.finished_at - job.started_at])[-20:]
+
+    def _prune(self) -> None:
+        cutoff = time.time() - JOB_RETENTION_SECONDS
+        for job_id in [job_id for job_id, job in self.jobs.items() if job.finished_at and job.finished_at < cutoff]:
+            del self.jobs[job_id]
+
+    async def _worker(self) -> None:
+        while not self._closing:
+            job = await self._queue.get()
+            try:
+                if job.status != QUEUED:
+                    continue
+                self._waiting -= 1
+                job.status = RUNNING
+                job.started_at = time.time()
+                job.task = asyncio.create_task(job.runner(job))
+                try:
+                    await job.task
+                except asyncio.CancelledError:
+                    self._finish(job, CANCELLED)
+                    logger.info(f"Job {job.id} cancelled")
+                except Exception as e:
+                    logger.error(f"Job {job.id} failed: {str(e)}")
+                    self._finish(job, FAILED, str(e))
+                else:
+                    self._finish(job, COMPLETED)
+            finally:
+                self._queue.task_done()
+
+
+JOB_QUEUE = JobQueue()
+
+
+async def start_job_queue() -> None:
+    JOB_QUEUE.start()
+
+
+async def close_job_queue() -> None:
+    await JOB_QUEUE.close()
+
+
+@router.get("/jobs/{job_id}", response_model=dict)
+async def get_job(job_id: str):
+    """Status and progress of a background job, with an ETA while it runs."""
+    snapshot = JOB_QUEUE.get(job_id).snapshot()
+    snapshot["queue_depth"] = JOB_QUEUE.depth()
+    return snapshot
+
+
+@router.get("/jobs/{job_id}/result", response_model=dict)
+async def get_job_result(job_id: str):
+    """The finished result, or whatever has been produced so far."""
+    job = JOB_QUEUE.get(job_id)
+    return {"job_id": job.id, "status": job.status, "partial": job.status != COMPLETED, "documentation": job.partial_result()}
+
+
+@router.post("/jobs/{job_id}/cancel", response_model=dict)
+async def cancel_job(job_id: str):
+    """Cancel a queued or running job; results produced so far stay available."""
+    return JOB_QUEUE.cancel(job_id).snapshot()
@@ -0,0 +1,146 @@
+# api/metrics.py
+import os
+import time
+import logging
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Optional
+
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import Response
+
+from .models import MODELS
+from .storage import DOC_STORE
+from .timing import span
+
+logger = logging.getLogger(__name__)
+router = APIRouter()
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+
+try:
+    import prometheus_client
+except ImportError:  # Optional dependency; metrics become no-ops without it
+    prometheus_client = None
+
+if METRICS_ENABLED and prometheus_client is None:
+    logger.info("prometheus_client is not installed; metrics are disabled")
+ENABLED = METRICS_ENABLED and prometheus_client is not None
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+CHUNK_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+
+
+class _NoopMetric:
+    """Stands in for every metric type when metrics are disabled."""
+
+    def labels(self, *args: Any, **kwargs: Any) -> "_NoopMetric":
+        return self
+
+    def observe(self, value: float) -> None:
+        pass
+
+    def inc(self, value: float = 1) -> None:
+        pass
+
+    def set(self, value: float) -> None:
+        pass
+
+
+_NOOP = _NoopMetric()
+
+
+def _metric(kind: str, name: str, documentation: str, labels: tuple = (), **kwargs: Any):
+    if not ENABLED:
+        return _NOOP
+    return getattr(prometheus_client, kind)(name, documentation, labels, **kwargs)
+
+
+GITHUB_REQUEST_SECONDS = _metric("Histogram", "codemyth_github_request_seconds", "GitHub API request latency", ("status",), buckets=LATENCY_BUCKETS)
+CHUNKING_SECONDS = _metric("Histogram", "codemyth_chunking_seconds", "Time spent tokenizing and chunking source", ("stage",), buckets=LATENCY_BUCKETS)
+CHUNKS_PER_FILE = _metric("Histogram", "codemyth_chunks_per_file", "Chunks each documented file was split into", ("backend",), buckets=CHUNK_BUCKETS)
+LLM_CALL_SECONDS = _metric("Histogram", "codemyth_llm_call_seconds", "LLM call latency", ("backend", "model", "kind"), buckets=LATENCY_BUCKETS)
+LLM_TOKENS = _metric("Counter", "codemyth_llm_tokens", "Tokens sent to and received from LLMs, as reported by the backend", ("backend", "model", "direction"))
+RATE_LIMIT_EVENTS = _metric("Counter", "codemyth_rate_limit_events", "Rate-limit responses and self-imposed pacing", ("source",))
+DOC_STORE_DOCUMENTS = _metric("Gauge", "codemyth_doc_store_documents", "Documents in the documentation store")
+
+
+if ENABLED:
+    class _CacheCollector:
+        """Reads hit/miss counters and sizes from the disk stores at scrape time, so lookups stay untouched."""
+
+        def describe(self):
+            # Registration would otherwise call collect(), importing the stores while this module loads
+            return []
+
+        def collect(self):
+            from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+            from .cache import DOC_CACHE
+            from .fetch import BLOB_STORE
+            from .github import ETAG_CACHE
+
+            requests = CounterMetricFamily("codemyth_cache_requests", "Cache lookups by result", labels=["cache", "result"])
+            size = GaugeMetricFamily("codemyth_cache_bytes", "Bytes held by each cache", labels=["cache"])
+            for name, store in (("documentation", DOC_CACHE), ("blob", BLOB_STORE), ("etag", ETAG_CACHE)):
+                stats = store.stats()
+                requests.add_metric([name, "hit"], stats["hits"])
+                requests.add_metric([name, "miss"], stats["misses"])
+                size.add_metric([name], stats["bytes"])
+            yield requests
+            yield size
+
+    prometheus_client.REGISTRY.register(_CacheCollector())
+
+
+@contextmanager
+def timed(histogram, span_name: str, **labels: str):
+    """Observe the duration of a block in ``histogram`` and in the request's ``span_name`` stage."""
+    with span(span_name):
+        if histogram is _NOOP:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            histogram.labels(**labels).observe(time.perf_counter() - start)
+
+
+_token_usage: ContextVar[Optional[Dict[str, int]]] = ContextVar("token_usage", default=None)
+
+
+@contextmanager
+def token_usage():
+    """Add up the backend-reported tokens of LLM calls made in a block, including tasks it starts."""
+    usage = {"prompt": 0, "completion": 0}
+    token = _token_usage.set(usage)
+    try:
+        yield usage
+    finally:
+        _token_usage.reset(token)
+
+
+def model_label(model: str) -> str:
+    """Model names come from clients, so labels are limited to registry names."""
+    return model if model in MODELS else "other"
+
+
+def record_tokens(backend: str, model: str, prompt_tokens: Optional[int], completion_tokens: Optional[int]) -> None:
+    usage = _token_usage.get()
+    if usage is not None:
+        usage["prompt"] += prompt_tokens or 0
+        usage["completion"] += completion_tokens or 0
+    model = model_label(model)
+    if prompt_tokens:
+        LLM_TOKENS.labels(backend=backend, model=model, direction="prompt").inc(prompt_tokens)
+    if completion_tokens:
+        LLM_TOKENS.labels(backend=backend, model=model, direction="completion").inc(completion_tokens)
+
+
+@router.get("/metrics")
+async def metrics():
+    """Prometheus exposition of request, LLM, cache and store metrics."""
+    if not ENABLED:
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+    DOC_STORE_DOCUMENTS.set(await DOC_STORE.count())
+    return Response(prometheus_client.generate_latest(), media_type=prometheus_client.CONTENT_TYPE_LATEST)
@@ -0,0 +1,148 @@
+# api/models.py
+import os
+import json
+import logging
+from collections import OrderedDict
+from dataclasses import dataclass, replace
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+MODEL_REGISTRY_FILE = os.getenv("MODEL_REGISTRY_FILE")  # JSON object of name -> spec fields, added to or overriding the built-in models
+OLLAMA_NUM_CTX = int(os.getenv("OLLAMA_NUM_CTX", "16384"))  # Context Ollama models are run with; their native windows need far more memory
+GROQ_TPM_LIMIT = os.getenv("GROQ_TPM_LIMIT")  # Overrides the registry for every Groq model, e.g. on a paid tier
+GROQ_RPM_LIMIT = os.getenv("GROQ_RPM_LIMIT")
+PROMPT_OVERHEAD_TOKENS = int(os.getenv("PROMPT_OVERHEAD_TOKENS", "300"))  # Instructions and file name around the code in a prompt
+
+# Token counts are taken with tiktoken's cl100k_base; other tokenizers split code into
+# this many tokens per cl100k_base token, so budgets are scaled before use
+TOKENIZER_RATIOS = {
+    "cl100k_base": 1.0,
+    "llama3": 1.0,
+    "qwen2": 1.05,
+    "gemma": 1.1,
+    "granite": 1.15,
+    "llama2": 1.3,
+    "mistral": 1.3,
+}
+
+
+@dataclass(frozen=True)
+class ModelSpec:
+    """What the generators need to know about a model to size their prompts.
+
+    ``context_tokens`` and ``max_output_tokens`` are in the model's own tokens; TPM and
+    RPM are the provider's per-minute quotas, or None for local models.
+    """
+
+    name: str
+    backend: str
+    context_tokens: int
+    max_output_tokens: int
+    tokenizer: str = "cl100k_base"
+    tokens_per_minute: Optional[int] = None
+    requests_per_minute: Optional[int] = None
+
+    @property
+    def tokenizer_ratio(self) -> float:
+        return TOKENIZER_RATIOS.get(self.tokenizer, max(TOKENIZER_RATIOS.values()))
+
+    def model_tokens(self, tokens: int) -> int:
+        """Estimate of a cl100k_base token count in this model's tokens."""
+        return int(tokens * self.tokenizer_ratio + 0.5)
+
+    @property
+    def input_tokens(self) -> int:
+        """Prompt tokens (cl100k_base) one call can carry next to its output budget.
+
+        A single request over the TPM quota is rejected outright, so for rate-limited
+        models the quota bounds the prompt as well as the context window does.
+        """
+        budget = self.context_tokens - self.max_output_tokens
+        if self.tokens_per_minute:
+            budget = min(budget, self.tokens_per_minute - self.max_output_tokens)
+        return max(1, int(budget / self.tokenizer_ratio))
+
+    @property
+    def chunk_tokens(self) -> int:
+        """Code tokens (cl100k_base) per chunk, leaving room for the prompt around it."""
+        return max(1, self.input_tokens - int(PROMPT_OVERHEAD_TOKENS / self.tokenizer_ratio))
+
+
+MODELS: Dict[str, ModelSpec] = {spec.name: spec for spec in (
+    # Local models; the context is capped at OLLAMA_NUM_CTX on lookup
+    ModelSpec("granite3.1-dense:2b", "ollama", 131072, 2048, "granite"),
+    ModelSpec("granite3.1-dense:8b", "ollama", 131072, 2048, "granite"),
+    ModelSpec("llama3.1:8b", "ollama", 131072, 2048, "llama3"),
+    ModelSpec("llama3.2:3b", "ollama", 131072, 2048, "llama3"),
+    ModelSpec("qwen2.5-coder:7b", "ollama", 32768, 2048, "qwen2"),
+    ModelSpec("codellama:7b", "ollama", 16384, 2048, "llama2"),
+    ModelSpec("mistral:7b", "ollama", 32768, 2048, "mistral"),
+    # Groq, with free-tier quotas
+    ModelSpec("mixtral-8x7b-32768", "groq", 32768, 1024, "mistral", 5000, 30),
+    ModelSpec("llama-3.1-8b-instant", "groq", 131072, 2048, "llama3", 6000, 30),
+    ModelSpec("llama-3.3-70b-versatile", "groq", 131072, 2048, "llama3", 12000, 30),
+    ModelSpec("llama3-8b-8192", "groq", 8192, 1024, "llama3", 6000, 30),
+    ModelSpec("llama3-70b-8192", "groq", 8192, 1024, "llama3", 6000, 30),
+    ModelSpec("gemma2-9b-it", "groq", 8192, 1024, "gemma", 15000, 30),
+)}
+
+# Conservative stand-ins for models missing from the registry
+FALLBACKS = {
+    "ollama": ModelSpec("unknown", "ollama", 8192, 1024, "mistral"),
+    "groq": ModelSpec("unknown", "groq", 8192, 1024, "mistral", 5000, 30),
+}
+
+
+def load_registry_file(path: str) -> None:
+    try:
+        with open(path) as registry:
+            entries = json.load(registry)
+        for name, fields in entries.items():
+            spec = ModelSpec(name=name, **fields)
+            fallback = FALLBACKS.get(spec.backend)
+            if fallback is None:
+                raise ValueError(f"model {name} has unknown backend {spec.backend}")
+            # Rate-limited backends need both quotas; take the conservative ones when omitted
+            MODELS[name] = replace(
+                spec,
+                tokens_per_minute=spec.tokens_per_minute or fallback.tokens_per_minute,
+                requests_per_minute=spec.requests_per_minute or fallback.requests_per_minute,
+            )
+    except (OSError, ValueError, TypeError, AttributeError) as e:
+        logger.error(f"Could not load model registry {path}: {str(e)}")
+
+
+if MODEL_REGISTRY_FILE:
+    load_registry_file(MODEL_REGISTRY_FILE)
+
+# Names come from clients, so only the most recent unknown ones are remembered
+_warned: "OrderedDict[str, None]" = OrderedDict()
+WARNED_MAX = 256
+
+
+def model_spec(name: str, backend: str) -> ModelSpec:
+    """The registry entry for ``name`` on ``backend``, with deployment overrides applied.
+
+    Names missing from the registry, or registered for another backend, get the
+    backend's conservative fallback.
+    """
+    spec = MODELS.get(name)
+    if spec is None or spec.backend != backend:
+        if name in _warned:
+            _warned.move_to_end(name)
+        else:
+            _warned[name] = None
+            if len(_warned) > WARNED_MAX:
+                _warned.popitem(last=False)
+            reason = "is not in the registry" if spec is None else f"is registered for {spec.backend}, not {backend}"
+            logger.warning(f"Model {name} {reason}; using conservative {backend} limits")
+        spec = replace(FALLBACKS[backend], name=name)
+    if spec.backend == "ollama":
+        spec = replace(spec, context_tokens=min(spec.context_tokens, OLLAMA_NUM_CTX))
+    elif spec.backend == "groq":
+        if GROQ_TPM_LIMIT:
+            spec = replace(spec, tokens_per_minute=int(GROQ_TPM_LIMIT))
+        if GROQ_RPM_LIMIT:
+            spec = replace(spec, requests_per_minute=int(GROQ_RPM_LIMIT))
+    return spec
@@ -0,0 +1,143 @@
+# api/planning.py
+import asyncio
+import logging
+from typing import AsyncGenerator, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from .chunking import CHUNK_OVERLAP, encode, split_by_structure
+from .compaction import Compaction
+from .metrics import CHUNKING_SECONDS, CHUNKS_PER_FILE, timed
+from .scheduler import iter_bounded
+from .triage import Triage, gitattributes_of
+
+logger = logging.getLogger(__name__)
+
+CODE_EXTENSIONS = {
+    '.py', '.js', '.jsx', '.java', '.cpp', '.c', '.cs', '.ts',
+    '.rb', '.php', '.go', '.rs', '.swift', '.kt', '.tsx'
+}
+
+# (filename, chunks, is_chunked) for one documentable file
+PlannedFile = Tuple[str, List[Dict[str, str]], bool]
+
+
+def is_code_file(filename: str) -> bool:
+    return any(filename.lower().endswith(ext) for ext in CODE_EXTENSIONS)
+
+
+def chunk_code(content: str, filename: str, max_tokens: int, tokens: Optional[List[int]] = None) -> List[Dict[str, str]]:
+    if not is_code_file(filename):
+        return []
+    with timed(CHUNKING_SECONDS, "chunk", stage="chunk"):
+        chunks = split_by_structure(content, filename, max_tokens, CHUNK_OVERLAP, tokens)
+    return [{"path": filename, "content": chunk, "chunk_id": i} for i, chunk in enumerate(chunks)]
+
+
+def plan_documentation(
+    files: List[Dict[str, str]],
+    max_tokens: int,
+    backend: str,
+    triage: Optional[Triage] = None,
+    compaction: Optional[Compaction] = None,
+) -> List[PlannedFile]:
+    """Split the input into (filename, chunks, is_chunked) entries, one per documentable file.
+
+    Files the triage rejects are left out; pass one in to learn why from ``triage.skipped``.
+    With ``compaction``, files are compacted before they are chunked and budgeted.
+    Files over ``max_tokens``, the chunk size of the model used, are chunked; smaller
+    ones keep their token count under ``tokens`` for batching.
+    """
+    if triage is None:
+        triage = Triage(is_code_file, gitattributes_of(files))
+    planned = []
+    for file in files:
+        filename = file["path"]
+        content = file["content"]
+
+        if not triage.check_file(filename, content):
+            continue
+
+        if compaction is not None:
+            content, tokens = compaction.apply(filename, content)
+            file = {**file, "content": content}
+        else:
+            # Encode once; the chunker reuses these tokens instead of re-tokenizing
+            tokens = encode(content)
+        if not triage.check_tokens(filename, len(tokens)):
+            continue
+        if len(tokens) <= max_tokens:
+            planned.append((filename, [{**file, "tokens": len(tokens)}], False))
+            CHUNKS_PER_FILE.labels(backend=backend).observe(1)
+        else:
+            chunks = chunk_code(content, filename, max_tokens, tokens)
+            CHUNKS_PER_FILE.labels(backend=backend).observe(len(chunks))
+            if chunks:
+                planned.append((filename, chunks, True))
+    return planned
+
+
+def planned_chunks(planned: List[PlannedFile]) -> List[Dict[str, str]]:
+    """Every chunk of ``planned`` in file order; ``iter_documented_files`` numbers chunks by this list."""
+    return [chunk for _, chunks, _ in planned for chunk in chunks]
+
+
+async def iter_documented_files(
+    planned: List[PlannedFile],
+    document_group: Callable[[List[int]], Awaitable[List[str]]],
+    finish_file: Callable[[str, List[str], bool], Awaitable[Dict[str, str]]],
+    concurrency: int,
+    groups: Optional[List[List[int]]] = None,
+) -> AsyncGenerator[Tuple[int, Dict[str, str]], None]:
+    """Yield (position, doc) for each planned file as soon as all of its chunks are done.
+
+    ``document_group`` documents a group of chunks, numbered as in ``planned_chunks``,
+    with one LLM call; every chunk is a group of its own unless ``groups`` says otherwise.
+    At most ``concurrency`` groups run at once. A file's chunk docs are passed to
+    ``finish_file`` in a task of its own, so follow-up calls such as a file summary do
+    not hold up other files. The first failure is raised and cancels the rest.
+    """
+    chunks = planned_chunks(planned)
+    if groups is None:
+        groups = [[index] for index in range(len(chunks))]
+    # One job per LLM call, flattened across files so chunks of large files run concurrently too
+    slots = [(position, i) for position, (_, file_chunks, _) in enumerate(planned) for i in range(len(file_chunks))]
+    chunk_docs = [[None] * len(file_chunks) for _, file_chunks, _ in planned]
+    remaining = [len(file_chunks) for _, file_chunks, _ in planned]
+    finished: asyncio.Queue = asyncio.Queue()
+    tasks = set()
+
+    async def finish(position: int) -> None:
+        filename, _, is_chunked = planned[position]
+        try:
+            await finished.put((position, await finish_file(filename, chunk_docs[position], is_chunked)))
+        except Exception as e:
+            await finished.put((position, e))
+
+    async def run_groups() -> None:
+        try:
+            async for group_index, docs in iter_bounded(
+                [lambda group=group: document_group(group) for group in groups],
+                concurrency,
+                sizes=[sum(len(chunks[index]["content"]) for index in group) for group in groups],
+            ):
+                for index, doc in zip(groups[group_index], docs):
+                    position, i = slots[index]
+                    chunk_docs[position][i] = doc
+                    remaining[position] -= 1
+                    if remaining[position] == 0:
+                        task = asyncio.create_task(finish(position))
+                        tasks.add(task)
+                        task.add_done_callback(tasks.discard)
+        except Exception as e:
+            await finished.put((None, e))
+
+    runner = asyncio.create_task(run_groups())
+    try:
+        for _ in range(len(planned)):
+            position, result = await finished.get()
+            if isinstance(result, Exception):
+                raise result
+            yield position, result
+    finally:
+        for task in [runner, *tasks]:
+            task.cancel()
+        await asyncio.gather(runner, *tasks, return_exceptions=True)
@@ -0,0 +1,87 @@
+# api/rate_limit.py
+import os
+import asyncio
+import hashlib
+import logging
+import time
+from collections import OrderedDict
+from typing import Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucketLimiter:
+    """Client-side pacing for per-minute token (TPM) and request (RPM) quotas.
+
+    Both buckets start full and refill continuously at ``limit / 60`` per second.
+    Waiters are served in arrival order.
+    """
+
+    def __init__(self, tokens_per_minute: int, requests_per_minute: int):
+        self.tokens_per_minute = tokens_per_minute
+        self.requests_per_minute = requests_per_minute
+        self._tokens = float(tokens_per_minute)
+        self._requests = float(requests_per_minute)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float) -> None:
+        elapsed = now - self._updated
+        self._updated = now
+        self._tokens = min(self.tokens_per_minute, self._tokens + elapsed * self.tokens_per_minute / 60)
+        self._requests = min(self.requests_per_minute, self._requests + elapsed * self.requests_per_minute / 60)
+
+    async def acquire(self, tokens: int) -> float:
+        """Wait until one request of ``tokens`` tokens fits both budgets; return seconds waited."""
+        # A single prompt larger than the whole budget can only ever run on a full bucket
+        tokens = min(tokens, self.tokens_per_minute)
+        waited = 0.0
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+                delay = self._paused_until - now
+                if delay <= 0:
+                    token_deficit = tokens - self._tokens
+                    request_deficit = 1 - self._requests
+                    delay = max(
+                        token_deficit * 60 / self.tokens_per_minute,
+                        request_deficit * 60 / self.requests_per_minute,
+                    )
+                if delay <= 0:
+                    self._tokens -= tokens
+                    self._requests -= 1
+                    return waited
+                await asyncio.sleep(delay)
+                waited += delay
+
+    def pause(self, seconds: float) -> None:
+        """Block all callers for ``seconds`` after the server reported a limit anyway."""
+        now = time.monotonic()
+        self._refill(now)
+        self._paused_until = max(self._paused_until, now + seconds)
+        self._tokens = 0.0
+        self._requests = 0.0
+
+
+RATE_LIMITERS_MAX = int(os.getenv("RATE_LIMITERS_MAX", "1024"))  # (API key, model) pairs tracked; the least recently used are dropped
+
+_LIMITERS: "OrderedDict[Tuple[str, str], TokenBucketLimiter]" = OrderedDict()
+
+
+def get_limiter(api_key: str, model_name: str, tokens_per_minute: int, requests_per_minute: int) -> TokenBucketLimiter:
+    """Return the limiter shared by every request using the same API key and model.
+
+    Keys and model names come from clients, so only the ``RATE_LIMITERS_MAX`` most
+    recently used limiters are kept; requests already holding an evicted one keep it.
+    """
+    key = (hashlib.sha256(api_key.encode("utf-8")).hexdigest(), model_name)
+    limiter = _LIMITERS.get(key)
+    if limiter is None or (limiter.tokens_per_minute, limiter.requests_per_minute) != (tokens_per_minute, requests_per_minute):
+        limiter = TokenBucketLimiter(tokens_per_minute, requests_per_minute)
+        _LIMITERS[key] = limiter
+    _LIMITERS.move_to_end(key)
+    while len(_LIMITERS) > RATE_LIMITERS_MAX:
+        _LIMITERS.popitem(last=False)
+    return limiter
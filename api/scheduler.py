@@ -0,0 +1,60 @@
+# api/scheduler.py
+import asyncio
+import logging
+from typing import AsyncIterator, Awaitable, Callable, List, Optional, Tuple, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+async def iter_bounded(
+    jobs: List[Callable[[], Awaitable[T]]],
+    limit: int,
+    sizes: Optional[List[int]] = None,
+    max_pending: int = 0,
+) -> AsyncIterator[Tuple[int, T]]:
+    """Run job factories with at most ``limit`` in flight, yielding ``(index, result)`` as each finishes.
+
+    Jobs are started largest-first when ``sizes`` is given, so long LLM calls do not end
+    up as stragglers at the tail of the run. The first failure cancels the remaining jobs
+    and is re-raised; so does closing the iterator early. With ``max_pending``, workers
+    wait once that many results are waiting for a slow consumer, which bounds memory
+    when results are large.
+    """
+    if not jobs:
+        return
+    order = list(range(len(jobs)))
+    if sizes is not None:
+        order.sort(key=lambda i: sizes[i], reverse=True)
+    pending = iter(order)
+    finished: "asyncio.Queue[Tuple[int, Optional[T], Optional[Exception]]]" = asyncio.Queue(max_pending)
+
+    async def worker() -> None:
+        for index in pending:
+            try:
+                result = await jobs[index]()
+            except Exception as e:
+                await finished.put((index, None, e))
+                return
+            await finished.put((index, result, None))
+
+    workers = [asyncio.create_task(worker()) for _ in range(max(1, min(limit, len(jobs))))]
+    try:
+        for _ in range(len(jobs)):
+            index, result, error = await finished.get()
+            if error is not None:
+                raise error
+            yield index, result
+    finally:
+        for task in workers:
+            task.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+
+
+async def run_bounded(jobs: List[Callable[[], Awaitable[T]]], limit: int, sizes: Optional[List[int]] = None) -> List[T]:
+    """Like ``iter_bounded`` but wait for every job and return results in job order."""
+    results: List[Optional[T]] = [None] * len(jobs)
+    async for index, result in iter_bounded(jobs, limit, sizes):
+        results[index] = result
+    return results
@@ -14,9 +14,17 @@ class FeedbackResponse(BaseModel):
 class DocumentationResponse(BaseModel):
     documentation_id: str = Field(..., description="Unique ID for the generated documentation")
     documentation: str = Field(..., description="Generated unified documentation in Markdown")
+    skipped: List[Dict[str, str]] = Field(default_factory=list, description="Files left out before generation, each with 'path' and 'reason'")
+    tokens_saved: Dict[str, int] = Field(default_factory=dict, description="Prompt tokens saved by compaction, per file")
 
 class FileInput(BaseModel):
     files: List[Dict[str, str]]
+    force_regenerate: bool = Field(default=False, description="Bypass the documentation cache and regenerate every chunk")
+    stream_tokens: bool = Field(default=False, description="When streaming, also send LLM output token by token, tagged with file and chunk")
+    batch_small_files: bool = Field(default=False, description="Document several small files per LLM call instead of one call each; the Groq endpoint does not batch")
+    hierarchical_summaries: bool = Field(default=False, description="Summarize large files from their chunks and add directory summaries and a project overview")
+    compact_prompts: bool = Field(default=False, description="Strip license headers, banners and blank-line runs and cut long literals before prompting")
+    drop_function_bodies: bool = Field(default=False, description="Also replace long Python function bodies with '...', keeping signatures and docstrings")
 
 class AcceptChangesInput(BaseModel):
     documentation_id: str = Field(..., description="ID of the documentation to accept")
@@ -29,4 +37,8 @@ class AcceptChangesInput(BaseModel):
 class GroqInput(BaseModel):
     files: List[Dict[str, str]] = Field(..., description="List of files with 'path' and 'content' for batch processing")
     groq_api_key: str = Field(..., description="User-provided Groq API key")
-    model_name: str = Field(default="mixtral-8x7b-32768", description="Groq model name, defaults to mixtral-8x7b-32768")
+    model_name: str = Field(default="mixtral-8x7b-32768", description="Groq model name, defaults to mixtral-8x7b-32768; chunk size and rate limits follow its registry entry")
+    force_regenerate: bool = Field(default=False, description="Bypass the documentation cache and regenerate every chunk")
+    stream_tokens: bool = Field(default=False, description="When streaming, also send LLM output token by token, tagged with file and chunk")
+    compact_prompts: bool = Field(default=False, description="Strip license headers, banners and blank-line runs and cut long literals before prompting")
+    drop_function_bodies: bool = Field(default=False, description="Also replace long Python function bodies with '...', keeping signatures and docstrings")
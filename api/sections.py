@@ -0,0 +1,91 @@
+# api/sections.py
+import os
+import re
+from typing import Dict, List, Tuple
+
+_HEADING = re.compile(r"^(#{2,3})[ \t]+(.+?)[ \t]*#*[ \t]*$")
+_FENCE = re.compile(r"^[ \t]*(```|~~~)")
+_SECTION_BLOCK = re.compile(r"<<<SECTION (.+?)>>>\n(.*?)\n?<<<END>>>", re.DOTALL)
+
+SECTION_START = "<<<SECTION {key}>>>"
+SECTION_END = "<<<END>>>"
+
+
+def index_sections(markdown: str) -> List[Dict]:
+    """Index a document by its ``##`` and ``###`` headings.
+
+    Each section runs from its heading to the next ``##``/``###`` heading, so a ``##``
+    section only holds the text before its first file heading. Headings inside code
+    fences are ignored. Returns dicts with ``key`` (the heading line, de-duplicated),
+    ``level``, ``title``, ``start`` and ``end`` character offsets; text before the first
+    heading is not indexed.
+    """
+    sections: List[Dict] = []
+    seen: Dict[str, int] = {}
+    in_fence = False
+    offset = 0
+    for line in markdown.splitlines(keepends=True):
+        if _FENCE.match(line):
+            in_fence = not in_fence
+        match = None if in_fence else _HEADING.match(line.rstrip("\r\n"))
+        if match:
+            if sections:
+                sections[-1]["end"] = offset
+            key = f"{match.group(1)} {match.group(2)}"
+            seen[key] = seen.get(key, 0) + 1
+            if seen[key] > 1:
+                key = f"{key} ({seen[key]})"
+            sections.append({"key": key, "level": len(match.group(1)), "title": match.group(2), "start": offset, "end": len(markdown)})
+        offset += len(line)
+    return sections
+
+
+def match_sections(feedback: str, sections: List[Dict]) -> List[str]:
+    """Keys of sections the feedback names explicitly, by title or, for files, by base name."""
+    text = feedback.lower()
+    keys = []
+    for section in sections:
+        title = section["title"].lower()
+        names = {title}
+        if section["level"] == 3:
+            names.add(os.path.basename(title))
+        if any(re.search(r"(?<![\w./-])" + re.escape(name) + r"(?![\w-])", text) for name in names if name):
+            keys.append(section["key"])
+    return keys
+
+
+def render_sections(markdown: str, sections: List[Dict], keys: List[str]) -> str:
+    """Wrap the selected sections in ``<<<SECTION key>>>``/``<<<END>>>`` markers for a prompt."""
+    by_key = {section["key"]: section for section in sections}
+    blocks = []
+    for key in keys:
+        section = by_key[key]
+        body = markdown[section["start"]:section["end"]].rstrip("\n")
+        blocks.append(f"{SECTION_START.format(key=key)}\n{body}\n{SECTION_END}")
+    return "\n".join(blocks)
+
+
+def parse_sections(text: str) -> Tuple[str, Dict[str, str]]:
+    """Split an LLM reply into the free-text part before the first marker and the revised sections."""
+    first = text.find("<<<SECTION ")
+    preamble = text if first == -1 else text[:first]
+    return preamble.strip(), {key.strip(): body for key, body in _SECTION_BLOCK.findall(text)}
+
+
+def splice_sections(markdown: str, sections: List[Dict], replacements: Dict[str, str]) -> str:
+    """Replace the text of the given sections, leaving every other byte of the document as it was."""
+    by_key = {section["key"]: section for section in sections}
+    result = markdown
+    for key in sorted(replacements, key=lambda k: by_key[k]["start"], reverse=True):
+        section = by_key[key]
+        original = markdown[section["start"]:section["end"]]
+        replacement = replacements[key].rstrip("\n")
+        # Keep the blank-line spacing before the next heading
+        replacement += original[len(original.rstrip("\n")):] or ("\n" if section["end"] < len(markdown) else "")
+        result = result[:section["start"]] + replacement + result[section["end"]:]
+    return result
+
+
+def section_outline(sections: List[Dict]) -> str:
+    """One heading per line, used to let the LLM pick sections without seeing their text."""
+    return "\n".join(section["key"] for section in sections)
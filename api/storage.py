@@ -0,0 +1,400 @@
+# api/storage.py
+import os
+import asyncio
+import logging
+import sqlite3
+import datetime
+import tempfile
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Optional, List, Dict, Any, Tuple
+from .versioning import SNAPSHOT, compress_text, decompress_text, encode_version, rebuild
+
+logger = logging.getLogger(__name__)
+
+DOC_STORE_BACKEND = os.getenv("DOC_STORE_BACKEND", "sqlite")  # "sqlite" or "memory"
+DOC_STORE_PATH = os.getenv("DOC_STORE_PATH", os.path.join(tempfile.gettempdir(), "codemyth", "docs.sqlite3"))
+CHAT_HISTORY_LIMIT = 5
+DOC_MEMORY_BUDGET_BYTES = int(os.getenv("DOC_MEMORY_BUDGET_BYTES", str(256 * 1024 * 1024)))  # Memory backend only
+DOC_IDLE_TTL_SECONDS = float(os.getenv("DOC_IDLE_TTL_SECONDS", str(24 * 60 * 60)))  # Memory backend only
+
+
+def _now() -> str:
+    return datetime.datetime.now().isoformat()
+
+
+class DocumentStore(ABC):
+    """Documentation versions and refinement chat history, addressed by documentation ID.
+
+    A version is a dict with ``version_number``, ``content``, ``timestamp`` and ``feedback``;
+    a chat entry is a dict with ``user`` and ``assistant``. Versions are kept as a compressed
+    snapshot plus line deltas and rebuilt on demand.
+    """
+
+    @abstractmethod
+    async def create(self, doc_id: str, content: str, feedback: Optional[str] = None) -> None:
+        """Store a new document, or replace an existing one, as a single version 1."""
+
+    @abstractmethod
+    async def get_current(self, doc_id: str) -> Optional[Dict[str, Any]]:
+        """Return the current version, or None if the document does not exist."""
+
+    @abstractmethod
+    async def get_version(self, doc_id: str, version_number: int) -> Optional[Dict[str, Any]]:
+        """Rebuild any stored version, or return None if it does not exist."""
+
+    @abstractmethod
+    async def add_version(self, doc_id: str, content: str, feedback: Optional[str]) -> Tuple[int, str]:
+        """Append a version, make it current and return its number and a unified diff from the previous one."""
+
+    @abstractmethod
+    async def get_chat_history(self, doc_id: str, limit: int = CHAT_HISTORY_LIMIT) -> List[Dict[str, str]]:
+        """Return the last ``limit`` chat entries, oldest first."""
+
+    @abstractmethod
+    async def append_chat(self, doc_id: str, user: str, assistant: str, keep: int = CHAT_HISTORY_LIMIT) -> None:
+        """Add a chat entry, keeping only the last ``keep``."""
+
+    @abstractmethod
+    async def count(self) -> int:
+        """Number of stored documents."""
+
+
+class MemoryDocumentStore(DocumentStore):
+    """Process-local store; documents are lost on restart and not shared between workers.
+
+    Documents idle for longer than ``ttl_seconds`` are dropped, and least recently used
+    documents are evicted while the total footprint exceeds ``budget_bytes``.
+    """
+
+    def __init__(self, budget_bytes: int = DOC_MEMORY_BUDGET_BYTES, ttl_seconds: float = DOC_IDLE_TTL_SECONDS):
+        self.budget_bytes = budget_bytes
+        self.ttl_seconds = ttl_seconds
+        self.documents: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self.total_bytes = 0
+        self._write_lock = asyncio.Lock()  # Deltas are computed off the loop; keep appends in order
+
+    @staticmethod
+    def _footprint(document: Dict[str, Any]) -> int:
+        return (
+            len(document["current"])
+            + sum(len(version["data"]) for version in document["versions"])
+            + sum(len(entry["user"]) + len(entry["assistant"]) for entry in document["chat_history"])
+        )
+
+    def _remove(self, doc_id: str) -> None:
+        document = self.documents.pop(doc_id)
+        self.total_bytes -= document["size"]
+
+    def _touch(self, doc_id: str) -> Optional[Dict[str, Any]]:
+        document = self.documents.get(doc_id)
+        if document is None:
+            return None
+        now = time.monotonic()
+        if now - document["last_access"] > self.ttl_seconds:
+            self._remove(doc_id)
+            return None
+        document["last_access"] = now
+        self.documents.move_to_end(doc_id)
+        return document
+
+    def _resize(self, doc_id: str) -> None:
+        document = self.documents[doc_id]
+        size = self._footprint(document)
+        self.total_bytes += size - document["size"]
+        document["size"] = size
+        self._evict()
+
+    def _evict(self) -> None:
+        now = time.monotonic()
+        while self.documents:
+            doc_id, document = next(iter(self.documents.items()))
+            idle = now - document["last_access"] > self.ttl_seconds
+            # The most recently used document is kept even if it alone exceeds the budget
+            over_budget = self.total_bytes > self.budget_bytes and len(self.documents) > 1
+            if not (idle or over_budget):
+                break
+            logger.info(f"Evicting documentation {doc_id} ({'idle' if idle else 'memory budget'})")
+            self._remove(doc_id)
+
+    @staticmethod
+    def _version_meta(version: Dict[str, Any], content: str) -> Dict[str, Any]:
+        return {"version_number": version["version_number"], "content": content, "timestamp": version["timestamp"], "feedback": version["feedback"]}
+
+    async def create(self, doc_id: str, content: str, feedback: Optional[str] = None) -> None:
+        if doc_id in self.documents:
+            self._remove(doc_id)
+        self.documents[doc_id] = {
+            "versions": [{"version_number": 1, "kind": SNAPSHOT, "data": compress_text(content), "timestamp": _now(), "feedback": feedback}],
+            "current_version": 1,
+            "current": content,
+            "chat_history": [],
+            "last_access": time.monotonic(),
+            "size": 0
+        }
+        self._resize(doc_id)
+
+    async def get_current(self, doc_id: str) -> Optional[Dict[str, Any]]:
+        document = self._touch(doc_id)
+        if document is None:
+            return None
+        return self._version_meta(document["versions"][-1], document["current"])
+
+    async def get_version(self, doc_id: str, version_number: int) -> Optional[Dict[str, Any]]:
+        document = self._touch(doc_id)
+        if document is None or not 1 <= version_number <= len(document["versions"]):
+            return None
+        versions = document["versions"][:version_number]
+        content = await asyncio.to_thread(rebuild, [(version["kind"], version["data"]) for version in versions])
+        return self._version_meta(versions[-1], content)
+
+    async def add_version(self, doc_id: str, content: str, feedback: Optional[str]) -> Tuple[int, str]:
+        async with self._write_lock:
+            return await self._add_version(doc_id, content, feedback)
+
+    async def _add_version(self, doc_id: str, content: str, feedback: Optional[str]) -> Tuple[int, str]:
+        document = self._touch(doc_id)
+        if document is None:
+            raise KeyError(doc_id)
+        version_number = len(document["versions"]) + 1
+        # Diffing and compressing large documents is too slow to run on the event loop
+        kind, data, diff = await asyncio.to_thread(encode_version, version_number, document["current"], content)
+        if self.documents.get(doc_id) is not document:
+            raise KeyError(doc_id)  # Replaced or evicted meanwhile
+        document["versions"].append({"version_number": version_number, "kind": kind, "data": data, "timestamp": _now(), "feedback": feedback})
+        document["current_version"] = version_number
+        document["current"] = content
+        self._resize(doc_id)
+        return version_number, diff
+
+    async def get_chat_history(self, doc_id: str, limit: int = CHAT_HISTORY_LIMIT) -> List[Dict[str, str]]:
+        document = self._touch(doc_id)
+        return list(document["chat_history"][-limit:]) if document else []
+
+    async def append_chat(self, doc_id: str, user: str, assistant: str, keep: int = CHAT_HISTORY_LIMIT) -> None:
+        document = self._touch(doc_id)
+        if document is None:
+            raise KeyError(doc_id)
+        document["chat_history"] = (document["chat_history"] + [{"user": user, "assistant": assistant}])[-keep:]
+        self._resize(doc_id)
+
+    async def count(self) -> int:
+        self._evict()
+        return len(self.documents)
+
+
+VERSIONS_TABLE = """
+CREATE TABLE IF NOT EXISTS versions (
+    doc_id TEXT NOT NULL REFERENCES documents(id) ON DELETE CASCADE,
+    version_number INTEGER NOT NULL,
+    kind TEXT NOT NULL,
+    data BLOB NOT NULL,
+    timestamp TEXT NOT NULL,
+    feedback TEXT,
+    PRIMARY KEY (doc_id, version_number)
+)"""
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    id TEXT PRIMARY KEY,
+    current_version INTEGER NOT NULL,
+    current_data BLOB NOT NULL,
+    created_at TEXT NOT NULL
+);
+""" + VERSIONS_TABLE + """;
+CREATE TABLE IF NOT EXISTS chat_history (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    doc_id TEXT NOT NULL REFERENCES documents(id) ON DELETE CASCADE,
+    user TEXT NOT NULL,
+    assistant TEXT NOT NULL,
+    timestamp TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_chat_history_doc ON chat_history (doc_id, id);
+"""
+
+
+class SQLiteDocumentStore(DocumentStore):
+    """SQLite store in WAL mode, safe to share between uvicorn workers on one host.
+
+    Queries run in worker threads (one connection per thread) so they never block the
+    event loop. The current version is kept compressed on the document row so reads do
+    not replay deltas.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._schema_lock = threading.Lock()
+        self._schema_ready = False
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            with self._schema_lock:
+                if not self._schema_ready:
+                    self._migrate_plaintext_versions(conn)
+                    conn.executescript(SQLITE_SCHEMA)
+                    self._schema_ready = True
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _migrate_plaintext_versions(conn: sqlite3.Connection) -> None:
+        """Convert databases that stored every version as plain text to snapshots plus deltas."""
+        columns = {row["name"] for row in conn.execute("PRAGMA table_info(versions)")}
+        if "content" not in columns:
+            return
+        logger.info("Migrating documentation versions to delta storage")
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("ALTER TABLE versions RENAME TO versions_plaintext")
+            conn.execute("ALTER TABLE documents ADD COLUMN current_data BLOB NOT NULL DEFAULT x''")
+            conn.execute(VERSIONS_TABLE)
+            previous: Dict[str, str] = {}
+            for row in conn.execute("SELECT * FROM versions_plaintext ORDER BY doc_id, version_number").fetchall():
+                kind, data, _ = encode_version(row["version_number"], previous.get(row["doc_id"], ""), row["content"])
+                previous[row["doc_id"]] = row["content"]
+                conn.execute(
+                    "INSERT INTO versions (doc_id, version_number, kind, data, timestamp, feedback) VALUES (?, ?, ?, ?, ?, ?)",
+                    (row["doc_id"], row["version_number"], kind, data, row["timestamp"], row["feedback"]),
+                )
+            conn.execute(
+                "UPDATE documents SET current_data = (SELECT content FROM versions_plaintext v "
+                "WHERE v.doc_id = documents.id AND v.version_number = documents.current_version)"
+            )
+            for row in conn.execute("SELECT id, current_data FROM documents").fetchall():
+                conn.execute("UPDATE documents SET current_data = ? WHERE id = ?", (compress_text(row["current_data"] or ""), row["id"]))
+            conn.execute("DROP TABLE versions_plaintext")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    @contextmanager
+    def _transaction(self):
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    async def _run(self, fn, *args):
+        return await asyncio.to_thread(fn, *args)
+
+    def _create(self, doc_id: str, content: str, feedback: Optional[str]) -> None:
+        now = _now()
+        data = compress_text(content)
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM documents WHERE id = ?", (doc_id,))
+            conn.execute("INSERT INTO documents (id, current_version, current_data, created_at) VALUES (?, 1, ?, ?)", (doc_id, data, now))
+            conn.execute(
+                "INSERT INTO versions (doc_id, version_number, kind, data, timestamp, feedback) VALUES (?, 1, ?, ?, ?, ?)",
+                (doc_id, SNAPSHOT, data, now, feedback),
+            )
+
+    def _get_current(self, doc_id: str) -> Optional[Dict[str, Any]]:
+        row = self._connection().execute(
+            "SELECT v.version_number, d.current_data, v.timestamp, v.feedback FROM documents d "
+            "JOIN versions v ON v.doc_id = d.id AND v.version_number = d.current_version WHERE d.id = ?",
+            (doc_id,),
+        ).fetchone()
+        if row is None:
+            return None
+        return {"version_number": row["version_number"], "content": decompress_text(row["current_data"]), "timestamp": row["timestamp"], "feedback": row["feedback"]}
+
+    def _get_version(self, doc_id: str, version_number: int) -> Optional[Dict[str, Any]]:
+        rows = self._connection().execute(
+            "SELECT version_number, kind, data, timestamp, feedback FROM versions WHERE doc_id = ? AND version_number <= ? "
+            "AND version_number >= (SELECT MAX(version_number) FROM versions WHERE doc_id = ? AND version_number <= ? AND kind = ?) "
+            "ORDER BY version_number",
+            (doc_id, version_number, doc_id, version_number, SNAPSHOT),
+        ).fetchall()
+        if not rows or rows[-1]["version_number"] != version_number:
+            return None
+        content = rebuild([(row["kind"], row["data"]) for row in rows])
+        return {"version_number": version_number, "content": content, "timestamp": rows[-1]["timestamp"], "feedback": rows[-1]["feedback"]}
+
+    def _add_version(self, doc_id: str, content: str, feedback: Optional[str]) -> Tuple[int, str]:
+        with self._transaction() as conn:
+            row = conn.execute("SELECT current_version, current_data FROM documents WHERE id = ?", (doc_id,)).fetchone()
+            if row is None:
+                raise KeyError(doc_id)
+            version_number = row["current_version"] + 1
+            kind, data, diff = encode_version(version_number, decompress_text(row["current_data"]), content)
+            conn.execute(
+                "INSERT INTO versions (doc_id, version_number, kind, data, timestamp, feedback) VALUES (?, ?, ?, ?, ?, ?)",
+                (doc_id, version_number, kind, data, _now(), feedback),
+            )
+            conn.execute(
+                "UPDATE documents SET current_version = ?, current_data = ? WHERE id = ?",
+                (version_number, compress_text(content), doc_id),
+            )
+        return version_number, diff
+
+    def _get_chat_history(self, doc_id: str, limit: int) -> List[Dict[str, str]]:
+        rows = self._connection().execute(
+            "SELECT user, assistant FROM chat_history WHERE doc_id = ? ORDER BY id DESC LIMIT ?",
+            (doc_id, limit),
+        ).fetchall()
+        return [dict(row) for row in reversed(rows)]
+
+    def _append_chat(self, doc_id: str, user: str, assistant: str, keep: int) -> None:
+        with self._transaction() as conn:
+            conn.execute(
+                "INSERT INTO chat_history (doc_id, user, assistant, timestamp) VALUES (?, ?, ?, ?)",
+                (doc_id, user, assistant, _now()),
+            )
+            conn.execute(
+                "DELETE FROM chat_history WHERE doc_id = ? AND id NOT IN "
+                "(SELECT id FROM chat_history WHERE doc_id = ? ORDER BY id DESC LIMIT ?)",
+                (doc_id, doc_id, keep),
+            )
+
+    def _count(self) -> int:
+        return self._connection().execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+
+    async def create(self, doc_id: str, content: str, feedback: Optional[str] = None) -> None:
+        await self._run(self._create, doc_id, content, feedback)
+
+    async def get_current(self, doc_id: str) -> Optional[Dict[str, Any]]:
+        return await self._run(self._get_current, doc_id)
+
+    async def get_version(self, doc_id: str, version_number: int) -> Optional[Dict[str, Any]]:
+        return await self._run(self._get_version, doc_id, version_number)
+
+    async def add_version(self, doc_id: str, content: str, feedback: Optional[str]) -> Tuple[int, str]:
+        return await self._run(self._add_version, doc_id, content, feedback)
+
+    async def get_chat_history(self, doc_id: str, limit: int = CHAT_HISTORY_LIMIT) -> List[Dict[str, str]]:
+        return await self._run(self._get_chat_history, doc_id, limit)
+
+    async def append_chat(self, doc_id: str, user: str, assistant: str, keep: int = CHAT_HISTORY_LIMIT) -> None:
+        await self._run(self._append_chat, doc_id, user, assistant, keep)
+
+    async def count(self) -> int:
+        return await self._run(self._count)
+
+
+def create_document_store() -> DocumentStore:
+    if DOC_STORE_BACKEND == "memory":
+        return MemoryDocumentStore()
+    if DOC_STORE_BACKEND != "sqlite":
+        logger.warning(f"Unknown DOC_STORE_BACKEND '{DOC_STORE_BACKEND}', using sqlite")
+    logger.info(f"Using SQLite documentation store at {DOC_STORE_PATH}")
+    return SQLiteDocumentStore(DOC_STORE_PATH)
+
+
+# Shared by every router, so docs from either generator can be refined and accepted
+DOC_STORE = create_document_store()
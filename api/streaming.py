@@ -0,0 +1,124 @@
+# api/streaming.py
+import asyncio
+import json
+import zlib
+from typing import Any, AsyncIterator, Dict, TypeVar
+
+from fastapi.responses import StreamingResponse
+
+T = TypeVar("T")
+
+
+def sse_event(payload: dict) -> str:
+    """Encode a JSON payload as a single Server-Sent Events frame."""
+    return f"data: {json.dumps(payload)}\n\n"
+
+
+def token_event(chunk: Dict[str, str], text: str) -> dict:
+    """SSE payload for a fragment of LLM output, tagged with the file and chunk it belongs to."""
+    return {"status": "token", "file": chunk["path"], "chunk": chunk.get("chunk_id", 0), "content": text}
+
+
+async def interleave(events: AsyncIterator[T], side_channel: "asyncio.Queue[T]") -> AsyncIterator[T]:
+    """Yield items from ``events`` merged with anything pushed onto ``side_channel`` meanwhile.
+
+    Used to mix per-token frames, which are produced inside concurrently running LLM
+    calls, into the ordered event stream of a generation run.
+    """
+    done = object()
+
+    async def pump() -> None:
+        try:
+            async for event in events:
+                await side_channel.put(event)
+        finally:
+            side_channel.put_nowait(done)
+
+    task = asyncio.create_task(pump())
+    try:
+        while True:
+            item = await side_channel.get()
+            if item is done:
+                break
+            yield item
+        await task  # Re-raise anything the event source failed with
+    finally:
+        if not task.done():
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+
+async def gzip_chunks(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """Gzip a byte stream, flushing after every chunk so the client can decode each one as it arrives."""
+    compressor = zlib.compressobj(wbits=31)  # 31 selects the gzip container
+    async for chunk in chunks:
+        yield compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+    yield compressor.flush()
+
+
+def ndjson_response(items: AsyncIterator[Any], gzip: bool = False) -> StreamingResponse:
+    """Stream values as newline-delimited JSON, one line each as soon as it is produced."""
+    async def lines() -> AsyncIterator[bytes]:
+        async for item in items:
+            yield json.dumps(item).encode("utf-8") + b"\n"
+
+    if gzip:
+        return StreamingResponse(gzip_chunks(lines()), media_type="application/x-ndjson", headers={"Content-Encoding": "gzip"})
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+async def iter_ndjson(chunks: AsyncIterator[bytes], max_line_bytes: int) -> AsyncIterator[Any]:
+    """Parse newline-delimited JSON from a byte stream, yielding each value as soon as its line is complete.
+
+    Only the current partial line is buffered. Blank lines are skipped; a line longer
+    than ``max_line_bytes`` or one that is not valid JSON raises ``ValueError``.
+    """
+    buffer = bytearray()
+    scanned = 0  # Bytes of the partial line already searched for a newline
+    line_number = 0
+
+    def parse(line: bytes) -> Any:
+        try:
+            return json.loads(line)
+        except ValueError as e:
+            raise ValueError(f"Line {line_number} is not valid JSON: {e}") from None
+
+    async for chunk in chunks:
+        buffer += chunk
+        start = 0
+        while True:
+            end = buffer.find(b"\n", max(start, scanned))
+            if end < 0:
+                break
+            line_number += 1
+            if end - start > max_line_bytes:
+                raise ValueError(f"Line {line_number} is longer than {max_line_bytes} bytes")
+            line = bytes(buffer[start:end]).strip()
+            start = end + 1
+            if line:
+                yield parse(line)
+        del buffer[:start]
+        scanned = len(buffer)
+        if len(buffer) > max_line_bytes:
+            raise ValueError(f"Line {line_number + 1} is longer than {max_line_bytes} bytes")
+    line = bytes(buffer).strip()
+    if line:
+        line_number += 1
+        yield parse(line)
+
+
+class UploadStreamingResponse(StreamingResponse):
+    """A streaming response for endpoints that keep reading the request body while they respond.
+
+    ``StreamingResponse`` watches for client disconnects by calling ``receive()``, which
+    would swallow body chunks the endpoint has not read yet. This one starts watching
+    only once ``body_read`` is set.
+    """
+
+    def __init__(self, content: Any, body_read: asyncio.Event, **kwargs: Any):
+        super().__init__(content, **kwargs)
+        self.body_read = body_read
+
+    async def listen_for_disconnect(self, receive) -> None:
+        await self.body_read.wait()
+        await super().listen_for_disconnect(receive)
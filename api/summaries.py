@@ -0,0 +1,61 @@
+# api/summaries.py
+import posixpath
+from typing import Awaitable, Callable, Dict, List, Tuple
+
+from .scheduler import run_bounded
+
+# (kind, name, child summaries) -> summary; kind is "file", "directory" or "project"
+Summarizer = Callable[[str, str, List[str]], Awaitable[str]]
+
+PROJECT = ""
+
+
+def overview_of(documentation: str) -> str:
+    """The part of a file's documentation before its details, used as the file's summary."""
+    text = documentation.split("#### Details", 1)[0]
+    lines = [line for line in text.strip().splitlines() if not line.startswith("### ") and line.strip() != "#### Overview"]
+    return "\n".join(lines).strip()
+
+
+def directory_tree(paths: List[str]) -> Dict[str, Tuple[List[str], List[str]]]:
+    """Map every directory (``""`` for the root) to its direct (files, subdirectories)."""
+    tree: Dict[str, Tuple[List[str], List[str]]] = {PROJECT: ([], [])}
+    linked = set()
+    for path in sorted(set(paths)):
+        directory = posixpath.dirname(path)
+        tree.setdefault(directory, ([], []))[0].append(path)
+        while directory != PROJECT and directory not in linked:
+            linked.add(directory)
+            parent = posixpath.dirname(directory)
+            tree.setdefault(parent, ([], []))[1].append(directory)
+            directory = parent
+    return tree
+
+
+async def build_rollups(file_summaries: Dict[str, str], summarize: Summarizer, limit: int) -> Tuple[str, Dict[str, str]]:
+    """Reduce file summaries into directory summaries and a project overview, bottom-up.
+
+    Directories at the same depth are summarized concurrently, at most ``limit`` at a
+    time. A directory with a single child reuses that child's summary instead of asking
+    for a new one. Returns the project overview and the summary of every directory.
+    """
+    tree = directory_tree(list(file_summaries))
+    summaries: Dict[str, str] = {}
+
+    def children(directory: str) -> List[str]:
+        files, subdirectories = tree[directory]
+        return [f"`{path}`: {file_summaries[path]}" for path in files] + [f"`{path}/`: {summaries[path]}" for path in subdirectories]
+
+    async def roll_up(directory: str) -> str:
+        files, subdirectories = tree[directory]
+        if len(files) + len(subdirectories) == 1:
+            return file_summaries[files[0]] if files else summaries[subdirectories[0]]
+        return await summarize("directory", directory, children(directory))
+
+    directories = [directory for directory in tree if directory != PROJECT]
+    for depth in sorted({directory.count("/") for directory in directories}, reverse=True):
+        level = [directory for directory in directories if directory.count("/") == depth]
+        results = await run_bounded([lambda directory=directory: roll_up(directory) for directory in level], limit)
+        summaries.update(zip(level, results))
+    overview = await summarize("project", PROJECT, children(PROJECT))
+    return overview, summaries
@@ -0,0 +1,156 @@
+# api/timing.py
+import os
+import time
+import uuid
+import random
+import cProfile
+import logging
+import tempfile
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+
+from .streaming import sse_event
+
+logger = logging.getLogger(__name__)
+
+SERVER_TIMING_ENABLED = os.getenv("SERVER_TIMING_ENABLED", "1") == "1"
+PROFILE_REQUESTS = os.getenv("PROFILE_REQUESTS", "0") == "1"  # Admin switch; profiling stays off unless this is set
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))  # Fraction of requests profiled without asking
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join(tempfile.gettempdir(), "codemyth", "profiles"))
+
+DEBUG_TIMING_HEADER = "x-debug-timing"  # "1" adds a timing event at the end of SSE streams
+PROFILE_HEADER = "x-profile"  # "1" profiles the request when PROFILE_REQUESTS is on
+
+
+class RequestTimings:
+    """Time spent per stage while serving one request.
+
+    Stages are summed over every call made for the request, so concurrent LLM or
+    GitHub calls can add up to more than the wall-clock total, and nested stages
+    (tokenizing while chunking) are counted in both.
+    """
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.stages: Dict[str, List[float]] = {}  # name -> [seconds, calls]
+
+    def add(self, name: str, seconds: float) -> None:
+        stage = self.stages.setdefault(name, [0.0, 0])
+        stage[0] += seconds
+        stage[1] += 1
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.start
+
+    def header(self) -> str:
+        """``Server-Timing`` value, with durations in milliseconds."""
+        entries = [f'{name};dur={seconds * 1000:.1f};desc="{calls} calls"' for name, (seconds, calls) in self.stages.items()]
+        entries.append(f"total;dur={self.elapsed() * 1000:.1f}")
+        return ", ".join(entries)
+
+    def summary(self) -> dict:
+        return {
+            "total_ms": round(self.elapsed() * 1000, 1),
+            "stages": {name: {"ms": round(seconds * 1000, 1), "calls": calls} for name, (seconds, calls) in self.stages.items()},
+        }
+
+
+_current: ContextVar[Optional[RequestTimings]] = ContextVar("request_timings", default=None)
+
+
+@contextmanager
+def span(name: str):
+    """Add the duration of a block to stage ``name`` of the current request, if any."""
+    timings = _current.get()
+    if timings is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add(name, time.perf_counter() - start)
+
+
+# cProfile hooks into the interpreter, so only one request can be profiled at a time
+_profile_lock = threading.Lock()
+
+
+def _start_profile(headers: Headers) -> Optional[cProfile.Profile]:
+    if not PROFILE_REQUESTS:
+        return None
+    if headers.get(PROFILE_HEADER) != "1" and random.random() >= PROFILE_SAMPLE_RATE:
+        return None
+    if not _profile_lock.acquire(blocking=False):
+        logger.info("Another request is being profiled; serving this one unprofiled")
+        return None
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:  # Some other profiler is already active
+        _profile_lock.release()
+        return None
+    return profiler
+
+
+def _finish_profile(profiler: cProfile.Profile, path: str) -> None:
+    try:
+        profiler.disable()
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        name = f"{time.strftime('%Y%m%d-%H%M%S')}-{path.strip('/').replace('/', '_') or 'root'}-{uuid.uuid4().hex[:8]}.prof"
+        profiler.dump_stats(os.path.join(PROFILE_DIR, name))
+        logger.info(f"Wrote profile of {path} to {os.path.join(PROFILE_DIR, name)}")
+    except OSError as e:
+        logger.error(f"Could not write profile for {path}: {str(e)}")
+    finally:
+        _profile_lock.release()
+
+
+class TimingMiddleware:
+    """Collects per-stage timings for each request and reports them.
+
+    Every response gets a ``Server-Timing`` header. For streamed responses the header
+    goes out before the work is done, so clients sending ``X-Debug-Timing: 1`` also get
+    a final ``{"status": "timing"}`` event with the complete breakdown. With
+    ``PROFILE_REQUESTS=1``, requests sending ``X-Profile: 1`` (and a random
+    ``PROFILE_SAMPLE_RATE`` of all requests) are run under cProfile and the stats are
+    written to ``PROFILE_DIR``; the profile covers the whole event loop meanwhile, so
+    it is most telling on an otherwise idle worker.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not SERVER_TIMING_ENABLED and not PROFILE_REQUESTS:
+            await self.app(scope, receive, send)
+            return
+
+        headers = Headers(scope=scope)
+        debug = headers.get(DEBUG_TIMING_HEADER) == "1"
+        timings = RequestTimings()
+        token = _current.set(timings)
+        profiler = _start_profile(headers)
+        streaming = False
+
+        async def send_with_timings(message) -> None:
+            nonlocal streaming
+            if message["type"] == "http.response.start" and SERVER_TIMING_ENABLED:
+                response_headers = MutableHeaders(scope=message)
+                streaming = response_headers.get("content-type", "").startswith("text/event-stream")
+                response_headers.append("Server-Timing", timings.header())
+            elif message["type"] == "http.response.body" and streaming and debug and not message.get("more_body", False):
+                trailer = sse_event({"status": "timing", **timings.summary()}).encode("utf-8")
+                await send({"type": "http.response.body", "body": trailer, "more_body": True})
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timings)
+        finally:
+            _current.reset(token)
+            if profiler is not None:
+                _finish_profile(profiler, scope.get("path", ""))
@@ -0,0 +1,173 @@
+# api/triage.py
+import os
+import re
+import math
+import hashlib
+import logging
+import posixpath
+from collections import Counter
+from fnmatch import fnmatchcase
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+TRIAGE_ENABLED = os.getenv("TRIAGE_ENABLED", "1") == "1"  # With 0 only the code-file check applies
+TRIAGE_EXCLUDED_DIRS = set(os.getenv(
+    "TRIAGE_EXCLUDED_DIRS",
+    "node_modules,vendor,third_party,bower_components,dist,build,out,target,.next,__pycache__,venv,.venv,site-packages",
+).split(","))
+TRIAGE_GENERATED_PATTERNS = os.getenv(
+    "TRIAGE_GENERATED_PATTERNS",
+    "*.min.js,*-min.js,*.bundle.js,*.chunk.js,*_pb2.py,*_pb2_grpc.py,*.pb.go,*.pb.cc,*.pb.h,*.pb.ts,*_pb.js,*_pb.d.ts,"
+    "*_generated.go,*.gen.go,*.generated.ts,*.generated.cs,*.designer.cs,*.g.cs",
+).split(",")
+TRIAGE_MAX_MEAN_LINE_LENGTH = int(os.getenv("TRIAGE_MAX_MEAN_LINE_LENGTH", "200"))  # Hand-written code averages well under 80
+TRIAGE_MAX_LINE_LENGTH = int(os.getenv("TRIAGE_MAX_LINE_LENGTH", "10000"))
+TRIAGE_MAX_ENTROPY = float(os.getenv("TRIAGE_MAX_ENTROPY", "5.8"))  # Bits per byte; source is ~4.5-5, base64 blobs ~6
+TRIAGE_MAX_FILE_TOKENS = int(os.getenv("TRIAGE_MAX_FILE_TOKENS", "100000"))
+TRIAGE_MAX_TOTAL_TOKENS = int(os.getenv("TRIAGE_MAX_TOTAL_TOKENS", "2000000"))  # Per generation run; 0 disables
+
+GITATTRIBUTES = ".gitattributes"
+ENTROPY_SAMPLE_BYTES = 64 * 1024
+HEADER_LINES = 10
+# Banners generator tools write, not comments that merely mention generation
+_GENERATED_MARKER = re.compile(
+    r"@generated|\b(?:code )?generated\b.*\bdo not edit\b|\bthis file (?:is|was|has been) (?:automatically |auto-?)generated\b",
+    re.IGNORECASE,
+)
+_COMMENT_START = ("#", "//", "/*", "*", "--", "<!--", '"""', "'''")
+
+
+def parse_gitattributes(text: str) -> List[Tuple[str, bool]]:
+    """(pattern, excluded) pairs from the linguist-generated/-vendored attributes of a .gitattributes file."""
+    rules = []
+    for line in text.splitlines():
+        fields = line.split()
+        if not fields or fields[0].startswith("#"):
+            continue
+        for attribute in fields[1:]:
+            name, _, value = attribute.lstrip("-!").partition("=")
+            if name in ("linguist-generated", "linguist-vendored"):
+                unset = attribute.startswith(("-", "!")) or value == "false"
+                rules.append((fields[0], not unset))
+    return rules
+
+
+def gitattributes_match(pattern: str, path: str) -> bool:
+    """Approximate git's pattern rules: slash-less patterns match the file or a parent directory by name."""
+    if pattern.endswith("/**"):
+        return path.startswith(pattern[:-3].lstrip("/") + "/")
+    if "/" not in pattern.rstrip("/"):
+        pattern = pattern.rstrip("/")
+        return any(fnmatchcase(part, pattern) for part in path.split("/"))
+    return fnmatchcase(path, pattern.lstrip("/").replace("**/", "*"))
+
+
+def gitattributes_of(files: List[Dict[str, str]]) -> str:
+    """Content of the repository's top-level .gitattributes, if the client sent it."""
+    return next((file["content"] for file in files if file["path"] == GITATTRIBUTES), "")
+
+
+def shannon_entropy(data: bytes) -> float:
+    if not data:
+        return 0.0
+    total = len(data)
+    return -sum(count / total * math.log2(count / total) for count in Counter(data).values())
+
+
+def content_digest(content: str) -> str:
+    return hashlib.sha256(content.encode("utf-8", errors="replace")).hexdigest()
+
+
+class Triage:
+    """Decides which files are worth sending to the LLM, and records why the others are not.
+
+    Checks run cheapest first: path rules, content heuristics, duplicates (after the
+    content checks, so empty files are not reported as duplicates of each other), then
+    token budgets once the caller has tokenized the file. Each check returns whether the file
+    may go on; rejected files are listed in ``skipped`` with their reason. One instance
+    covers one run, since duplicates and the total budget span all of its files.
+    """
+
+    def __init__(self, is_code_file: Callable[[str], bool], gitattributes: str = ""):
+        self.is_code_file = is_code_file
+        self.attributes = parse_gitattributes(gitattributes)
+        self.skipped: List[Dict[str, str]] = []
+        self.tokens_used = 0
+        self._seen: Dict[str, str] = {}  # digest -> first path with that content
+
+    def add_gitattributes(self, text: str) -> None:
+        self.attributes.extend(parse_gitattributes(text))
+
+    def skip(self, path: str, reason: str) -> bool:
+        logger.debug(f"Skipping {path}: {reason}")
+        self.skipped.append({"path": path, "reason": reason})
+        return False
+
+    def check_path(self, path: str) -> bool:
+        if not self.is_code_file(path):
+            return self.skip(path, "not a code file")
+        if not TRIAGE_ENABLED:
+            return True
+        directories = path.split("/")[:-1]
+        excluded = next((directory for directory in directories if directory in TRIAGE_EXCLUDED_DIRS), None)
+        if excluded:
+            return self.skip(path, f"in excluded directory {excluded}/")
+        name = posixpath.basename(path)
+        pattern = next((pattern for pattern in TRIAGE_GENERATED_PATTERNS if pattern and fnmatchcase(name, pattern)), None)
+        if pattern:
+            return self.skip(path, f"generated file ({pattern})")
+        # Later .gitattributes lines override earlier ones, as in git
+        marked = None
+        for pattern, excluded_by_rule in self.attributes:
+            if gitattributes_match(pattern, path):
+                marked = excluded_by_rule
+        if marked:
+            return self.skip(path, "marked generated or vendored in .gitattributes")
+        return True
+
+    def check_duplicate(self, path: str, digest: str) -> bool:
+        if not TRIAGE_ENABLED:
+            return True
+        original = self._seen.setdefault(digest, path)
+        if original != path:
+            return self.skip(path, f"duplicate of {original}")
+        return True
+
+    def check_content(self, path: str, content: str) -> bool:
+        if not TRIAGE_ENABLED:
+            return True
+        if not content.strip():
+            return self.skip(path, "empty file")
+        head = content[:4096].splitlines()[:HEADER_LINES]
+        if any(line.lstrip().startswith(_COMMENT_START) and _GENERATED_MARKER.search(line) for line in head):
+            return self.skip(path, "generated file (header)")
+        lines = content.count("\n") + 1
+        if len(content) / lines > TRIAGE_MAX_MEAN_LINE_LENGTH:
+            return self.skip(path, f"minified (average line length {len(content) // lines})")
+        longest = max(len(line) for line in content.split("\n"))
+        if longest > TRIAGE_MAX_LINE_LENGTH:
+            return self.skip(path, f"contains a {longest}-character line")
+        entropy = shannon_entropy(content[:ENTROPY_SAMPLE_BYTES].encode("utf-8", errors="replace"))
+        if entropy > TRIAGE_MAX_ENTROPY:
+            return self.skip(path, f"looks like embedded data (entropy {entropy:.1f} bits/byte)")
+        return True
+
+    def check_file(self, path: str, content: str, digest: Optional[str] = None) -> bool:
+        """Path, content and duplicate checks for a file whose content is at hand."""
+        return (
+            self.check_path(path)
+            and self.check_content(path, content)
+            and self.check_duplicate(path, digest or content_digest(content))
+        )
+
+    def check_tokens(self, path: str, tokens: int) -> bool:
+        """Per-file and total token budgets; an admitted file counts towards the total."""
+        if not TRIAGE_ENABLED:
+            return True
+        if tokens > TRIAGE_MAX_FILE_TOKENS:
+            return self.skip(path, f"{tokens} tokens is over the per-file budget of {TRIAGE_MAX_FILE_TOKENS}")
+        if TRIAGE_MAX_TOTAL_TOKENS and self.tokens_used + tokens > TRIAGE_MAX_TOTAL_TOKENS:
+            return self.skip(path, f"total token budget of {TRIAGE_MAX_TOTAL_TOKENS} used up")
+        self.tokens_used += tokens
+        return True
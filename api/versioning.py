@@ -0,0 +1,93 @@
+# api/versioning.py
+import json
+import zlib
+import difflib
+from typing import List, Tuple
+
+SNAPSHOT = "snapshot"
+DELTA = "delta"
+SNAPSHOT_INTERVAL = 20  # Store a full snapshot every N versions to bound rebuild chains
+
+
+def compress_text(text: str) -> bytes:
+    return zlib.compress(text.encode("utf-8"), 6)
+
+
+def decompress_text(data: bytes) -> str:
+    return zlib.decompress(data).decode("utf-8")
+
+
+def _format_range(start: int, stop: int) -> str:
+    length = stop - start
+    beginning = start + 1 if length else start
+    return str(beginning) if length == 1 else f"{beginning},{length}"
+
+
+def _diff_line(prefix: str, line: str) -> str:
+    return prefix + (line if line.endswith("\n") else line + "\n")
+
+
+def unified_diff(matcher: difflib.SequenceMatcher, old_lines: List[str], new_lines: List[str], context: int = 3) -> str:
+    """Render a unified diff from an already-computed line matcher."""
+    output = []
+    for group in matcher.get_grouped_opcodes(context):
+        if not output:
+            output += ["--- previous\n", "+++ updated\n"]
+        first, last = group[0], group[-1]
+        output.append(f"@@ -{_format_range(first[1], last[2])} +{_format_range(first[3], last[4])} @@\n")
+        for tag, i1, i2, j1, j2 in group:
+            if tag == "equal":
+                output += [_diff_line(" ", line) for line in old_lines[i1:i2]]
+                continue
+            if tag in ("replace", "delete"):
+                output += [_diff_line("-", line) for line in old_lines[i1:i2]]
+            if tag in ("replace", "insert"):
+                output += [_diff_line("+", line) for line in new_lines[j1:j2]]
+    return "".join(output)
+
+
+def make_delta(old: str, new: str) -> Tuple[bytes, str]:
+    """Encode ``new`` relative to ``old``.
+
+    Returns the compressed delta (line ranges copied from ``old`` plus inserted text) and
+    a unified diff, both derived from a single line match.
+    """
+    old_lines = old.splitlines(keepends=True)
+    new_lines = new.splitlines(keepends=True)
+    matcher = difflib.SequenceMatcher(None, old_lines, new_lines)
+    operations = []
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            operations.append([i1, i2])
+        elif j2 > j1:
+            operations.append("".join(new_lines[j1:j2]))
+    delta = zlib.compress(json.dumps(operations).encode("utf-8"), 6)
+    return delta, unified_diff(matcher, old_lines, new_lines)
+
+
+def apply_delta(old: str, delta: bytes) -> str:
+    old_lines = old.splitlines(keepends=True)
+    parts = []
+    for operation in json.loads(zlib.decompress(delta)):
+        if isinstance(operation, list):
+            parts.extend(old_lines[operation[0]:operation[1]])
+        else:
+            parts.append(operation)
+    return "".join(parts)
+
+
+def encode_version(version_number: int, previous: str, content: str) -> Tuple[str, bytes, str]:
+    """Return ``(kind, data, diff)`` for storing ``content`` as ``version_number``."""
+    delta, diff = make_delta(previous, content)
+    if version_number % SNAPSHOT_INTERVAL == 1:
+        return SNAPSHOT, compress_text(content), diff
+    return DELTA, delta, diff
+
+
+def rebuild(records: List[Tuple[str, bytes]]) -> str:
+    """Rebuild a version from its records in version order, starting at the last snapshot."""
+    start = max(i for i, (kind, _) in enumerate(records) if kind == SNAPSHOT)
+    content = decompress_text(records[start][1])
+    for _, data in records[start + 1:]:
+        content = apply_delta(content, data)
+    return content
@@ -159,7 +159,7 @@ const DocumentationCard: React.FC<DocumentationCardProps> = ({
 
         for (const line of lines) {
           if (line.startsWith("data: ")) {
-            const data = line.slice(5);
+            const data = line.slice("data: ".length);
             try {
               const parsed = JSON.parse(data);
               if (parsed.status === "completed") {
@@ -171,6 +171,16 @@ const DocumentationCard: React.FC<DocumentationCardProps> = ({
                 setError(parsed.message);
                 setGeneratingDocs(false);
                 setProcessingDoc(false);
+              } else if (parsed.status === "toc") {
+                // Table of contents arrives last; splice it in ahead of the file sections.
+                // Splitting frames on "\n\n" strips the heading's newline, so anchor on the text alone
+                const toc = `${parsed.content.trim()}\n\n`;
+                const anchor = accumulatedDoc.indexOf("## File Documentation");
+                accumulatedDoc =
+                  anchor === -1
+                    ? toc + accumulatedDoc
+                    : accumulatedDoc.slice(0, anchor) + toc + accumulatedDoc.slice(anchor);
+                setDocumentation(accumulatedDoc);
               } else if (parsed.status === "rate_limit") {
                 setWarning(
                   `${parsed.message} Retrying in ${parsed.retry_after}s...`
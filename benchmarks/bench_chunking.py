@@ -0,0 +1,93 @@
+# benchmarks/bench_chunking.py
+"""Compare the token and structure-aware chunkers with the previous RecursiveCharacterTextSplitter setup.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_chunking [--sizes 100000 1000000 4000000]
+"""
+import argparse
+import random
+import time
+
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+from api.chunking import CHUNK_OVERLAP, encode, split_by_structure, split_by_tokens, tokenizer
+
+MAX_TOKENS = 4000
+
+
+def legacy_chunks(content: str, max_tokens: int = MAX_TOKENS):
+    """The chunker both generators used before: re-encodes every candidate piece."""
+    if len(tokenizer.encode(content)) <= max_tokens:
+        return [content]
+    text_splitter = RecursiveCharacterTextSplitter(
+        chunk_size=max_tokens,
+        chunk_overlap=CHUNK_OVERLAP,
+        length_function=lambda x: len(tokenizer.encode(x)),
+    )
+    return text_splitter.split_text(content)
+
+
+def single_pass_chunks(content: str, max_tokens: int = MAX_TOKENS):
+    return split_by_tokens(content, max_tokens, CHUNK_OVERLAP, encode(content))
+
+
+def structure_chunks(content: str, max_tokens: int = MAX_TOKENS):
+    return split_by_structure(content, "bench.js", max_tokens, CHUNK_OVERLAP, encode(content))
+
+
+LAYOUTS = ("readable", "minified", "bundled")
+BUNDLE_LINE_CHARS = 20_000  # Bundlers wrap minified output into long lines; each is longer than a chunk
+
+
+def make_source(size: int, layout: str, seed: int = 0) -> str:
+    rng = random.Random(seed)
+    parts = []
+    length = 0
+    line_length = 0
+    i = 0
+    while length < size:
+        body = " + ".join(f"arg{rng.randint(0, 9)} * {rng.randint(0, 999)}" for _ in range(rng.randint(1, 6)))
+        if layout == "readable":
+            part = f"function f{i}(a, b) {{\n    // helper {i}\n    return {body};\n}}\n\n"
+        else:
+            part = f"function f{i}(a,b){{return {body};}}"
+            line_length += len(part)
+            if layout == "bundled" and line_length >= BUNDLE_LINE_CHARS:
+                part += "\n"
+                line_length = 0
+        parts.append(part)
+        length += len(part)
+        i += 1
+    return "".join(parts)
+
+
+def timed(fn, content: str):
+    start = time.perf_counter()
+    chunks = fn(content)
+    return time.perf_counter() - start, chunks
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100_000, 1_000_000, 4_000_000], help="File sizes in characters")
+    parser.add_argument("--skip-legacy-above", type=int, default=2_000_000, help="Skip the legacy splitter for larger inputs")
+    args = parser.parse_args()
+
+    print(f"{'size':>10} {'layout':>9} {'chunker':>12} {'seconds':>9} {'chunks':>7} {'max tokens':>11} {'overlap':>8}")
+    for size in args.sizes:
+        for layout in LAYOUTS:
+            content = make_source(size, layout)
+            file_tokens = len(encode(content))
+            chunkers = [("single-pass", single_pass_chunks), ("structure", structure_chunks)]
+            if size <= args.skip_legacy_above:
+                chunkers.insert(0, ("legacy", legacy_chunks))
+            for name, fn in chunkers:
+                seconds, chunks = timed(fn, content)
+                chunk_tokens = [len(encode(chunk)) for chunk in chunks]
+                overlap = sum(chunk_tokens) - file_tokens
+                print(f"{size:>10} {layout:>9} {name:>12} {seconds:>9.3f} {len(chunks):>7} {max(chunk_tokens):>11} {overlap:>8}")
+
+
+if __name__ == "__main__":
+    main()
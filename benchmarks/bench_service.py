@@ -0,0 +1,206 @@
+# benchmarks/bench_service.py
+"""End-to-end latency, throughput and memory of the API against local fake backends.
+
+Starts fake Ollama, Groq and GitHub servers (see ``benchmarks/fakes.py``), then for each
+repository size and endpoint launches a fresh ``uvicorn api.index:app`` pointed at them
+with empty caches, and drives it at each concurrency level. Nothing leaves the machine.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_service [--sizes 10 100] [--concurrency 1 4] [--requests 8]
+        [--endpoints files docs groq refine] [--llm-latency 0.05] [--groq-429-rate 0.1] [--json out.json]
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+import httpx
+
+from .fakes import LLMBehaviour, ServerThread, free_port, github_app, groq_app, ollama_app, synthetic_repo
+
+ENDPOINTS = ("files", "docs", "groq", "refine")
+
+
+def percentile(values: List[float], q: float) -> float:
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method="inclusive")[int(q) - 1]
+
+
+def peak_rss_mb(pid: int) -> Optional[float]:
+    """High-water RSS of a running process, from /proc where available."""
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        return None
+    return None
+
+
+class Service:
+    """The API under test in its own process, so its memory is measured in isolation."""
+
+    def __init__(self, env: Dict[str, str]):
+        self.port = free_port()
+        self.env = env
+        self.process: Optional[subprocess.Popen] = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}/api/py"
+
+    def __enter__(self) -> "Service":
+        self.process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "api.index:app", "--host", "127.0.0.1", "--port", str(self.port), "--log-level", "warning"],
+            env={**os.environ, **self.env},
+        )
+        deadline = time.time() + 60
+        while time.time() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError("Service exited during startup")
+            try:
+                if httpx.get(self.url, timeout=1).status_code == 200:
+                    return self
+            except httpx.TransportError:
+                time.sleep(0.2)
+        raise RuntimeError("Service did not start within 60s")
+
+    def peak_rss_mb(self) -> Optional[float]:
+        return peak_rss_mb(self.process.pid)
+
+    def __exit__(self, *exc) -> None:
+        self.process.terminate()
+        self.process.wait(timeout=30)
+
+
+async def read_stream(response: httpx.Response) -> Dict:
+    """Consume an SSE response and return its last status event."""
+    last: Dict = {}
+    async for line in response.aiter_lines():
+        if line.startswith("data: {"):
+            try:
+                event = json.loads(line[6:])
+            except json.JSONDecodeError:
+                continue
+            if event.get("status") in ("completed", "error"):
+                last = event
+    return last
+
+
+async def call(client: httpx.AsyncClient, endpoint: str, size: int, files: List[Dict[str, str]], doc_id: Optional[str]) -> bool:
+    """Issue one request; returns whether it succeeded."""
+    if endpoint == "files":
+        response = await client.get(f"/github/repo/bench/repo-{size}/files", params={"access_token": "bench"})
+        return response.status_code == 200
+    if endpoint == "docs":
+        response = await client.post("/generate-docs", json={"files": files, "force_regenerate": True})
+        return response.status_code == 200
+    if endpoint == "groq":
+        payload = {"files": files, "groq_api_key": "bench", "model_name": "bench-model", "force_regenerate": True}
+        async with client.stream("POST", "/generate-with-groq", json=payload) as response:
+            return (await read_stream(response)).get("status") == "completed"
+    if endpoint == "refine":
+        response = await client.post("/docs/refine", json={"documentation_id": doc_id, "feedback": "Expand the introduction with a project overview."})
+        return response.status_code == 200
+    raise ValueError(endpoint)
+
+
+async def drive(url: str, endpoint: str, size: int, concurrency: int, requests: int, files: List[Dict[str, str]]) -> Dict:
+    async with httpx.AsyncClient(base_url=url, timeout=httpx.Timeout(600)) as client:
+        doc_id = None
+        if endpoint == "refine":
+            response = await client.post("/generate-docs", json={"files": files})
+            response.raise_for_status()
+            doc_id = response.json()["documentation_id"]
+
+        semaphore = asyncio.Semaphore(concurrency)
+        latencies: List[float] = []
+        failures = 0
+
+        async def one() -> None:
+            nonlocal failures
+            async with semaphore:
+                start = time.perf_counter()
+                try:
+                    ok = await call(client, endpoint, size, files, doc_id)
+                except httpx.HTTPError:
+                    ok = False
+                latencies.append(time.perf_counter() - start)
+                failures += not ok
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(requests)))
+        elapsed = time.perf_counter() - start
+    return {
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "throughput": requests / elapsed,
+        "failures": failures,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100], help="Repository sizes in files")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4], help="Requests in flight")
+    parser.add_argument("--requests", type=int, default=8, help="Requests per scenario")
+    parser.add_argument("--endpoints", nargs="+", choices=ENDPOINTS, default=list(ENDPOINTS))
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="Seconds before a fake LLM's first token")
+    parser.add_argument("--llm-tps", type=float, default=500.0, help="Fake LLM output tokens per second")
+    parser.add_argument("--groq-429-rate", type=float, default=0.0, help="Fraction of fake Groq calls answered with 429")
+    parser.add_argument("--github-latency", type=float, default=0.01, help="Seconds per fake GitHub request")
+    parser.add_argument("--json", help="Also write results to this file")
+    args = parser.parse_args()
+
+    ollama = LLMBehaviour(args.llm_latency, args.llm_tps)
+    groq = LLMBehaviour(args.llm_latency, args.llm_tps, error_rate=args.groq_429_rate)
+    results = []
+    with ServerThread(ollama_app(ollama)) as ollama_server, ServerThread(groq_app(groq)) as groq_server, \
+            ServerThread(github_app(args.github_latency)) as github_server:
+        print(f"{'endpoint':>8} {'files':>6} {'conc':>5} {'p50 s':>8} {'p95 s':>8} {'req/s':>8} {'fail':>5} {'peak MB':>8}")
+        for size in args.sizes:
+            files = synthetic_repo(size)
+            for endpoint in args.endpoints:
+                with tempfile.TemporaryDirectory() as state:
+                    env = {
+                        "OLLAMA_BASE_URL": ollama_server.url,
+                        "GROQ_API_BASE": groq_server.url,
+                        "GITHUB_API_BASE": github_server.url,
+                        # Limits of the real free tier would dominate every measurement
+                        "GROQ_TPM_LIMIT": str(10 ** 9),
+                        "GROQ_RPM_LIMIT": str(10 ** 6),
+                        "DOC_CACHE_DIR": os.path.join(state, "docs"),
+                        "BLOB_STORE_DIR": os.path.join(state, "blobs"),
+                        "GITHUB_ETAG_CACHE_DIR": os.path.join(state, "etags"),
+                        "DOC_STORE_PATH": os.path.join(state, "docs.sqlite3"),
+                    }
+                    with Service(env) as service:
+                        for concurrency in args.concurrency:
+                            result = asyncio.run(drive(service.url, endpoint, size, concurrency, args.requests, files))
+                            result.update(endpoint=endpoint, files=size, concurrency=concurrency, peak_rss_mb=service.peak_rss_mb())
+                            results.append(result)
+                            peak = f"{result['peak_rss_mb']:.0f}" if result["peak_rss_mb"] is not None else "n/a"
+                            print(f"{endpoint:>8} {size:>6} {concurrency:>5} {result['p50']:>8.3f} {result['p95']:>8.3f} "
+                                  f"{result['throughput']:>8.2f} {result['failures']:>5} {peak:>8}")
+    if all(result["peak_rss_mb"] is None for result in results):
+        # No /proc: fall back to the largest service process seen, once they have exited
+        scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+        print(f"peak RSS of any service process: {resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / scale:.0f} MB")
+    print(f"fake LLM calls: ollama={ollama.calls} groq={groq.calls} (429s injected: {groq.rejected})")
+    if args.json:
+        with open(args.json, "w") as out:
+            json.dump(results, out, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,256 @@
+# benchmarks/fakes.py
+"""Local stand-ins for Ollama, Groq and the GitHub API, used by the service benchmark.
+
+Each factory returns a FastAPI app. Replies are shaped after the real APIs closely
+enough for the clients this service uses (the ``ollama`` and ``groq`` SDKs and the
+GitHub REST endpoints in ``api/fetch.py``), and follow the formats the prompts ask for:
+delimited sections for batched and section-scoped prompts, ``#### Details`` otherwise.
+"""
+import asyncio
+import hashlib
+import io
+import json
+import random
+import re
+import socket
+import tarfile
+import threading
+import time
+from typing import Dict, List
+
+import uvicorn
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import JSONResponse, StreamingResponse
+
+FILLER = "This component validates its inputs, delegates the work to helpers and returns the result. "
+
+
+def synthetic_repo(n_files: int, seed: int = 0, large_every: int = 12) -> List[Dict[str, str]]:
+    """Deterministic Python files spread over nested directories; every ``large_every``-th file is big enough to be chunked."""
+    rng = random.Random(seed)
+    files = []
+    for i in range(n_files):
+        path = f"pkg{i % 4}/mod{i % 3}/file{i}.py" if i % 5 else f"file{i}.py"
+        functions = rng.randint(1500, 2500) if large_every and i % large_every == large_every - 1 else rng.randint(3, 30)
+        body = "".join(
+            f"def f{i}_{j}(a, b):\n    \"\"\"Helper {j}.\"\"\"\n    return a * {rng.randint(0, 999)} + b\n\n\n"
+            for j in range(functions)
+        )
+        files.append({"path": path, "content": f"# {path}\nimport os\n\n\n{body}"})
+    return files
+
+
+def reply_for(prompt: str, words: int) -> str:
+    """A plausible reply for each kind of prompt the service sends."""
+    filler = (FILLER * (words // 14 + 1)).strip()
+    if "JSON array" in prompt:
+        return "[]"
+    sections = re.findall(r"<<<SECTION (.+?)>>>\n(.*?)\n<<<END>>>", prompt, re.DOTALL)
+    if sections:
+        key, body = sections[0]
+        return f"Expanded {key}.\n<<<SECTION {key}>>>\n{body}\n\n{filler}\n<<<END>>>"
+    paths = re.findall(r"^\s*File: (\S+)", prompt, re.MULTILINE)
+    if "<<<FILE" in prompt:
+        return "\n".join(f"<<<FILE {path}>>>\nSummary of {path}.\n#### Details\n{filler}\n<<<END>>>" for path in paths)
+    if "summarizing documentation" in prompt:
+        return filler
+    name = paths[0] if paths else "the code"
+    return f"#### Overview\nDocumentation for {name}.\n\n#### Details\n{filler}"
+
+
+def split_words(text: str, pieces: int) -> List[str]:
+    words = text.split(" ")
+    size = max(1, len(words) // max(1, pieces))
+    return [" ".join(words[i:i + size]) + (" " if i + size < len(words) else "") for i in range(0, len(words), size)]
+
+
+class LLMBehaviour:
+    """Latency model shared by the fake LLM servers."""
+
+    def __init__(self, latency: float = 0.05, tokens_per_second: float = 500.0, words: int = 120, error_rate: float = 0.0, seed: int = 0):
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.words = words
+        self.error_rate = error_rate
+        self.rng = random.Random(seed)
+        self.calls = 0
+        self.rejected = 0
+
+    def duration(self) -> float:
+        return self.latency + self.words / self.tokens_per_second
+
+    def should_reject(self) -> bool:
+        rejected = self.rng.random() < self.error_rate
+        self.rejected += rejected
+        return rejected
+
+
+def ollama_app(behaviour: LLMBehaviour) -> FastAPI:
+    app = FastAPI()
+
+    @app.post("/api/generate")
+    async def generate(request: Request):
+        body = await request.json()
+        behaviour.calls += 1
+        text = reply_for(body.get("prompt", ""), behaviour.words)
+        model = body.get("model", "fake")
+
+        async def stream():
+            await asyncio.sleep(behaviour.latency)
+            pieces = split_words(text, 8)
+            for piece in pieces:
+                await asyncio.sleep((behaviour.duration() - behaviour.latency) / len(pieces))
+                yield json.dumps({"model": model, "created_at": "2024-01-01T00:00:00Z", "response": piece, "done": False}) + "\n"
+            yield json.dumps({"model": model, "created_at": "2024-01-01T00:00:00Z", "response": "", "done": True, "done_reason": "stop",
+                              "prompt_eval_count": len(body.get("prompt", "")) // 4, "eval_count": behaviour.words}) + "\n"
+
+        if body.get("stream", True):
+            return StreamingResponse(stream(), media_type="application/x-ndjson")
+        await asyncio.sleep(behaviour.duration())
+        return {"model": model, "created_at": "2024-01-01T00:00:00Z", "response": text, "done": True, "done_reason": "stop"}
+
+    return app
+
+
+def groq_app(behaviour: LLMBehaviour) -> FastAPI:
+    """OpenAI-compatible chat completions under Groq's ``/openai/v1`` prefix, with optional 429 injection."""
+    app = FastAPI()
+
+    @app.post("/openai/v1/chat/completions")
+    async def completions(request: Request):
+        body = await request.json()
+        behaviour.calls += 1
+        if behaviour.should_reject():
+            return JSONResponse(
+                status_code=429,
+                headers={"retry-after": "1"},
+                content={"error": {"message": "Rate limit reached for model", "type": "tokens", "code": "rate_limit_exceeded"}},
+            )
+        prompt = "\n".join(str(message.get("content", "")) for message in body.get("messages", []))
+        text = reply_for(prompt, behaviour.words)
+        model = body.get("model", "fake")
+        created = int(time.time())
+        usage = {"prompt_tokens": len(prompt) // 4, "completion_tokens": behaviour.words, "total_tokens": len(prompt) // 4 + behaviour.words}
+
+        if not body.get("stream"):
+            await asyncio.sleep(behaviour.duration())
+            return {
+                "id": "chatcmpl-fake", "object": "chat.completion", "created": created, "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+                "usage": usage,
+            }
+
+        async def stream():
+            await asyncio.sleep(behaviour.latency)
+            pieces = split_words(text, 8)
+            for i, piece in enumerate(pieces):
+                await asyncio.sleep((behaviour.duration() - behaviour.latency) / len(pieces))
+                delta = {"role": "assistant", "content": piece} if i == 0 else {"content": piece}
+                chunk = {"id": "chatcmpl-fake", "object": "chat.completion.chunk", "created": created, "model": model,
+                         "choices": [{"index": 0, "delta": delta, "finish_reason": None}]}
+                yield f"data: {json.dumps(chunk)}\n\n"
+            final = {"id": "chatcmpl-fake", "object": "chat.completion.chunk", "created": created, "model": model,
+                     "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}], "x_groq": {"usage": usage}}
+            yield f"data: {json.dumps(final)}\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(stream(), media_type="text/event-stream")
+
+    return app
+
+
+def blob_sha(content: bytes) -> str:
+    return hashlib.sha1(b"blob %d\0" % len(content) + content).hexdigest()
+
+
+def github_app(latency: float = 0.01, large_every: int = 12) -> FastAPI:
+    """Serves ``/repos/{owner}/repo-{n}`` as a synthetic repository of ``n`` files.
+
+    Trees, blobs, contents and tarballs are supported, with ETags and 304s on trees.
+    """
+    app = FastAPI()
+    repos: Dict[str, Dict] = {}
+    blobs: Dict[str, bytes] = {}
+
+    def repository(repo: str) -> Dict:
+        if repo not in repos:
+            n_files = int(repo.rsplit("-", 1)[-1])
+            files = synthetic_repo(n_files, large_every=large_every)
+            entries = []
+            for file in files:
+                data = file["content"].encode("utf-8")
+                sha = blob_sha(data)
+                blobs[sha] = data
+                entries.append({"path": file["path"], "mode": "100644", "type": "blob", "sha": sha, "size": len(data)})
+            tree_sha = hashlib.sha1(json.dumps(entries).encode("utf-8")).hexdigest()
+            repos[repo] = {"sha": tree_sha, "tree": entries, "files": {file["path"]: file["content"].encode("utf-8") for file in files}}
+        return repos[repo]
+
+    @app.get("/repos/{owner}/{repo}/git/trees/{ref}")
+    async def tree(owner: str, repo: str, ref: str, request: Request):
+        await asyncio.sleep(latency)
+        data = repository(repo)
+        etag = f'"{data["sha"]}"'
+        if request.headers.get("if-none-match") == etag:
+            return Response(status_code=304, headers={"etag": etag})
+        return JSONResponse({"sha": data["sha"], "tree": data["tree"], "truncated": False}, headers={"etag": etag})
+
+    @app.get("/repos/{owner}/{repo}/git/blobs/{sha}")
+    async def blob(owner: str, repo: str, sha: str):
+        await asyncio.sleep(latency)
+        repository(repo)
+        if sha not in blobs:
+            return JSONResponse(status_code=404, content={"message": "Not Found"})
+        return Response(content=blobs[sha], media_type="application/vnd.github.raw")
+
+    @app.get("/repos/{owner}/{repo}/contents/{path:path}")
+    async def contents(owner: str, repo: str, path: str):
+        await asyncio.sleep(latency)
+        data = repository(repo)["files"].get(path)
+        if data is None:
+            return JSONResponse(status_code=404, content={"message": "Not Found"})
+        return Response(content=data, media_type="application/vnd.github.raw")
+
+    @app.get("/repos/{owner}/{repo}/tarball/{ref}")
+    async def tarball(owner: str, repo: str, ref: str):
+        await asyncio.sleep(latency)
+        data = repository(repo)
+        buffer = io.BytesIO()
+        with tarfile.open(fileobj=buffer, mode="w:gz") as archive:
+            prefix = f"{owner}-{repo}-{data['sha'][:7]}"
+            for path, content in data["files"].items():
+                info = tarfile.TarInfo(f"{prefix}/{path}")
+                info.size = len(content)
+                archive.addfile(info, io.BytesIO(content))
+        return Response(content=buffer.getvalue(), media_type="application/x-gzip")
+
+    return app
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class ServerThread:
+    """Run an ASGI app with uvicorn on a background thread."""
+
+    def __init__(self, app: FastAPI, port: int = 0):
+        self.port = port or free_port()
+        self.server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=self.port, log_level="warning", access_log=False))
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def __enter__(self) -> "ServerThread":
+        self.thread.start()
+        while not self.server.started:
+            time.sleep(0.01)
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.server.should_exit = True
+        self.thread.join(timeout=5)
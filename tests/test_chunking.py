@@ -0,0 +1,29 @@
+from api.chunking import encode, split_by_structure, split_by_tokens
+
+
+def long_lines(count: int, line_tokens: int) -> str:
+    lines = []
+    for number in range(count):
+        statements = []
+        tokens = 0
+        while tokens < line_tokens:
+            statement = f"var a{number}_{len(statements)}={len(statements) * 7 % 1000};"
+            statements.append(statement)
+            tokens += len(encode(statement))
+        lines.append("".join(statements))
+    return "\n".join(lines) + "\n"
+
+
+def test_lines_longer_than_the_overlap_do_not_multiply_chunks():
+    content = long_lines(5, 3900)
+    for chunks in (split_by_tokens(content, 4000), split_by_structure(content, "bundle.js", 4000)):
+        assert len(chunks) <= 10
+        assert all(len(encode(chunk)) <= 4000 for chunk in chunks)
+        assert content.startswith(chunks[0]) and content.endswith(chunks[-1])
+
+
+def test_short_header_before_a_long_line():
+    content = "// header\n" + long_lines(1, 10000)
+    chunks = split_by_tokens(content, 4000)
+    assert len(chunks) <= 4
+    assert min(len(encode(chunk)) for chunk in chunks[1:]) > 200
@@ -0,0 +1,25 @@
+import time
+
+from api.compaction import COMPACT_KEEP_DATA_LINES, compact, is_data_line
+
+
+def test_data_line_with_trailing_comment_is_scanned_in_linear_time():
+    row = "    " + ",  ".join(f"0x{i:02x}" for i in range(40)) + ",  // row\n"
+    content = "static const unsigned char table[] = {\n" + row * 50 + "};\n"
+    start = time.perf_counter()
+    compact(content, "table.c")
+    assert time.perf_counter() - start < 1.0
+
+
+def test_long_literal_tables_are_collapsed():
+    content = "TABLE = [\n" + "    (1, 'a', None),\n" * 40 + "]\n"
+    compacted = compact(content, "table.py")
+    assert compacted.count("(1, 'a', None)") == COMPACT_KEEP_DATA_LINES
+    assert "more lines of data elided" in compacted
+
+
+def test_code_lines_are_not_data():
+    assert is_data_line("    1, 2.5, -3e4, 'x', None,")
+    assert not is_data_line("    x = 1")
+    assert not is_data_line("    0x00, 0x01,  // row")
+    assert not is_data_line("    ]")